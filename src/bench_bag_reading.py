@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+比较 bag 读取方式的吞吐量：完整反序列化（read_messages 后取字段）与 raw 模式直接解析字段（raw_field_getter）。
+用法: python3 bench_bag_reading.py ../data/2025_03_11_11_18_45 --repeat 3
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+
+from process_data import extract_data_from_bag, raw_field_getter
+
+# (bag 相对路径, topic, 字段)
+STREAMS = [
+    ('realsence_color_img.bag', 'realsence_color_img', 'data'),
+    ('right_arm_status.bag', 'right_arm_status', 'joint_status'),
+]
+
+def best_of(repeat, func):
+    """运行 repeat 次，返回最短耗时和最后一次的结果。"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def same_values(a, b):
+    """逐条比较两种方式读出的字段值。"""
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if isinstance(x, (bytes, memoryview)):
+            if bytes(x) != bytes(y):
+                return False
+        elif not np.array_equal(np.asarray(x), np.asarray(y)):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs raw-mode bag reading.")
+    parser.add_argument('recording_dir', type=str, help='Recording directory containing the .bag files.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed repetitions (best is reported).')
+    args = parser.parse_args()
+
+    print(f"{'bag':<28} {'messages':>9} {'size':>9} {'full':>12} {'raw':>12} {'speedup':>8} {'same':>5}")
+    for rel_path, topic, field in STREAMS:
+        bag_path = os.path.join(args.recording_dir, rel_path)
+        if not os.path.exists(bag_path):
+            print(f"{rel_path:<28} missing")
+            continue
+        size_mb = os.path.getsize(bag_path) / 1e6
+
+        t_full, (_, full) = best_of(args.repeat, lambda: extract_data_from_bag(
+            bag_path, topic, lambda msg: getattr(msg, field)))
+        t_raw, (_, raw) = best_of(args.repeat, lambda: extract_data_from_bag(
+            bag_path, topic, raw_field_getter(field), raw=True))
+        print(f"{rel_path:<28} {len(raw):>9} {size_mb:>7.1f}MB {size_mb / t_full:>8.1f}MB/s {size_mb / t_raw:>8.1f}MB/s "
+              f"{t_full / t_raw:>7.1f}x {str(same_values(full, raw)):>5}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+比较各视频编码配置（process_data.ENCODING_PROFILES）的编码速度、文件大小和随机定位延迟。
+用法: python3 bench_encoding.py --video ../video/2025_03_11_11_18_45/video.mp4 --frames 900
+      python3 bench_encoding.py --frames 900 --size 640x480   # 使用合成画面
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import cv2
+
+from process_data import ENCODING_PROFILES, open_video_writer
+from logic.avi_writer import MjpegAviWriter
+from logic.video_index import read_mp4_frame_index, JpegFrameReader
+
+def load_frames(video_path, num_frames, size):
+    """
+    从已有视频读取前 num_frames 帧；未指定视频时生成带运动和噪声的合成画面。
+    """
+    if video_path:
+        capture = cv2.VideoCapture(video_path)
+        frames = []
+        while len(frames) < num_frames:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            frames.append(frame)
+        capture.release()
+        return frames
+
+    width, height = size
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width]
+    frames = []
+    for i in range(num_frames):
+        frame = np.dstack([(xx + 3 * i) % 256, (yy + 2 * i) % 256, ((xx + yy) // 2 + i) % 256]).astype(np.uint8)
+        frames.append(cv2.add(frame, rng.integers(0, 16, frame.shape, dtype=np.uint8)))
+    return frames
+
+def encode(frames, profile, output_dir, gop, jpeg_quality):
+    height, width = frames[0].shape[:2]
+    writer, video_path = open_video_writer(output_dir, profile, width, height, gop)
+    start = time.perf_counter()
+    for frame in frames:
+        if isinstance(writer, MjpegAviWriter):
+            writer.write(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])[1])
+        else:
+            writer.write(frame)
+    writer.release()
+    elapsed = time.perf_counter() - start
+    index = writer.frame_index if isinstance(writer, MjpegAviWriter) else read_mp4_frame_index(video_path)
+    return video_path, elapsed, index
+
+def measure_seek(read_frame, num_frames, samples, seed=0):
+    """
+    随机定位 samples 次，返回每次定位 + 读取一帧的耗时（毫秒）。
+    """
+    latencies = []
+    for index in np.random.default_rng(seed).integers(0, num_frames, samples):
+        start = time.perf_counter()
+        read_frame(int(index))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark video encoding profiles for annotation seeking.")
+    parser.add_argument('--video', type=str, default=None, help='Source video to take frames from (default: synthetic frames).')
+    parser.add_argument('--frames', type=int, default=600, help='Number of frames to encode.')
+    parser.add_argument('--size', type=str, default='640x480', help='Synthetic frame size, WIDTHxHEIGHT.')
+    parser.add_argument('--gop', type=int, default=10, help='Keyframe interval for the short-gop profile.')
+    parser.add_argument('--jpeg-quality', type=int, default=95, help='JPEG quality for the intra profile.')
+    parser.add_argument('--seeks', type=int, default=100, help='Number of random seeks to measure.')
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, tuple(map(int, args.size.split('x'))))
+    if not frames:
+        print("Error: No frames to encode.")
+        return
+    print(f"Encoding {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}\n")
+    print(f"{'profile':<10} {'encode fps':>10} {'size MB':>8} {'keyframes':>9} {'seek p50':>9} {'seek p95':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for profile in ENCODING_PROFILES:
+            output_dir = os.path.join(tmp_dir, profile)
+            os.makedirs(output_dir)
+            video_path, elapsed, index = encode(frames, profile, output_dir, args.gop, args.jpeg_quality)
+
+            capture = cv2.VideoCapture(video_path)
+            num_frames = len(index) if index is not None else len(frames)
+
+            def read_with_capture(i):
+                capture.set(cv2.CAP_PROP_POS_FRAMES, i)
+                return capture.read()
+
+            latencies = measure_seek(read_with_capture, num_frames, args.seeks)
+            keyframes = int(np.count_nonzero(index['keyframe'])) if index is not None else -1
+            size_mb = os.path.getsize(video_path) / 1e6
+            print(f"{profile:<10} {len(frames) / elapsed:>10.1f} {size_mb:>8.2f} {keyframes:>9} "
+                  f"{np.percentile(latencies, 50):>7.2f}ms {np.percentile(latencies, 95):>7.2f}ms")
+            capture.release()
+
+            if profile == 'intra':
+                reader = JpegFrameReader(video_path, index)
+                latencies = measure_seek(reader.read, num_frames, args.seeks)
+                print(f"{'  +index':<10} {'':>10} {'':>8} {'':>9} "
+                      f"{np.percentile(latencies, 50):>7.2f}ms {np.percentile(latencies, 95):>7.2f}ms")
+                reader.close()
+
+if __name__ == '__main__':
+    main()
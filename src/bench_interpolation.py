@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+对比 process_data.interpolate_data（逐列 np.interp）与 logic.alignment.TimelineAligner（批量 gather）的微基准。
+用法: python3 bench_interpolation.py --minutes 30
+"""
+
+import argparse
+import timeit
+import numpy as np
+
+from process_data import interpolate_data
+from logic.alignment import TimelineAligner
+
+def make_streams(minutes, seed=0):
+    """
+    生成与真实录制相近的时间轴：30 Hz 图像、100 Hz 机械臂（7 维）、1 kHz 手部（12 维位置 + 5 维力）。
+    """
+    rng = np.random.default_rng(seed)
+    duration = minutes * 60.0
+
+    def timeline(rate):
+        ts = np.arange(0.0, duration, 1.0 / rate)
+        return ts + rng.uniform(0, 0.2 / rate, ts.size)
+
+    img_ts, arm_ts, hand_ts = timeline(30), timeline(100), timeline(1000)
+    return {
+        'img_ts': img_ts,
+        'arm_ts': arm_ts,
+        'arm': rng.standard_normal((arm_ts.size, 7)),
+        'hand_ts': hand_ts,
+        'hand_pos': rng.standard_normal((hand_ts.size, 12)),
+        'hand_force': rng.standard_normal((hand_ts.size, 5)),
+    }
+
+def run_reference(s):
+    return (interpolate_data(s['img_ts'], s['arm_ts'], s['arm']),
+            interpolate_data(s['img_ts'], s['hand_ts'], s['hand_pos']),
+            interpolate_data(s['img_ts'], s['hand_ts'], s['hand_force']))
+
+def run_aligner(s, mode='linear'):
+    aligner = TimelineAligner(s['img_ts'], mode=mode)
+    (arm,), _ = aligner.align(s['arm_ts'], s['arm'])
+    (hand_pos, hand_force), _ = aligner.align(s['hand_ts'], s['hand_pos'], s['hand_force'])
+    return arm, hand_pos, hand_force
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of sensor interpolation.")
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 10, 40], help='Recording lengths to benchmark.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed repetitions (best is reported).')
+    args = parser.parse_args()
+
+    print(f"{'minutes':>8} {'frames':>8} {'interpolate_data':>18} {'aligner':>10} {'speedup':>8} {'max diff':>10}")
+    for minutes in args.minutes:
+        streams = make_streams(minutes)
+        reference = run_reference(streams)
+        aligned = run_aligner(streams)
+        max_diff = max(np.abs(a - b).max() for a, b in zip(reference, aligned))
+
+        t_ref = min(timeit.repeat(lambda: run_reference(streams), number=1, repeat=args.repeat))
+        t_new = min(timeit.repeat(lambda: run_aligner(streams), number=1, repeat=args.repeat))
+        print(f"{minutes:>8g} {streams['img_ts'].size:>8} {t_ref * 1000:>16.1f}ms {t_new * 1000:>8.1f}ms "
+              f"{t_ref / t_new:>7.1f}x {max_diff:>10.2e}")
+
+    streams = make_streams(args.minutes[0])
+    for mode in TimelineAligner.MODES:
+        t = min(timeit.repeat(lambda: run_aligner(streams, mode), number=1, repeat=args.repeat))
+        print(f"mode={mode:<8} {t * 1000:.1f}ms ({args.minutes[0]:g} min)")
+
+if __name__ == '__main__':
+    main()
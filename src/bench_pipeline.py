@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+process_data 端到端基准：用 make_synthetic_bags 生成不同时长的合成录制，按多种处理配置运行 process_directory，
+报告提取、插值、分段、解码、编码各阶段的耗时、帧率和峰值内存。
+每个用例在单独的进程中运行，峰值内存互不影响。
+用法: python3 bench_pipeline.py --minutes 1 5 --configs default stream passthrough
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+import concurrent.futures
+
+from make_synthetic_bags import write_recording, parse_size
+from process_data import run_directory_job
+from logic.profiler import append_jsonl
+
+# 配置名称 -> process_directory 的参数
+CONFIGS = {
+    'default': {},
+    'stream': {'stream_mode': True},
+    'passthrough': {'passthrough': True},
+    'intra': {'encoding': 'intra'},
+    'short-gop': {'encoding': 'short-gop'},
+    'txt': {'sensor_format': 'txt'},
+}
+
+def run_case(recording_dir, output_dir, options, verbose=False):
+    """
+    在工作进程中处理一个录制，返回 run_directory_job 的结果（包含 profile）。
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            stack.enter_context(contextlib.redirect_stderr(devnull))
+        return run_directory_job(recording_dir, output_dir, profile=True, **options)
+
+def remove_case_outputs(output_root, name):
+    """删除一个用例的输出（单个输出目录及其分段目录），避免长时间基准占满磁盘。"""
+    for entry in os.listdir(output_root):
+        if entry == name or entry.startswith(f"{name}_"):
+            shutil.rmtree(os.path.join(output_root, entry), ignore_errors=True)
+
+def stage_seconds(profile, prefix):
+    return sum(stage['seconds'] for name, stage in profile['stages'].items() if name.startswith(prefix))
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end process_data benchmark on synthetic recordings.")
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 5], help='Recording lengths to benchmark.')
+    parser.add_argument('--configs', type=str, nargs='+', default=['default', 'passthrough'], choices=CONFIGS,
+                        help='Processing configurations to run for each recording.')
+    parser.add_argument('--size', type=str, default='640x480', help='Synthetic image size, WIDTHxHEIGHT.')
+    parser.add_argument('--hand-rate', type=float, default=100, help='Hand status rate (Hz).')
+    parser.add_argument('--segments', type=int, default=4, help='Number of keyboard start/stop intervals per recording.')
+    parser.add_argument('--data-dir', type=str, default=None, help='Keep generated recordings here and reuse them on later runs (default: temporary).')
+    parser.add_argument('--decode-threads', type=int, default=4, help='Decode threads per segment.')
+    parser.add_argument('--segment-workers', type=int, default=None, help='Segments of one recording written concurrently (default: min(segments, CPU count)).')
+    parser.add_argument('--jsonl', type=str, default=None, help='Append one JSON record per case to this file.')
+    parser.add_argument('--verbose', action='store_true', help='Show process_data logs.')
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    context = multiprocessing.get_context('spawn')
+    records = []
+    with contextlib.ExitStack() as stack:
+        data_dir = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory(prefix='synthetic-bags-'))
+        output_root = stack.enter_context(tempfile.TemporaryDirectory(prefix='bench-output-'))
+
+        print(f"{'minutes':>7} {'config':<12} {'frames':>7} {'extract':>8} {'interp':>8} {'segment':>8} {'decode':>8} "
+              f"{'encode':>8} {'write':>8} {'wall':>8} {'fps':>7} {'RSS MB':>7}")
+        for minutes in args.minutes:
+            recording = f"synthetic_{minutes:g}min_{size[0]}x{size[1]}_{args.hand_rate:g}hz"
+            recording_dir = os.path.join(data_dir, recording)
+            if not os.path.exists(os.path.join(recording_dir, 'keyboard.bag')):
+                start = time.perf_counter()
+                counts = write_recording(recording_dir, minutes, size=size, hand_rate=args.hand_rate,
+                                         segments=args.segments)
+                print(f"Generated {recording} ({counts['image']} frames) in {time.perf_counter() - start:.1f}s",
+                      file=sys.stderr)
+
+            for config in args.configs:
+                options = dict(CONFIGS[config], segment_mode=args.segments > 0, decode_threads=args.decode_threads,
+                               segment_workers=args.segment_workers)
+                output_dir = os.path.join(output_root, f"{recording}_{config}")
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_case, recording_dir, output_dir, options, args.verbose).result()
+                profile = result['profile']
+                if result['status'] != 'processed':
+                    print(f"{minutes:>7g} {config:<12} {result['status']}: {result['error']}")
+                    continue
+
+                print(f"{minutes:>7g} {config:<12} {profile['counters'].get('frames', 0):>7} "
+                      f"{stage_seconds(profile, 'extract:'):>7.2f}s {stage_seconds(profile, 'interpolate'):>7.3f}s "
+                      f"{stage_seconds(profile, 'segment'):>7.3f}s {stage_seconds(profile, 'decode'):>7.2f}s "
+                      f"{stage_seconds(profile, 'encode') + stage_seconds(profile, 'jpeg_encode'):>7.2f}s "
+                      f"{stage_seconds(profile, 'write'):>7.2f}s {profile['wall_seconds']:>7.2f}s "
+                      f"{profile['fps']:>7.1f} {profile['peak_rss_mb'] or 0:>7.0f}")
+                records.append(dict(type='bench', minutes=minutes, config=config, size=args.size,
+                                    hand_rate=args.hand_rate, options=options, **profile))
+                remove_case_outputs(output_root, f"{recording}_{config}")
+
+    print("\nStage times of concurrent stages (decode, encode) are summed over threads and can exceed wall time.")
+    if args.jsonl:
+        append_jsonl(args.jsonl, records)
+        print(f"Results appended to {args.jsonl}")
+
+if __name__ == '__main__':
+    main()
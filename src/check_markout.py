@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+并行读取所有 markout 标注文件，对照视频的真实帧数检查标注，并汇总为一个 JSONL 文件和统计信息。
+用法: python3 check_markout.py --video_dir ../video --markout_dir ../markout --output markout.jsonl --workers 8
+
+JSONL 中每行对应一个标注文件：原始的标注和 pre_instructions、视频的真实帧数（来自逐帧索引、逐帧时间戳或
+容器元数据，不解码视频）、被标注覆盖的帧数，以及发现的问题列表 problems，每个问题为
+{"type": ..., "annotations": [标注序号]}，类型包括：
+  unreadable            标注文件无法解析
+  missing_video         找不到对应的视频
+  frame_total_mismatch  文件中的 frame_num_total 与视频的真实帧数不一致
+  malformed             标注不是 JSON 对象，或 start/end 缺失、不是整数
+  empty                 start > end 或 instruction 为空
+  out_of_range          start < 0 或 end 超出视频的最后一帧
+  overlap               与 start 更早（相同时序号更小）的某条标注的帧区间重叠
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import collections
+import concurrent.futures
+import numpy as np
+
+from logic.video_files import find_video_file
+from logic.video_index import count_video_frames
+
+def parse_interval(annotation):
+    """返回标注的帧区间 (start, end)；标注不是字典，或 start/end 缺失、不是整数时返回 None。"""
+    if not isinstance(annotation, dict):
+        return None
+    try:
+        return int(annotation['start']), int(annotation['end'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def find_annotation_problems(annotations, num_frames):
+    """
+    检查一个文件中的标注。区间按 start 排序后与之前所有区间的最大 end 比较，即可一次找出所有重叠。
+    格式错误的标注只报告为 malformed，不参与其他检查和覆盖帧数的统计。
+    :param annotations: DataHandler.format_annotation 格式的标注列表。
+    :param num_frames: 视频的真实帧数；为 None 时不检查越界。
+    :return: (问题列表, 被标注覆盖的帧数)；num_frames 为 None 时覆盖帧数不截断到视频范围内。
+    """
+    problems = []
+    if not annotations:
+        return problems, 0
+    intervals = [parse_interval(a) for a in annotations]
+    malformed = np.array([interval is None for interval in intervals])
+    # 格式错误的标注记为 start > end 的空区间，自然被排除在之后的检查之外
+    starts = np.array([interval[0] if interval else 0 for interval in intervals], dtype=np.int64)
+    ends = np.array([interval[1] if interval else -1 for interval in intervals], dtype=np.int64)
+    blank = np.array([interval is not None and not str(a.get('instruction', '')).strip()
+                      for a, interval in zip(annotations, intervals)])
+
+    def add(kind, mask):
+        if np.any(mask):
+            problems.append({'type': kind, 'annotations': np.flatnonzero(mask).tolist()})
+
+    add('malformed', malformed)
+    valid = starts <= ends
+    add('empty', (~valid & ~malformed) | blank)
+    if num_frames is not None:
+        add('out_of_range', valid & ((starts < 0) | (ends >= num_frames)))
+
+    order = np.flatnonzero(valid)[np.argsort(starts[valid], kind='stable')]
+    overlap = np.zeros(len(annotations), dtype=bool)
+    if len(order) > 1:
+        previous_end = np.maximum.accumulate(ends[order])[:-1]
+        overlap[order[1:]] = starts[order[1:]] <= previous_end
+    add('overlap', overlap)
+
+    # 覆盖帧数：按 start 排序后，每个区间只计入超出之前所有区间最大 end 的部分
+    if num_frames is not None:
+        starts, ends = np.maximum(starts, 0), np.minimum(ends, num_frames - 1)
+    order = order[starts[order] <= ends[order]]
+    if len(order) == 0:
+        return problems, 0
+    previous_end = np.concatenate([[-1], np.maximum.accumulate(ends[order])[:-1]])
+    covered = ends[order] - np.maximum(starts[order], previous_end + 1) + 1
+    return problems, int(np.maximum(covered, 0).sum())
+
+def check_markout_file(path, video_base_dir):
+    """
+    工作进程：读取并检查一个标注文件。
+    :return: 该文件的 JSONL 记录。
+    """
+    record = {'file': os.path.basename(path), 'video_name': os.path.splitext(os.path.basename(path))[0]}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, IOError, UnicodeDecodeError) as e:
+        record.update(problems=[{'type': 'unreadable', 'error': str(e)}], annotations=[])
+        return record
+
+    if not isinstance(data, dict) or not isinstance(data.get('annotations') or [], list):
+        error = 'top level is not a JSON object' if not isinstance(data, dict) else 'annotations is not a list'
+        record.update(problems=[{'type': 'unreadable', 'error': error}], annotations=[])
+        return record
+
+    record['video_name'] = data.get('video_name') or record['video_name']
+    video_dir = os.path.join(video_base_dir, record['video_name'])
+    video_path = find_video_file(video_dir)
+    num_frames = count_video_frames(video_dir, video_path) if video_path is not None else None
+    annotations = data.get('annotations') or []
+    problem = data.get('problem') if isinstance(data.get('problem'), dict) else {}
+    record.update(abolished=bool(problem.get('abolished')), issue=bool(problem.get('issue')),
+                  frame_num_total=data.get('frame_num_total'), num_frames=num_frames)
+
+    problems = []
+    if video_path is None:
+        problems.append({'type': 'missing_video'})
+    elif data.get('frame_num_total') and data['frame_num_total'] != num_frames:
+        problems.append({'type': 'frame_total_mismatch'})
+    try:
+        annotation_problems, annotated_frames = find_annotation_problems(annotations, num_frames)
+    except (TypeError, ValueError, OverflowError) as e:
+        annotation_problems, annotated_frames = [{'type': 'unreadable', 'error': str(e)}], 0
+    problems.extend(annotation_problems)
+    if num_frames is None:
+        annotated_frames = None  # 没有视频时覆盖帧数没有意义，不计入汇总
+    record.update(annotated_frames=annotated_frames, problems=problems, annotations=annotations,
+                  pre_instructions=data.get('pre_instructions') or [])
+    return record
+
+def summarize(records):
+    """汇总统计：文件数、标注数、帧数、覆盖率以及各类问题的数量。records 只遍历一次，可以是生成器。"""
+    summary = collections.OrderedDict(files=0, abolished=0, annotated_files=0, annotations=0, total_frames=0,
+                                      annotated_frames=0, files_with_problems=0)
+    problem_files, problem_annotations = collections.Counter(), collections.Counter()
+    for record in records:
+        summary['files'] += 1
+        summary['files_with_problems'] += bool(record['problems'])
+        summary['abolished'] += bool(record.get('abolished'))
+        summary['annotated_files'] += bool(record['annotations'])
+        summary['annotations'] += len(record['annotations'])
+        summary['total_frames'] += record.get('num_frames') or 0
+        summary['annotated_frames'] += record.get('annotated_frames') or 0
+        for problem in record['problems']:
+            problem_files[problem['type']] += 1
+            problem_annotations[problem['type']] += len(problem.get('annotations', []))
+    summary['annotated_fraction'] = round(summary['annotated_frames'] / max(1, summary['total_frames']), 4)
+    summary['problem_files'] = dict(problem_files)
+    summary['problem_annotations'] = {kind: count for kind, count in problem_annotations.items() if count}
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Check all markout annotation files against the real video frame counts and consolidate them into one JSONL file.")
+    parser.add_argument('--video_dir', type=str, default='../video', help='Directory with processed video folders.')
+    parser.add_argument('--markout_dir', type=str, default='../markout', help='Directory with annotation JSON files.')
+    parser.add_argument('--output', type=str, default='markout.jsonl', help='Consolidated JSONL file to write (one line per annotation file).')
+    parser.add_argument('--summary', type=str, default=None, help='Also write the summary statistics to this JSON file.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    markout_dir = os.path.abspath(args.markout_dir)
+    if not os.path.isdir(markout_dir):
+        print(f"Error: Markout directory not found at {markout_dir}")
+        sys.exit(1)
+    video_base_dir = os.path.abspath(args.video_dir)
+    paths = sorted(glob.glob(os.path.join(markout_dir, '*.json')))
+
+    start_time = time.perf_counter()
+    temp_path = f"{args.output}.tmp-{os.getpid()}"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            chunksize = max(1, min(256, len(paths) // (max(1, args.workers) * 4)))
+
+            def written_records():
+                # 按文件名顺序边写边汇总，不在内存中保留所有记录
+                for record in executor.map(check_markout_file, paths, [video_base_dir] * len(paths),
+                                           chunksize=chunksize):
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    yield record
+
+            summary = summarize(written_records())
+        os.replace(temp_path, args.output)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    summary['seconds'] = round(time.perf_counter() - start_time, 2)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {summary['files']} record(s) to {args.output}; {summary['files_with_problems']} file(s) with problems.")
+
+if __name__ == '__main__':
+    main()
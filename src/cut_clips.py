@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按 markout 标注批量裁剪片段：每条标注 {instruction, start, end} 输出一个目录，包含该帧区间的视频、
+对应行的传感器数据和 clip.json。
+用法: python3 cut_clips.py --video_dir ../video --markout_dir ../markout --output_dir ../clips --workers 8
+
+视频尽量不重新编码：
+  - 全帧内的 MJPEG video.avi（--passthrough 或 --encoding intra 的输出）按逐帧索引直接复制 JPEG 数据；
+  - video.mp4 的区间起点是关键帧（见 video_index.npy）且系统中有 ffmpeg 时，用 ffmpeg 流复制；
+  - 其他情况从起点之前的关键帧开始解码，重新编码为 mp4v。
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import collections
+import concurrent.futures
+import numpy as np
+import cv2
+
+from logic.avi_writer import MjpegAviWriter
+from logic.manifest import is_temp_output_dir, temp_output_dir, replace_directory
+from logic.video_files import find_video_file
+from logic.video_index import (FRAME_INDEX_FILE, JpegFrameReader, count_video_frames, decode_frames,
+                               decode_mp4_frames, load_frame_index, read_mp4_frame_index, save_frame_index)
+
+CLIP_FILE = 'clip.json'
+
+# 每个任务处理同一视频的最多这么多条标注：传感器数据只加载一次，同时各视频之间仍能并行
+CLIPS_PER_TASK = 16
+
+def load_episode_annotations(markout_dir):
+    """
+    读取所有标注文件，跳过标记为 problem.abolished 的片段。
+    :return: 列表 [(视频名, 标注列表)] 以及被跳过的文件数。
+    """
+    episodes, abolished = [], 0
+    for path in sorted(glob.glob(os.path.join(markout_dir, '*.json'))):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading {path}: {e}")
+            continue
+        if not isinstance(data, dict):
+            print(f"Warning: skipping {path}: top level is not a JSON object.")
+            continue
+        if (data.get('problem') or {}).get('abolished'):
+            abolished += 1
+            continue
+        name = data.get('video_name') or os.path.splitext(os.path.basename(path))[0]
+        if isinstance(data.get('annotations'), list) and data['annotations']:
+            episodes.append((name, data['annotations']))
+    return episodes, abolished
+
+def clip_record(video_name, index, annotation):
+    return {'video_name': video_name, 'annotation_index': index, 'instruction': annotation.get('instruction', ''),
+            'start': int(annotation['start']), 'end': int(annotation['end'])}
+
+def clip_up_to_date(clip_dir, record):
+    """输出目录中已有相同来源和帧区间的裁剪结果。"""
+    try:
+        with open(os.path.join(clip_dir, CLIP_FILE), 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    return all(existing.get(key) == value for key, value in record.items())
+
+def load_sensor_rows(video_dir):
+    """
+    读取片段目录中的逐帧数据：.npy 以 memory-map 方式加载（逐帧索引除外），.txt 读取为行列表，
+    裁剪时按帧区间切片，保持原来的格式不变。
+    :return: 字典 {文件名: 数组或行列表}。
+    """
+    rows = {}
+    for path in sorted(glob.glob(os.path.join(video_dir, '*.npy'))):
+        if os.path.basename(path) != FRAME_INDEX_FILE:
+            rows[os.path.basename(path)] = np.load(path, mmap_mode='r')
+    for path in sorted(glob.glob(os.path.join(video_dir, '*.txt'))):
+        with open(path, 'r') as f:
+            rows[os.path.basename(path)] = f.readlines()
+    return rows
+
+def write_sensor_rows(clip_dir, rows, start, end):
+    for file_name, data in rows.items():
+        path = os.path.join(clip_dir, file_name)
+        if isinstance(data, list):
+            with open(path, 'w') as f:
+                f.writelines(data[start:end + 1])
+        else:
+            np.save(path, np.ascontiguousarray(data[start:end + 1]))
+
+def copy_mjpeg(video_path, index, clip_dir, start, end, fps):
+    """按逐帧索引把 [start, end] 的 JPEG 数据直接复制进新的 MJPEG AVI。"""
+    reader = JpegFrameReader(video_path, index)
+    try:
+        first = reader.read_jpeg(start)
+        image = cv2.imdecode(np.frombuffer(first, np.uint8), cv2.IMREAD_COLOR)
+        height, width = image.shape[:2]
+        with MjpegAviWriter(os.path.join(clip_dir, 'video.avi'), width, height, fps) as writer:
+            writer.write(first)
+            for i in range(start + 1, end + 1):
+                writer.write(reader.read_jpeg(i))
+            save_frame_index(clip_dir, writer.frame_index)
+    finally:
+        reader.close()
+    return True
+
+def same_samples(video_path, index, clip_path, clip_index, start):
+    """
+    检查流复制的输出是否正好从源视频的第 start 帧开始：各样本的长度与源视频逐帧索引中对应的样本一致，
+    且第一个样本的数据逐字节相同。
+    """
+    sizes = np.asarray(index['size'][start:start + len(clip_index)])
+    if len(sizes) != len(clip_index) or not np.array_equal(sizes, clip_index['size']):
+        return False
+    with open(video_path, 'rb') as source, open(clip_path, 'rb') as clip:
+        source.seek(int(index['offset'][start]))
+        clip.seek(int(clip_index['offset'][0]))
+        return source.read(int(sizes[0])) == clip.read(int(sizes[0]))
+
+def copy_mp4_stream(video_path, index, clip_dir, start, end, fps):
+    """
+    用 ffmpeg 流复制裁剪 MP4，start 必须是关键帧。输出的帧数与区间不一致，或第一帧不是源视频的第 start 帧时返回 False，
+    由调用方重新编码。
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return False
+    output_path = os.path.join(clip_dir, 'video.mp4')
+    # 向上取整到微秒，使 ffmpeg 向前查找关键帧时正好落在 start 上
+    seek = np.ceil(start * 1e6 / fps) / 1e6
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-ss', f'{seek:.6f}', '-i', video_path, '-map', '0:v:0',
+               '-c', 'copy', '-frames:v', str(end - start + 1), '-avoid_negative_ts', 'make_zero', output_path]
+    if subprocess.run(command, stdin=subprocess.DEVNULL).returncode != 0:
+        return False
+    frame_index = read_mp4_frame_index(output_path)
+    if (frame_index is None or len(frame_index) != end - start + 1 or not frame_index['keyframe'][0]
+            or not same_samples(video_path, index, output_path, frame_index, start)):
+        os.remove(output_path)
+        return False
+    save_frame_index(clip_dir, frame_index)
+    return True
+
+def reencode(video_path, index, clip_dir, start, end, fps):
+    """
+    把 [start, end] 重新编码为 mp4v。MP4 按逐帧索引（没有 video_index.npy 时从 MP4 表中读取）用 decode_mp4_frames
+    从 start 之前最近的关键帧帧精确地解码，其他视频从头顺序解码。
+    """
+    if video_path.endswith('.mp4') and index is None:
+        index = read_mp4_frame_index(video_path)
+    if video_path.endswith('.mp4') and index is not None:
+        frames = decode_mp4_frames(video_path, index, start, end)
+    else:
+        frames = decode_frames(video_path, start, end)
+    output_path = os.path.join(clip_dir, 'video.mp4')
+    writer = None
+    for frame in frames:
+        if writer is None:
+            height, width = frame.shape[:2]
+            writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        writer.write(frame)
+    if writer is None:
+        return False
+    writer.release()
+    frame_index = read_mp4_frame_index(output_path)
+    if frame_index is not None:
+        save_frame_index(clip_dir, frame_index)
+    return True
+
+def cut_video_clips(video_dir, clips, fps):
+    """
+    工作进程：裁剪同一视频的若干标注。每个片段先写入临时目录，完成后再整体重命名。
+    :param clips: [(输出目录, clip_record)] 列表。
+    :return: 每个片段的 (输出目录, 方式)，方式为 'copy'、'stream-copy'、'reencode' 或 'failed'。
+    """
+    video_path = find_video_file(video_dir)
+    index = load_frame_index(video_dir)
+    intra = video_path.endswith('.avi') and index is not None and bool(np.all(index['keyframe']))
+    rows = load_sensor_rows(video_dir)
+    results = []
+    for clip_dir, record in clips:
+        start, end = record['start'], record['end']
+        temp_dir = temp_output_dir(clip_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        try:
+            if intra:
+                method = 'copy' if copy_mjpeg(video_path, index, temp_dir, start, end, fps) else 'failed'
+            elif index is not None and bool(index['keyframe'][start]) and copy_mp4_stream(
+                    video_path, index, temp_dir, start, end, fps):
+                method = 'stream-copy'
+            else:
+                method = 'reencode' if reencode(video_path, index, temp_dir, start, end, fps) else 'failed'
+        except Exception as e:
+            print(f"Error cutting {os.path.basename(clip_dir)}: {e}")
+            method = 'failed'
+        if method == 'failed':
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        else:
+            write_sensor_rows(temp_dir, rows, start, end)
+            with open(os.path.join(temp_dir, CLIP_FILE), 'w', encoding='utf-8') as f:
+                json.dump(dict(record, method=method), f, indent=4, ensure_ascii=False)
+            replace_directory(temp_dir, clip_dir)
+        results.append((clip_dir, method))
+    return results
+
+def plan_tasks(episodes, video_base_dir, output_dir, overwrite=False):
+    """
+    把所有标注整理成按视频分组的任务，并丢弃超出视频范围、为空或缺少 start/end 的标注。
+    :return: (任务列表 [(视频目录, 帧率, [(输出目录, clip_record)])], 统计 Counter)。
+    """
+    tasks, stats = [], collections.Counter()
+    for video_name, annotations in episodes:
+        video_dir = os.path.join(video_base_dir, video_name)
+        video_path = find_video_file(video_dir)
+        if video_path is None:
+            stats['missing video'] += len(annotations)
+            continue
+        capture = cv2.VideoCapture(video_path)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30
+        capture.release()
+        num_frames = count_video_frames(video_dir, video_path)
+
+        clips = []
+        for i, annotation in enumerate(annotations):
+            try:
+                record = clip_record(video_name, i, annotation)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                print(f"Warning: {video_name}: skipping malformed annotation {i}: {e!r}")
+                stats['malformed'] += 1
+                continue
+            if not 0 <= record['start'] <= record['end'] < num_frames:
+                stats['out of range'] += 1
+                continue
+            clip_dir = os.path.join(output_dir, f"{video_name}_clip{i:03d}")
+            if not overwrite and clip_up_to_date(clip_dir, record):
+                stats['up to date'] += 1
+                continue
+            clips.append((clip_dir, record))
+        for k in range(0, len(clips), CLIPS_PER_TASK):
+            tasks.append((video_dir, fps, clips[k:k + CLIPS_PER_TASK]))
+    return tasks, stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut one clip (video + sensor rows) per annotation in markout JSON files.")
+    parser.add_argument('--video_dir', type=str, default='../video', help='Directory with processed video folders.')
+    parser.add_argument('--markout_dir', type=str, default='../markout', help='Directory with annotation JSON files.')
+    parser.add_argument('--output_dir', type=str, default='../clips', help='Directory to write clip folders into.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes.')
+    parser.add_argument('--overwrite', action='store_true', help='Re-cut clips that already exist with the same frame range.')
+    args = parser.parse_args()
+
+    video_base_dir = os.path.abspath(args.video_dir)
+    markout_dir = os.path.abspath(args.markout_dir)
+    output_dir = os.path.abspath(args.output_dir)
+    if not os.path.isdir(markout_dir):
+        print(f"Error: Markout directory not found at {markout_dir}")
+        sys.exit(1)
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if is_temp_output_dir(name):
+            shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)  # 此前被中断的运行留下的临时目录
+
+    start_time = time.perf_counter()
+    episodes, abolished = load_episode_annotations(markout_dir)
+    tasks, stats = plan_tasks(episodes, video_base_dir, output_dir, args.overwrite)
+    if abolished:
+        stats['abolished files'] = abolished
+    num_clips = sum(len(clips) for _, _, clips in tasks)
+    print(f"Cutting {num_clips} clip(s) from {len(tasks)} task(s) with {args.workers} workers...")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [executor.submit(cut_video_clips, video_dir, clips, fps) for video_dir, fps, clips in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            for clip_dir, method in future.result():
+                stats[method] += 1
+                if method == 'failed':
+                    print(f"Error: Failed to cut {os.path.basename(clip_dir)}.")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Done in {elapsed:.1f}s ({num_clips / max(elapsed, 1e-9) * 60:.0f} clips/min): "
+          + ", ".join(f"{count} {name}" for name, count in sorted(stats.items())))
+    if stats['failed']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
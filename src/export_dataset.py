@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+把处理后的视频、对齐后的传感器数据和 markout 标注导出为训练用的分片数据集。
+用法: python3 export_dataset.py --video_dir ../video --markout_dir ../markout --output_dir ../dataset --workers 8
+
+输出目录结构:
+  shard-00000.tar ...  每个分片包含若干片段的连续帧块：<片段名>/<帧号>.jpg 以及该帧块的 <片段名>/<起始帧号>.npz
+                       （对齐后的传感器数组按帧切片，另含逐帧标注序号 annotation，未标注为 -1）
+  index.npy            逐帧索引（logic.dataset.DATASET_INDEX_DTYPE），可直接 seek 读取任意一帧的 JPEG 数据
+  episodes.json        每个片段的帧数、标注、传感器数组名和各帧块在分片中的位置
+"""
+
+import os
+import sys
+import glob
+import json
+import argparse
+import collections
+import concurrent.futures
+import numpy as np
+import cv2
+
+from logic.data_handler import DataHandler
+from logic.dataset import (DATASET_INDEX_DTYPE, DATASET_INDEX_FILE, EPISODES_FILE, ShardWriter, annotation_labels)
+from logic.manifest import is_temp_output_dir
+from logic.video_files import find_video_file
+from logic.video_index import (FRAME_INDEX_FILE, JpegFrameReader, count_video_frames, decode_frames,
+                               decode_mp4_frames, load_frame_index, read_mp4_frame_index)
+
+# 与 process_data 的 .txt 输出对应的数组名，没有 .npy 时从 .txt 读取
+LEGACY_TEXT_ARRAYS = ('arm', 'hand', 'hand_force')
+
+def load_sensor_arrays(video_dir):
+    """
+    以 memory-map 方式加载片段目录中的逐帧数组（.npy，逐帧索引除外）；只有旧版 .txt 输出时读取 .txt。
+    :return: 有序字典 {数组名: 数组}。
+    """
+    arrays = collections.OrderedDict()
+    for path in sorted(glob.glob(os.path.join(video_dir, '*.npy'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if os.path.basename(path) != FRAME_INDEX_FILE:
+            arrays[name] = np.load(path, mmap_mode='r')
+    for name in LEGACY_TEXT_ARRAYS:
+        path = os.path.join(video_dir, f'{name}.txt')
+        if name not in arrays and os.path.exists(path):
+            arrays[name] = np.loadtxt(path, ndmin=2)
+    return arrays
+
+def find_episodes(video_base_dir, markout_dir, include_unannotated=False):
+    """
+    列出要导出的片段：跳过没有视频或没有帧的目录、标记为 problem.abolished 的片段，
+    以及（未指定 include_unannotated 时）没有标注的片段。
+    :return: 片段字典的列表，包含 name、video_dir、video_path、num_frames、annotations 和 pre_instructions。
+    """
+    handler = DataHandler(markout_dir=markout_dir, video_base_dir=video_base_dir)
+    episodes, skipped = [], collections.Counter()
+    for name in sorted(os.listdir(video_base_dir)):
+        video_dir = os.path.join(video_base_dir, name)
+        if not os.path.isdir(video_dir) or is_temp_output_dir(name):
+            continue
+        video_path = find_video_file(video_dir)
+        if video_path is None:
+            skipped['no video'] += 1
+            continue
+        data = handler.load_data(name)
+        if data.get('problem', {}).get('abolished'):
+            skipped['abolished'] += 1
+            continue
+        if not data.get('annotations') and not include_unannotated:
+            skipped['unannotated'] += 1
+            continue
+        num_frames = count_video_frames(video_dir, video_path)
+        if num_frames <= 0:
+            skipped['empty'] += 1
+            continue
+        episodes.append({'name': name, 'video_dir': video_dir, 'video_path': video_path, 'num_frames': num_frames,
+                         'annotations': data.get('annotations', []),
+                         'pre_instructions': data.get('pre_instructions', [])})
+    return episodes, skipped
+
+def plan_chunks(num_frames, chunk_frames, keyframes=None):
+    """
+    把片段切成大约 chunk_frames 帧的帧块。给出关键帧标记时，帧块起点对齐到下一个关键帧，
+    使每个帧块都能从关键帧开始独立解码。
+    :return: 闭区间 (start, end) 列表。
+    """
+    if num_frames <= 0:
+        return []
+    starts = np.arange(0, num_frames, max(1, chunk_frames))
+    if keyframes is not None:
+        keyframe_positions = np.flatnonzero(keyframes)
+        snapped = np.searchsorted(keyframe_positions, starts)
+        starts = np.unique(keyframe_positions[snapped[snapped < len(keyframe_positions)]])
+        if len(starts) == 0 or starts[0] != 0:
+            starts = np.concatenate([[0], starts])
+    ends = np.concatenate([starts[1:] - 1, [num_frames - 1]])
+    return [(int(s), int(e)) for s, e in zip(starts, ends)]
+
+def read_chunk(video_path, start, end, jpeg_quality):
+    """
+    工作进程：读取 [start, end] 帧的 JPEG 数据。全帧内的 MJPEG AVI 按逐帧索引直接读取原始 JPEG，不解码；
+    MP4 按逐帧索引从 start 之前最近的关键帧开始帧精确地解码，再重新编码为 JPEG；其他视频从头顺序解码。
+    :return: JPEG 数据（bytes）列表；视频提前结束时少于 end - start + 1 个。
+    """
+    video_dir = os.path.dirname(video_path)
+    index = load_frame_index(video_dir)
+    if video_path.endswith('.avi') and index is not None and bool(np.all(index['keyframe'])):
+        reader = JpegFrameReader(video_path, index)
+        try:
+            return [reader.read_jpeg(i) for i in range(start, min(end, len(index) - 1) + 1)]
+        finally:
+            reader.close()
+
+    if video_path.endswith('.mp4') and index is None:
+        index = read_mp4_frame_index(video_path)
+    if video_path.endswith('.mp4') and index is not None:
+        frames = decode_mp4_frames(video_path, index, start, end)
+    else:
+        frames = decode_frames(video_path, start, end)
+    return [cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])[1].tobytes() for frame in frames]
+
+def export_dataset(episodes, output_dir, shard_bytes, chunk_frames=256, workers=4, jpeg_quality=95):
+    """
+    把片段导出为分片数据集。帧块在进程池中读取，按提交顺序写入分片；同时在途的帧块最多为 workers * 2 个，
+    内存占用与片段长度和数据集大小无关。
+    :return: 导出的帧数。
+    """
+    writer = ShardWriter(output_dir, shard_bytes)
+    index_parts, metadata = [], []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        def tasks():
+            for episode_id, episode in enumerate(episodes):
+                frame_index = load_frame_index(episode['video_dir'])
+                keyframes = None if frame_index is None else np.asarray(frame_index['keyframe'])
+                chunks = plan_chunks(episode['num_frames'], chunk_frames, keyframes)
+                for k, (start, end) in enumerate(chunks):
+                    # 已知视频提前结束的片段不再提交之后的帧块
+                    future = None if episode.get('truncated') else executor.submit(
+                        read_chunk, episode['video_path'], start, end, jpeg_quality)
+                    yield episode_id, start, end, k == len(chunks) - 1, future
+
+        def write_chunk(episode_id, start, end, last, future):
+            episode = episodes[episode_id]
+            if not metadata or metadata[-1]['id'] != episode_id:
+                # 片段的第一个帧块：加载传感器数组并展开标注
+                episode['arrays'] = load_sensor_arrays(episode['video_dir'])
+                episode['labels'] = annotation_labels(episode['num_frames'], episode['annotations'])
+                metadata.append({'id': episode_id, 'name': episode['name'], 'num_frames': episode['num_frames'],
+                                 'annotations': episode['annotations'], 'pre_instructions': episode['pre_instructions'],
+                                 'arrays': list(episode['arrays']), 'chunks': []})
+            if episode.get('truncated'):
+                if future is not None:
+                    future.cancel()
+            else:
+                jpegs = future.result()
+                if jpegs:
+                    write_frames(episode_id, episode, start, jpegs)
+                if len(jpegs) < end - start + 1:
+                    # 视频比时间戳或逐帧索引短：之后的帧块都跳过，episodes.json 中记录实际导出的帧数
+                    print(f"Warning: {episode['name']}: expected frames {start}-{end}, got {len(jpegs)}.")
+                    episode['truncated'] = True
+                    metadata[-1]['num_frames'] = start + len(jpegs)
+            if last:
+                episode.pop('arrays', None)
+                episode.pop('labels', None)
+
+        def write_frames(episode_id, episode, start, jpegs):
+            rows = np.zeros(len(jpegs), dtype=DATASET_INDEX_DTYPE)
+            rows['episode'], rows['frame'] = episode_id, np.arange(start, start + len(jpegs))
+            for i, jpeg in enumerate(jpegs):
+                rows['shard'][i], rows['offset'][i], rows['size'][i] = writer.add(
+                    f"{episode['name']}/{start + i:06d}.jpg", jpeg)
+            stop = start + len(jpegs)
+            arrays = {name: np.asarray(array[start:stop]) for name, array in episode['arrays'].items()}
+            shard, offset, size = writer.add_npz(f"{episode['name']}/{start:06d}.npz",
+                                                 annotation=episode['labels'][start:stop], **arrays)
+            metadata[-1]['chunks'].append({'start': start, 'end': stop - 1, 'shard': shard,
+                                           'npz_offset': offset, 'npz_size': size})
+            index_parts.append(rows)
+            writer.rollover()
+
+        pending = collections.deque()
+        try:
+            for task in tasks():
+                pending.append(task)
+                if len(pending) >= max(1, workers) * 2:
+                    write_chunk(*pending.popleft())
+            while pending:
+                write_chunk(*pending.popleft())
+        except BaseException:
+            writer.abort()
+            raise
+    writer.close()
+
+    index = np.concatenate(index_parts) if index_parts else np.zeros(0, dtype=DATASET_INDEX_DTYPE)
+    np.save(os.path.join(output_dir, DATASET_INDEX_FILE), index)
+    with open(os.path.join(output_dir, EPISODES_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'shards': writer.shard_names, 'episodes': metadata}, f, indent=2, ensure_ascii=False)
+    return len(index)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export videos, aligned sensor arrays and annotations as a sharded training dataset.")
+    parser.add_argument('--video_dir', type=str, default='../video', help='Directory with processed video folders.')
+    parser.add_argument('--markout_dir', type=str, default='../markout', help='Directory with annotation JSON files.')
+    parser.add_argument('--output_dir', type=str, default='../dataset', help='Directory to write shards and index files into.')
+    parser.add_argument('--shard-size', type=float, default=1024, help='Target shard size in MB.')
+    parser.add_argument('--chunk-frames', type=int, default=256, help='Frames per chunk (the unit of parallel work and of shard packing).')
+    parser.add_argument('--workers', type=int, default=4, help='Number of processes reading video chunks.')
+    parser.add_argument('--jpeg-quality', type=int, default=95, help='JPEG quality when frames have to be decoded and re-encoded.')
+    parser.add_argument('--include-unannotated', action='store_true', help='Also export episodes without annotations.')
+    args = parser.parse_args()
+
+    video_base_dir = os.path.abspath(args.video_dir)
+    if not os.path.isdir(video_base_dir):
+        print(f"Error: Video directory not found at {video_base_dir}")
+        sys.exit(1)
+    output_dir = os.path.abspath(args.output_dir)
+    for path in glob.glob(os.path.join(output_dir, 'shard-*.tar')):
+        os.remove(path)  # 上一次导出的分片
+
+    episodes, skipped = find_episodes(video_base_dir, os.path.abspath(args.markout_dir), args.include_unannotated)
+    print(f"Exporting {len(episodes)} episode(s) ({sum(e['num_frames'] for e in episodes)} frames); skipped: "
+          + (", ".join(f"{count} {reason}" for reason, count in skipped.items()) or "none"))
+    num_frames = export_dataset(episodes, output_dir, int(args.shard_size * 1e6), args.chunk_frames, args.workers,
+                                args.jpeg_quality)
+    print(f"Wrote {num_frames} frames to {output_dir}.")
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,8 @@ from PyQt6.QtGui import QKeyEvent
 from gui.video_player_widget import VideoPlayerWidget
 from gui.annotation_widget import AnnotationWidget
 from logic.data_handler import DataHandler
+from logic.video_files import find_video_file
+from logic.manifest import is_temp_output_dir
 
 class MainWindow(QMainWindow):
     """
@@ -64,10 +66,11 @@ class MainWindow(QMainWindow):
             return
             
         for item in sorted(os.listdir(self.video_base_dir)):
-            # 确保每个项目都是一个目录，并且包含一个名为 video.mp4 的文件
+            # 确保每个项目都是一个目录，并且包含 video.mp4 或 video.avi
             project_path = os.path.join(self.video_base_dir, item)
-            video_file_path = os.path.join(project_path, 'video.mp4')
-            if os.path.isdir(project_path) and os.path.exists(video_file_path):
+            if is_temp_output_dir(item):
+                continue  # 数据处理脚本正在写入或替换的目录
+            if os.path.isdir(project_path) and find_video_file(project_path):
                 list_item = QListWidgetItem(item)
                 self.video_list_widget.addItem(list_item)
 
@@ -86,7 +89,7 @@ class MainWindow(QMainWindow):
             self.load_video_data(self.current_video_name)
     
     def load_video_data(self, video_name: str):
-        """加载视频的标注数据和对应的MP4文件。"""
+        """加载视频的标注数据和对应的视频文件。"""
         print(f"Loading data for: {video_name}")
         self.setWindowTitle(f"Video Annotation Tool - {video_name}")
         
@@ -94,7 +97,8 @@ class MainWindow(QMainWindow):
         data = self.data_handler.load_data(video_name)
         self.annotation_widget.load_data(data)
         
-        video_file_path = os.path.join(self.video_base_dir, video_name, 'video.mp4')
+        project_path = os.path.join(self.video_base_dir, video_name)
+        video_file_path = find_video_file(project_path) or os.path.join(project_path, 'video.mp4')
         self.video_player.load_video(video_file_path)
 
         # NEW: Update timeline after loading video and its data.
@@ -127,7 +131,9 @@ class MainWindow(QMainWindow):
         for ann in ui_data['annotations']:
             formatted_annotations.append(
                 self.data_handler.format_annotation(
-                    ann['instruction'], ann['start'], ann['end']
+                    ann['instruction'], ann['start'], ann['end'],
+                    start_time=self.video_player.timestamp_at(ann['start']),
+                    end_time=self.video_player.timestamp_at(ann['end'])
                 )
             )
         full_data['annotations'] = formatted_annotations
@@ -151,6 +157,10 @@ class MainWindow(QMainWindow):
                 # to ensure the text edit loses focus.
                 self.video_player.setFocus()
                 return True
+
+            if self.video_player.time_input.hasFocus():
+                # 时间输入框自己处理回车和方向键
+                return False
             
             if key in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
                 self.annotation_widget.add_annotation()
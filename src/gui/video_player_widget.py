@@ -1,15 +1,20 @@
 import os
+import re
+import datetime
+from typing import Optional
 import cv2
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QSlider, QHBoxLayout, QPushButton
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QSlider, QHBoxLayout, QPushButton, QLineEdit
 from PyQt6.QtGui import QPixmap, QImage
 from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 
 # Import the timeline widget
 from gui.timeline_widget import AnnotationTimelineWidget
+from logic.video_index import load_frame_index, count_video_frames, JpegFrameReader
+from logic.frame_times import load_frame_timestamps, estimate_fps, frame_at_time
 
 class VideoPlayerWidget(QWidget):
     """
-    一个用于直接播放MP4视频文件的自定义控件。
+    一个用于直接播放视频文件（MP4 或 MJPEG AVI）的自定义控件。
     它包含一个显示标签、一个导航滑块和播放控制按钮。
     """
     # 当帧索引改变时发出信号，携带新的帧号。
@@ -18,6 +23,8 @@ class VideoPlayerWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.video_capture = None
+        self.frame_reader = None # 全帧内 MJPEG 视频的逐帧直读器，可直接定位任意帧
+        self.frame_timestamps = None # 逐帧时间戳（秒），来自视频旁的 timestamps.npy
         self.current_frame_index = -1
         self.total_frames = 0
         self.is_playing = False
@@ -43,6 +50,10 @@ class VideoPlayerWidget(QWidget):
         
         self.current_frame_label = QLabel("Frame: N/A")
         self.frame_number_label = QLabel("Total Frames: 0")
+        self.time_input = QLineEdit()
+        self.time_input.setPlaceholderText("Go to HH:MM:SS.fff / +sec")
+        self.time_input.setMaximumWidth(200)
+        self.time_input.setEnabled(False)
 
         # --- 布局 ---
         control_layout = QHBoxLayout()
@@ -52,6 +63,7 @@ class VideoPlayerWidget(QWidget):
         control_layout.addStretch()
         control_layout.addWidget(self.current_frame_label)
         control_layout.addStretch()
+        control_layout.addWidget(self.time_input)
         control_layout.addWidget(self.frame_number_label)
 
         main_layout = QVBoxLayout()
@@ -72,15 +84,17 @@ class VideoPlayerWidget(QWidget):
         self.prev_frame_button.clicked.connect(self.go_to_prev_frame)
         self.next_frame_button.clicked.connect(self.go_to_next_frame)
         self.timeline.segmentClicked.connect(self.play_segment)
+        self.time_input.returnPressed.connect(self.go_to_time_input)
 
     def load_video(self, video_path: str):
         """
-        加载指定的MP4视频文件并准备播放。
+        加载指定的视频文件并准备播放。
         """
         self.stop_playback()
-        if self.video_capture:
-            self.video_capture.release()
-            self.video_capture = None
+        self.cleanup()
+        self.video_capture = None
+        self.frame_reader = None
+        self.frame_timestamps = None
 
         if not os.path.exists(video_path):
             self.image_label.setText(f"Video file not found:\n{video_path}")
@@ -93,14 +107,24 @@ class VideoPlayerWidget(QWidget):
             self._reset_player_state()
             return
 
-        self.total_frames = int(self.video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = self.video_capture.get(cv2.CAP_PROP_FPS)
+        # 真实帧数来自逐帧索引或逐帧时间戳，不依赖 mp4v 上不可靠的 CAP_PROP_FRAME_COUNT
+        video_dir = os.path.dirname(video_path)
+        self.total_frames = count_video_frames(video_dir, video_path)
+        # 如果有 video_index.npy 且每帧都是关键帧，则绕过 VideoCapture 的 seek，直接按偏移读取 JPEG
+        frame_index = load_frame_index(video_dir)
+        if frame_index is not None and len(frame_index) > 0 and video_path.endswith('.avi') and frame_index['keyframe'].all():
+            self.frame_reader = JpegFrameReader(video_path, frame_index)
+        timestamps = load_frame_timestamps(video_dir)
+        if timestamps is not None and len(timestamps) == self.total_frames:
+            self.frame_timestamps = timestamps
+        fps = estimate_fps(self.frame_timestamps, default=self.video_capture.get(cv2.CAP_PROP_FPS))
         
         self.timer.setInterval(int(1000 / fps) if fps > 0 else 40)
 
         if self.total_frames > 0:
             self.slider.setRange(0, self.total_frames - 1)
             self.frame_number_label.setText(f"Total Frames: {self.total_frames}")
+            self.time_input.setEnabled(self.frame_timestamps is not None)
             self.segment_info_label.setText("Click a segment on the timeline to see its instruction.")
             self.set_frame_by_index(0)
         else:
@@ -111,8 +135,10 @@ class VideoPlayerWidget(QWidget):
         """重置播放器状态。"""
         self.total_frames = 0
         self.current_frame_index = -1
+        self.frame_timestamps = None
         self.slider.setRange(0, 0)
         self.current_frame_label.setText("Frame: N/A")
+        self.time_input.setEnabled(False)
         self.timeline.set_data([], 0)
         self.segment_info_label.setText("Click a segment on the timeline to see its instruction.")
 
@@ -122,18 +148,66 @@ class VideoPlayerWidget(QWidget):
         """
         if not self.video_capture or not (0 <= index < self.total_frames):
             return
-            
-        self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, index)
-        ret, frame = self.video_capture.read()
+
+        if self.frame_reader:
+            frame = self.frame_reader.read(index)
+            ret = frame is not None
+        else:
+            self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = self.video_capture.read()
 
         if ret and index != self.current_frame_index:
             self.current_frame_index = index
             self._display_frame(frame)
             if not self.slider.isSliderDown():
                 self.slider.setValue(index)
-            self.current_frame_label.setText(f"Frame: {index}")
+            self._update_frame_label()
             self.frameChanged.emit(index)
 
+    def timestamp_at(self, index: int) -> Optional[float]:
+        """返回指定帧的时间戳（秒，Unix 时间）；没有逐帧时间戳或帧号越界时返回 None。"""
+        if self.frame_timestamps is None or not (0 <= index < len(self.frame_timestamps)):
+            return None
+        return float(self.frame_timestamps[index])
+
+    def go_to_timestamp(self, t: float):
+        """跳转到时间戳最接近 t（秒，Unix 时间）的帧，在逐帧时间戳上二分查找。"""
+        if self.frame_timestamps is not None:
+            self.set_frame_by_index(frame_at_time(self.frame_timestamps, t))
+
+    def go_to_time_input(self):
+        """
+        解析时间输入框并跳转：'HH:MM:SS[.fff]' 为录制当天的时钟时间，'+12.5' 或 '12.5' 为相对第一帧的秒数，
+        大于 1e9 的数字为 Unix 时间戳。
+        """
+        if self.frame_timestamps is None:
+            return
+        text = self.time_input.text().strip()
+        first = float(self.frame_timestamps[0])
+        clock = re.fullmatch(r'(\d{1,2}):(\d{2}):(\d{2}(?:\.\d+)?)', text)
+        try:
+            if clock:
+                day = datetime.datetime.fromtimestamp(first).replace(hour=0, minute=0, second=0, microsecond=0)
+                t = day.timestamp() + int(clock.group(1)) * 3600 + int(clock.group(2)) * 60 + float(clock.group(3))
+            else:
+                value = float(text)
+                t = value if value > 1e9 else first + value
+        except ValueError:
+            self.time_input.selectAll()
+            return
+        self.go_to_timestamp(t)
+        self.setFocus()
+
+    def _update_frame_label(self):
+        """显示当前帧号；有逐帧时间戳时同时显示该帧的时钟时间和相对第一帧的秒数。"""
+        index = self.current_frame_index
+        t = self.timestamp_at(index)
+        if t is None:
+            self.current_frame_label.setText(f"Frame: {index}")
+            return
+        clock = datetime.datetime.fromtimestamp(t).strftime('%H:%M:%S.%f')[:-3]
+        self.current_frame_label.setText(f"Frame: {index} | {clock} (+{t - self.frame_timestamps[0]:.3f}s)")
+
     def set_frame_by_slider(self, index: int):
         """当滑块被手动拖动时调用。"""
         self.set_frame_by_index(index)
@@ -174,16 +248,24 @@ class VideoPlayerWidget(QWidget):
             self.stop_playback()
             return
 
-        if self.video_capture:
+        if self.frame_reader:
+            next_index = self.current_frame_index + 1
+            frame = self.frame_reader.read(next_index) if next_index < self.total_frames else None
+            ret = frame is not None
+        elif self.video_capture:
             ret, frame = self.video_capture.read()
-            if ret:
-                self.current_frame_index = int(self.video_capture.get(cv2.CAP_PROP_POS_FRAMES)) - 1
-                self._display_frame(frame)
-                self.slider.setValue(self.current_frame_index)
-                self.current_frame_label.setText(f"Frame: {self.current_frame_index}")
-                self.frameChanged.emit(self.current_frame_index)
-            else:
-                self.stop_playback()
+            next_index = int(self.video_capture.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+        else:
+            return
+
+        if ret:
+            self.current_frame_index = next_index
+            self._display_frame(frame)
+            self.slider.setValue(self.current_frame_index)
+            self._update_frame_label()
+            self.frameChanged.emit(self.current_frame_index)
+        else:
+            self.stop_playback()
 
     def go_to_next_frame(self):
         if self.total_frames > 0:
@@ -199,6 +281,8 @@ class VideoPlayerWidget(QWidget):
         """释放视频捕获对象。"""
         if self.video_capture:
             self.video_capture.release()
+        if self.frame_reader:
+            self.frame_reader.close()
 
     def resizeEvent(self, event):
         """处理窗口大小调整以重新缩放图像。"""
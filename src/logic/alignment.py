@@ -0,0 +1,136 @@
+import collections
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# 一条源时间轴相对目标时间轴的对齐方案：
+# lo/hi 为每个目标时刻左右两侧源样本的索引（源时间轴为空时为 None），weight 为线性插值权重（非线性模式下为 None），
+# valid 标记该目标时刻是否在 max_gap 容忍范围内。
+AlignmentPlan = collections.namedtuple('AlignmentPlan', ['lo', 'hi', 'weight', 'valid'])
+
+
+class TimelineAligner:
+    """
+    将多个传感器流对齐到同一条目标时间轴（通常是图像时间戳）。
+
+    对每条源时间轴只计算一次 searchsorted 索引和插值权重，
+    然后把共享该时间轴的所有数据流拼接成一个矩阵，用一次向量化 gather 完成对齐。
+    """
+    MODES = ('linear', 'nearest', 'previous')
+
+    def __init__(self, target_ts, mode: str = 'linear', max_gap: Optional[float] = None):
+        """
+        初始化对齐器。
+
+        Args:
+            target_ts: 目标时间戳 (Numpy array，秒)。
+            mode (str): 'linear' 线性插值（与 np.interp 相同，两端取边界值），
+                        'nearest' 取最近的源样本，'previous' 取不晚于目标时刻的最后一个源样本（零阶保持）。
+            max_gap (Optional[float]): 最大容忍间隔（秒）。超出时不会报错，而是在 valid 掩码中标记为 False。
+                                       为 None 时不做检查。
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown alignment mode '{mode}', expected one of {self.MODES}")
+        self.target_ts = np.asarray(target_ts, dtype=np.float64)
+        self.mode = mode
+        self.max_gap = max_gap
+
+    def plan(self, source_ts) -> AlignmentPlan:
+        """
+        为一条源时间轴计算对齐方案。
+
+        Args:
+            source_ts: 已按升序排列的源时间戳 (Numpy array，秒)。
+
+        Returns:
+            AlignmentPlan: 可被 apply 重复使用的对齐方案。
+        """
+        source_ts = np.asarray(source_ts, dtype=np.float64)
+        target = self.target_ts
+        n = source_ts.size
+        if n == 0:
+            return AlignmentPlan(None, None, None, np.zeros(target.size, dtype=bool))
+
+        # 与 np.interp 相同的区间选择：lo 为不晚于目标时刻的最后一个源样本（时间戳重复时取最后一个），
+        # 早于第一个样本时 lo = 0 且权重截断为 0，不早于最后一个样本时 lo = hi = n - 1
+        right = np.searchsorted(source_ts, target, side='right')
+        lo = np.clip(right - 1, 0, n - 1)
+        hi = np.minimum(lo + 1, n - 1)
+        x0, x1 = source_ts[lo], source_ts[hi]
+
+        weight = None
+        if self.mode == 'linear':
+            span = x1 - x0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                weight = np.where(span > 0, (target - x0) / span, 0.0)
+            np.clip(weight, 0.0, 1.0, out=weight)
+            # 区间内的样本以所跨越的源采样间隔作为距离，恰好落在源样本上时距离为 0
+            inside = np.where((target == x0) | (target == x1), 0.0, span)
+            distance = np.where(target < source_ts[0], source_ts[0] - target,
+                                np.where(target > source_ts[-1], target - source_ts[-1], inside))
+        elif self.mode == 'nearest':
+            # 以早于目标时刻的最后一个样本和它的下一个样本为候选，距离相等时取较早的样本
+            lo = np.clip(np.searchsorted(source_ts, target, side='left') - 1, 0, n - 1)
+            hi = np.minimum(lo + 1, n - 1)
+            pick_hi = np.abs(source_ts[hi] - target) < np.abs(target - source_ts[lo])
+            lo = hi = np.where(pick_hi, hi, lo)
+            distance = np.abs(source_ts[lo] - target)
+        else:
+            lo = hi = np.maximum(right - 1, 0)
+            distance = np.where(right > 0, target - source_ts[lo], np.inf)
+
+        if self.max_gap is None:
+            valid = np.ones(target.size, dtype=bool)
+        else:
+            valid = distance <= self.max_gap
+        return AlignmentPlan(lo, hi, weight, valid)
+
+    def apply(self, plan: AlignmentPlan, *streams) -> List[np.ndarray]:
+        """
+        用已计算的方案对齐若干共享同一源时间轴的数据流。
+
+        Args:
+            plan (AlignmentPlan): plan() 的返回值。
+            *streams: 源数据 (Numpy array of shape [N] 或 [N, D])。空数组视为缺失的数据流。
+
+        Returns:
+            List[np.ndarray]: 与 streams 一一对应的对齐结果，形状为 [len(target_ts), D]。
+                              缺失的数据流返回全零数组，与 interpolate_data 的行为一致。
+        """
+        num_targets = self.target_ts.size
+        columns, widths = [], []
+        for data in streams:
+            data = np.asarray(data, dtype=np.float64)
+            width = data.shape[1] if data.ndim > 1 else 1
+            widths.append(width)
+            if data.size == 0 or plan.lo is None:
+                columns.append(None)
+            else:
+                columns.append(data.reshape(len(data), -1))
+
+        present = [c for c in columns if c is not None]
+        gathered = None
+        if present:
+            stacked = np.hstack(present) if len(present) > 1 else present[0]
+            gathered = stacked[plan.lo]
+            if plan.weight is not None:
+                gathered += plan.weight[:, None] * (stacked[plan.hi] - gathered)
+
+        results, offset = [], 0
+        for column, width in zip(columns, widths):
+            if column is None:
+                results.append(np.zeros((num_targets, width)))
+            else:
+                results.append(gathered[:, offset:offset + width])
+                offset += width
+        return results
+
+    def align(self, source_ts, *streams) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        plan() 与 apply() 的组合。
+
+        Returns:
+            Tuple[List[np.ndarray], np.ndarray]: 对齐后的数据流列表，以及 valid 掩码。
+        """
+        plan = self.plan(source_ts)
+        return self.apply(plan, *streams), plan.valid
@@ -0,0 +1,183 @@
+import struct
+from typing import List, Tuple
+
+import numpy as np
+
+from logic.video_index import make_frame_index
+
+# OpenDML (AVI 2.0) 相关常量
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+AVI_INDEX_OF_INDEXES = 0x00
+AVI_INDEX_OF_CHUNKS = 0x01
+SUPER_INDEX_ENTRIES = 256  # 预留的超级索引项数，每项对应一个 RIFF 段
+DMLH_SIZE = 248
+
+
+class MjpegAviWriter:
+    """
+    不经解码/重编码，直接把 JPEG 数据封装进 MJPEG AVI 容器的写入器。
+
+    采用 OpenDML 格式：文件由一个 'AVI ' RIFF 和若干 'AVIX' RIFF 组成，每个 RIFF 不超过 riff_limit 字节，
+    因此可以写出超过 4GB 的长录制；同时写出传统的 idx1 索引和 OpenDML 的 indx/ix00 索引，
+    OpenCV/FFmpeg 可以直接打开和按帧定位。
+    """
+    def __init__(self, path: str, width: int, height: int, fps: float = 30, riff_limit: int = 1 << 30):
+        """
+        创建文件并写入头部。
+
+        Args:
+            path (str): 输出 .avi 文件路径。
+            width (int): 帧宽度（像素）。
+            height (int): 帧高度（像素）。
+            fps (float): 帧率。
+            riff_limit (int): 单个 RIFF 段的最大字节数。
+        """
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.riff_limit = riff_limit
+        self._file = open(path, 'wb')
+        self._frames: List[Tuple[int, int]] = []  # 每帧 (数据在文件中的绝对偏移, 数据长度)
+        self._super_index: List[Tuple[int, int, int]] = []  # 每个 ix00 (绝对偏移, 块大小, 帧数)
+        self._riff_frames: List[Tuple[int, int]] = []  # 当前 RIFF 段内的帧
+        self._first_riff_frames = None
+        self._max_chunk = 0
+        self._write_header()
+        self._start_movi()
+
+    @property
+    def frame_index(self) -> np.ndarray:
+        """逐帧索引（见 logic.video_index），每帧都是关键帧。"""
+        frames = np.array(self._frames, dtype=np.int64).reshape(-1, 2)
+        return make_frame_index(frames[:, 0], frames[:, 1])
+
+    def write(self, jpeg) -> None:
+        """
+        写入一帧 JPEG 数据。
+
+        Args:
+            jpeg: 完整的 JPEG 字节串（bytes、bytearray 或 memoryview）。
+        """
+        size = len(jpeg)
+        padded = size + (size & 1)
+        if self._riff_frames and self._file.tell() + 8 + padded + self._ix_size(len(self._riff_frames) + 1) > self._riff_start + self.riff_limit:
+            self._end_riff()
+            self._start_riff(b'AVIX')
+            self._start_movi()
+
+        self._file.write(b'00dc' + struct.pack('<I', size))
+        data_pos = self._file.tell()
+        self._file.write(jpeg)
+        if size & 1:
+            self._file.write(b'\0')
+        self._frames.append((data_pos, size))
+        self._riff_frames.append((data_pos, size))
+        self._max_chunk = max(self._max_chunk, size)
+
+    def release(self) -> None:
+        """写入所有索引、回填头部字段并关闭文件。"""
+        if self._file is None:
+            return
+        self._end_riff()
+        self._patch_headers()
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    # --- 内部实现 ---
+
+    def _start_riff(self, form: bytes) -> None:
+        self._riff_start = self._file.tell()
+        self._file.write(b'RIFF' + struct.pack('<I', 0) + form)
+
+    def _start_list(self, list_type: bytes) -> int:
+        pos = self._file.tell()
+        self._file.write(b'LIST' + struct.pack('<I', 0) + list_type)
+        return pos
+
+    def _end_chunk(self, pos: int) -> None:
+        end = self._file.tell()
+        self._file.seek(pos + 4)
+        self._file.write(struct.pack('<I', end - pos - 8))
+        self._file.seek(end)
+
+    def _write_header(self) -> None:
+        self._start_riff(b'AVI ')
+        hdrl = self._start_list(b'hdrl')
+
+        self._avih_pos = self._file.tell()
+        self._file.write(b'avih' + struct.pack('<I', 56) + b'\0' * 56)
+
+        strl = self._start_list(b'strl')
+        self._strh_pos = self._file.tell()
+        self._file.write(b'strh' + struct.pack('<I', 56) + b'\0' * 56)
+        self._file.write(b'strf' + struct.pack('<I', 40) + struct.pack(
+            '<IiiHH4sIiiII', 40, self.width, self.height, 1, 24, b'MJPG', self.width * self.height * 3, 0, 0, 0, 0))
+        self._indx_pos = self._file.tell()
+        indx_size = 24 + 16 * SUPER_INDEX_ENTRIES
+        self._file.write(b'indx' + struct.pack('<I', indx_size) + b'\0' * indx_size)
+        self._end_chunk(strl)
+
+        odml = self._start_list(b'odml')
+        self._dmlh_pos = self._file.tell()
+        self._file.write(b'dmlh' + struct.pack('<I', DMLH_SIZE) + b'\0' * DMLH_SIZE)
+        self._end_chunk(odml)
+        self._end_chunk(hdrl)
+
+    def _start_movi(self) -> None:
+        self._movi_pos = self._start_list(b'movi')
+        self._riff_frames = []
+
+    @staticmethod
+    def _ix_size(num_frames: int) -> int:
+        return 8 + 24 + 8 * num_frames
+
+    def _end_riff(self) -> None:
+        # 每个 RIFF 段的 movi 列表末尾写一个 ix00 标准索引，偏移相对于 movi 列表的类型字段
+        base = self._movi_pos + 8
+        ix_pos = self._file.tell()
+        entries = b''.join(struct.pack('<II', pos - base, size) for pos, size in self._riff_frames)
+        self._file.write(b'ix00' + struct.pack('<IHBBI4sQI', 24 + len(entries), 2, 0, AVI_INDEX_OF_CHUNKS,
+                                               len(self._riff_frames), b'00dc', base, 0) + entries)
+        self._super_index.append((ix_pos, self._file.tell() - ix_pos, len(self._riff_frames)))
+        self._end_chunk(self._movi_pos)
+
+        if self._first_riff_frames is None:
+            # 第一个 RIFF 段额外写入 AVI 1.0 的 idx1 索引，偏移相对于 'movi' 类型字段
+            self._first_riff_frames = len(self._riff_frames)
+            idx1 = b''.join(struct.pack('<4sIII', b'00dc', AVIIF_KEYFRAME, pos - 8 - base, size)
+                            for pos, size in self._riff_frames)
+            self._file.write(b'idx1' + struct.pack('<I', len(idx1)) + idx1)
+        self._end_chunk(self._riff_start)
+
+    def _patch_headers(self) -> None:
+        total = len(self._frames)
+        if len(self._super_index) > SUPER_INDEX_ENTRIES:
+            raise ValueError(f"Too many RIFF segments for {self.path}; increase riff_limit.")
+        scale, rate = (1, int(self.fps)) if float(self.fps).is_integer() else (1000, int(round(self.fps * 1000)))
+        max_bytes_per_sec = int(self._max_chunk * rate / scale)
+
+        self._file.seek(self._avih_pos + 8)
+        self._file.write(struct.pack('<IIIIIIIIII16x', int(round(1e6 * scale / rate)), max_bytes_per_sec, 0,
+                                     AVIF_HASINDEX, self._first_riff_frames or 0, 0, 1, self._max_chunk,
+                                     self.width, self.height))
+
+        self._file.seek(self._strh_pos + 8)
+        self._file.write(struct.pack('<4s4sIHHIIIIIIiIhhhh', b'vids', b'MJPG', 0, 0, 0, 0, scale, rate, 0, total,
+                                     self._max_chunk, -1, 0, 0, 0, self.width, self.height))
+
+        self._file.seek(self._indx_pos + 8)
+        self._file.write(struct.pack('<HBBI4s12x', 4, 0, AVI_INDEX_OF_INDEXES, len(self._super_index), b'00dc'))
+        for pos, size, duration in self._super_index:
+            self._file.write(struct.pack('<QII', pos, size, duration))
+
+        self._file.seek(self._dmlh_pos + 8)
+        self._file.write(struct.pack('<I', total))
+        self._file.seek(0, 2)
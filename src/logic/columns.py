@@ -0,0 +1,70 @@
+from typing import Optional
+
+import numpy as np
+
+
+class ColumnBuffer:
+    """
+    按行追加的二维数值数组，预先分配容量，不足时按倍数扩容，避免为每条消息创建 Python 列表或字典。
+
+    列数由第一行确定（与旧版按第一条消息判断数据长度的行为一致）。长度不符的行仍占一行（填 0），
+    并在 valid 掩码中标记为 False，读取完成后用掩码一次性过滤，行号与消息序号保持一致。
+    """
+    def __init__(self, capacity: int = 1024, width: Optional[int] = None, dtype=np.float64):
+        """
+        Args:
+            capacity (int): 初始容量（行数），已知消息数时传入该值可避免扩容。
+            width (Optional[int]): 列数；为 None 时由第一行确定。
+            dtype: 数据类型。
+        """
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self._capacity = max(1, int(capacity))
+        self._data = None
+        self._valid = np.zeros(self._capacity, dtype=bool)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self, capacity: int) -> None:
+        if self._data is not None:
+            data = np.zeros((capacity, self.width), dtype=self.dtype)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:self._size] = self._valid[:self._size]
+        self._valid = valid
+        self._capacity = capacity
+
+    def append(self, row) -> bool:
+        """
+        追加一行。
+
+        Returns:
+            bool: 该行长度是否与列数一致。
+        """
+        if self._size == self._capacity:
+            self._grow(self._capacity * 2)
+        if self._data is None:
+            if self.width is None:
+                self.width = len(row)
+            self._data = np.zeros((self._capacity, self.width), dtype=self.dtype)
+        ok = len(row) == self.width
+        if ok:
+            self._data[self._size] = row
+            self._valid[self._size] = True
+        self._size += 1
+        return ok
+
+    @property
+    def valid(self) -> np.ndarray:
+        """每一行长度是否正确。"""
+        return self._valid[:self._size]
+
+    @property
+    def data(self) -> np.ndarray:
+        """已追加的所有行（形状为 [行数, 列数]，长度不符的行为 0）。"""
+        if self._data is None:
+            return np.zeros((self._size, self.width or 0), dtype=self.dtype)
+        return self._data[:self._size]
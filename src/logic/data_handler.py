@@ -1,6 +1,6 @@
 import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class DataHandler:
     """
@@ -98,7 +98,8 @@ class DataHandler:
             "annotations": []
         }
         
-    def format_annotation(self, instruction: str, start: int, end: int) -> Dict[str, Any]:
+    def format_annotation(self, instruction: str, start: int, end: int, start_time: Optional[float] = None,
+                          end_time: Optional[float] = None) -> Dict[str, Any]:
         """
         格式化单个标注记录。
 
@@ -106,14 +107,20 @@ class DataHandler:
             instruction (str): 动作描述。
             start (int): 开始帧号。
             end (int): 结束帧号。
+            start_time (Optional[float]): 开始帧的时间戳（秒，Unix 时间），视频没有逐帧时间戳时为 None。
+            end_time (Optional[float]): 结束帧的时间戳。
 
         Returns:
-            Dict[str, Any]: 代表单个标注的字典。
+            Dict[str, Any]: 代表单个标注的字典；给出时间戳时包含 start_time/end_time。
         """
         # Note: We are keeping relative_path inside each annotation for consistency with the initial request,
         # even though it's also at the top level now.
-        return {
+        annotation = {
             "instruction": instruction,
             "start": start,
             "end": end
         }
+        if start_time is not None and end_time is not None:
+            annotation["start_time"] = round(start_time, 6)
+            annotation["end_time"] = round(end_time, 6)
+        return annotation
@@ -0,0 +1,135 @@
+import io
+import json
+import os
+import tarfile
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# 数据集索引中的每一帧：所属片段、帧号，以及 JPEG 数据在分片 tar 文件中的位置。
+DATASET_INDEX_DTYPE = np.dtype([('episode', '<i4'), ('frame', '<i4'), ('shard', '<i4'),
+                                ('offset', '<i8'), ('size', '<i8')])
+DATASET_INDEX_FILE = 'index.npy'
+EPISODES_FILE = 'episodes.json'
+SHARD_NAME = 'shard-{:05d}.tar'
+
+
+def annotation_labels(num_frames: int, annotations: List[dict]) -> np.ndarray:
+    """
+    把标注区间展开为逐帧的标注序号。
+
+    Args:
+        num_frames (int): 帧数。
+        annotations (List[dict]): DataHandler.format_annotation 格式的标注（start/end 为闭区间帧号）。
+
+    Returns:
+        np.ndarray: 形状为 [num_frames] 的 int32 数组，值为覆盖该帧的标注序号，未标注的帧为 -1；
+            区间重叠时取序号较大的标注。
+    """
+    labels = np.full(num_frames, -1, dtype=np.int32)
+    for i, annotation in enumerate(annotations):
+        start = max(0, int(annotation['start']))
+        end = min(num_frames - 1, int(annotation['end']))
+        if start <= end:
+            labels[start:end + 1] = i
+    return labels
+
+
+class ShardWriter:
+    """
+    把数据依次写入固定大小的 tar 分片，并记录每个成员数据在分片中的字节偏移，读取时一次 seek 即可取出。
+
+    分片大小在 rollover() 时检查：调用方在完整的一组数据（例如一段帧及其传感器数据）之后调用，
+    保证同一组数据位于同一个分片中。每个分片先写入临时文件，写完后再重命名。
+    """
+    def __init__(self, output_dir: str, shard_bytes: int):
+        """
+        Args:
+            output_dir (str): 输出目录。
+            shard_bytes (int): 分片的目标大小（字节），超过后在下一次 rollover() 时开始新分片。
+        """
+        self.output_dir = output_dir
+        self.shard_bytes = shard_bytes
+        self.shard = -1
+        self.shard_names: List[str] = []
+        self._tar: Optional[tarfile.TarFile] = None
+        self._temp_path = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _open_next(self) -> None:
+        self._close_current()
+        self.shard += 1
+        name = SHARD_NAME.format(self.shard)
+        self.shard_names.append(name)
+        self._temp_path = os.path.join(self.output_dir, f"{name}.tmp-{os.getpid()}")
+        self._tar = tarfile.open(self._temp_path, 'w')
+
+    def _close_current(self) -> None:
+        if self._tar is None:
+            return
+        self._tar.close()
+        os.replace(self._temp_path, os.path.join(self.output_dir, self.shard_names[-1]))
+        self._tar = None
+
+    def rollover(self) -> None:
+        """当前分片已达到目标大小时关闭它，之后的数据写入新分片。"""
+        if self._tar is not None and self._tar.offset >= self.shard_bytes:
+            self._close_current()
+
+    def add(self, name: str, data) -> Tuple[int, int, int]:
+        """
+        写入一个成员。
+
+        Args:
+            name (str): 成员名，例如 'episode/000123.jpg'。
+            data: 成员内容（bytes、memoryview 或 numpy 的 uint8 数组）。
+
+        Returns:
+            Tuple[int, int, int]: (分片序号, 数据在分片中的字节偏移, 字节数)。
+        """
+        if self._tar is None:
+            self._open_next()
+        data = memoryview(data).cast('B')
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+        # addfile 之后 offset 指向按 512 字节补齐的数据块末尾
+        data_offset = self._tar.offset - (info.size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+        return self.shard, data_offset, info.size
+
+    def add_npz(self, name: str, **arrays) -> Tuple[int, int, int]:
+        """把若干数组保存为一个 .npz 成员。"""
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return self.add(name, buffer.getbuffer())
+
+    def add_json(self, name: str, obj) -> Tuple[int, int, int]:
+        return self.add(name, json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def close(self) -> None:
+        self._close_current()
+
+    def abort(self) -> None:
+        """放弃当前未写完的分片。"""
+        if self._tar is not None:
+            self._tar.close()
+            os.remove(self._temp_path)
+            self._tar = None
+            self.shard_names.pop()
+
+
+def read_frame(dataset_dir: str, index: np.ndarray, i: int) -> bytes:
+    """
+    按数据集索引读取第 i 帧的 JPEG 数据。
+
+    Args:
+        dataset_dir (str): 数据集目录。
+        index (np.ndarray): DATASET_INDEX_FILE 中的索引。
+        i (int): 索引中的行号。
+    """
+    entry = index[i]
+    with open(os.path.join(dataset_dir, SHARD_NAME.format(int(entry['shard']))), 'rb') as f:
+        f.seek(int(entry['offset']))
+        return f.read(int(entry['size']))
@@ -0,0 +1,56 @@
+import shutil
+import subprocess
+
+
+class FfmpegPipeWriter:
+    """
+    通过管道把 BGR 帧交给 ffmpeg 命令行编码的视频写入器，接口与 cv2.VideoWriter 相同（write / release / isOpened）。
+
+    cv2.VideoWriter 无法控制 GOP 长度，因此短 GOP 编码使用该写入器：固定关键帧间隔、关闭场景切换检测和 B 帧，
+    保证任意一帧最多只需要从前一个关键帧解码 gop - 1 帧。
+    """
+    def __init__(self, path: str, width: int, height: int, fps: float = 30, gop: int = 10,
+                 codec: str = 'libx264', crf: int = 20):
+        """
+        启动 ffmpeg 进程。
+
+        Args:
+            path (str): 输出视频路径（.mp4）。
+            width (int): 帧宽度（像素）。
+            height (int): 帧高度（像素）。
+            fps (float): 帧率。
+            gop (int): 关键帧间隔（帧）。
+            codec (str): ffmpeg 视频编码器名称。
+            crf (int): 恒定质量参数，越小质量越高。
+        """
+        self.path = path
+        self._proc = None
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            print("Warning: ffmpeg executable not found; short-GOP encoding is unavailable.")
+            return
+        command = [
+            ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+            '-c:v', codec, '-preset', 'veryfast', '-crf', str(crf),
+            '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0', '-bf', '0',
+            '-pix_fmt', 'yuv420p', path,
+        ]
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def isOpened(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def write(self, frame) -> None:
+        """写入一帧 BGR 图像（形状为 [height, width, 3] 的 uint8 数组）。"""
+        self._proc.stdin.write(frame.data if frame.flags['C_CONTIGUOUS'] else frame.tobytes())
+
+    def release(self) -> None:
+        """关闭管道并等待 ffmpeg 完成编码。"""
+        if self._proc is None:
+            return
+        self._proc.stdin.close()
+        returncode = self._proc.wait()
+        self._proc = None
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode} while writing {self.path}")
@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+CACHE_VERSION = 2
+FRAMES_FILE = 'frames.bin'
+FRAMES_INDEX_FILE = 'frames_index.npy'
+META_FILE = 'meta.json'
+
+# 帧缓存索引：每帧 JPEG 数据在 frames.bin 中的偏移、长度，以及 bag 时间戳（纳秒）。
+ARENA_INDEX_DTYPE = np.dtype([('offset', '<i8'), ('size', '<i8'), ('timestamp_ns', '<i8')])
+
+
+def source_signature(paths: List[str]) -> List[Optional[List[int]]]:
+    """
+    记录源 bag 文件的大小和修改时间，用于判断缓存是否过期。
+    只记录顺序而不记录路径，数据目录在不同机器/容器中挂载到不同位置时缓存仍然有效。
+
+    Args:
+        paths (List[str]): 源文件路径列表。
+
+    Returns:
+        List[Optional[List[int]]]: 与 paths 一一对应的 [大小, mtime_ns]，文件不存在时为 None。
+    """
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append([st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            signature.append(None)
+    return signature
+
+
+class FrameArena:
+    """
+    以 memory-map 方式打开的帧缓存。frame() 返回指向映射内存的零拷贝切片，可以直接交给 cv2.imdecode。
+    """
+    def __init__(self, cache_dir: str):
+        index_path = os.path.join(cache_dir, FRAMES_INDEX_FILE)
+        frames_path = os.path.join(cache_dir, FRAMES_FILE)
+        self.index = np.load(index_path, mmap_mode='r')
+        if os.path.getsize(frames_path) > 0:
+            self._data = np.memmap(frames_path, dtype=np.uint8, mode='r')
+        else:
+            self._data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def timestamps_ns(self) -> np.ndarray:
+        """每帧的 bag 时间戳（纳秒）。"""
+        return np.asarray(self.index['timestamp_ns'])
+
+    @property
+    def nbytes(self) -> int:
+        """缓存中 JPEG 数据的总字节数。"""
+        return int(self._data.size)
+
+    def frame(self, i: int) -> memoryview:
+        """返回第 i 帧 JPEG 数据的零拷贝 memoryview。"""
+        offset, size = int(self.index['offset'][i]), int(self.index['size'][i])
+        return memoryview(self._data[offset:offset + size])
+
+    def iter_frames(self, start_idx: int, end_idx: int) -> Iterator[memoryview]:
+        """按顺序产出 [start_idx, end_idx] 区间内每帧的 JPEG 数据。"""
+        for i in range(start_idx, end_idx + 1):
+            yield self.frame(i)
+
+
+class FrameArenaWriter:
+    """
+    构建帧缓存：所有 JPEG 数据顺序追加到一个文件中，同时记录偏移/长度/时间戳索引。
+    所有文件先写入临时目录，commit() 时整体重命名，中断的构建不会留下半成品缓存。
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        os.makedirs(self._tmp_dir)
+        self._frames_file = open(os.path.join(self._tmp_dir, FRAMES_FILE), 'wb')
+        self._offsets: List[int] = []
+        self._sizes: List[int] = []
+        self._timestamps: List[int] = []
+        self._position = 0
+
+    def add_frame(self, timestamp_ns: int, payload) -> None:
+        """追加一帧 JPEG 数据。"""
+        size = len(payload)
+        self._frames_file.write(payload)
+        self._offsets.append(self._position)
+        self._sizes.append(size)
+        self._timestamps.append(timestamp_ns)
+        self._position += size
+
+    def shard_path(self, shard: int) -> str:
+        """返回第 shard 个分片文件的路径，供其他进程并行写入 JPEG 数据。"""
+        return os.path.join(self._tmp_dir, f'shard-{shard}.bin')
+
+    def append_shard(self, shard_path: str, timestamps_ns, sizes) -> None:
+        """
+        追加一个由其他进程写好的分片：分片文件中依次排列各帧 JPEG 数据，追加后删除分片文件。
+        各分片必须按时间顺序追加。
+
+        Args:
+            shard_path (str): 分片文件路径（见 shard_path()）。
+            timestamps_ns: 分片中每帧的 bag 时间戳（纳秒）。
+            sizes: 分片中每帧的字节数。
+        """
+        sizes = np.asarray(sizes, dtype=np.int64)
+        with open(shard_path, 'rb') as f:
+            shutil.copyfileobj(f, self._frames_file, 16 << 20)
+        os.remove(shard_path)
+        self._offsets.extend((self._position + np.cumsum(sizes) - sizes).tolist())
+        self._sizes.extend(sizes.tolist())
+        self._timestamps.extend(np.asarray(timestamps_ns, dtype=np.int64).tolist())
+        self._position += int(sizes.sum())
+
+    def save_array(self, name: str, array: np.ndarray) -> None:
+        """保存一个与帧无关的附加数组（例如传感器数据），读取时用 FrameCache.load_arrays。"""
+        np.save(os.path.join(self._tmp_dir, f'{name}.npy'), np.asarray(array))
+
+    def commit(self, sources: List[Optional[List[int]]]) -> None:
+        """
+        写入索引和元数据，并把临时目录原子地替换为正式缓存目录。
+
+        Args:
+            sources: source_signature() 的返回值。
+        """
+        self._frames_file.close()
+        index = np.zeros(len(self._offsets), dtype=ARENA_INDEX_DTYPE)
+        index['offset'] = self._offsets
+        index['size'] = self._sizes
+        index['timestamp_ns'] = self._timestamps
+        np.save(os.path.join(self._tmp_dir, FRAMES_INDEX_FILE), index)
+        with open(os.path.join(self._tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'sources': sources}, f, indent=4)
+
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(self.cache_dir) or '.', exist_ok=True)
+        os.rename(self._tmp_dir, self.cache_dir)
+
+    def abort(self) -> None:
+        """放弃构建并删除临时文件。"""
+        self._frames_file.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+class FrameCache:
+    """
+    单个录制目录的磁盘帧缓存：
+    frames.bin 存放所有 JPEG 数据，frames_index.npy 存放偏移/长度/时间戳索引，
+    其余 .npy 文件存放传感器数组，meta.json 记录源 bag 的大小和修改时间。
+    """
+    def __init__(self, cache_dir: str):
+        """
+        Args:
+            cache_dir (str): 该录制的缓存目录。
+        """
+        self.cache_dir = cache_dir
+
+    def is_valid(self, source_paths: List[str]) -> bool:
+        """
+        判断缓存是否存在且与源 bag 一致（大小和修改时间均未变化）。
+        """
+        meta_path = os.path.join(self.cache_dir, META_FILE)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        return meta.get('version') == CACHE_VERSION and meta.get('sources') == source_signature(source_paths)
+
+    def open(self) -> FrameArena:
+        """以 memory-map 方式打开帧数据。"""
+        return FrameArena(self.cache_dir)
+
+    def load_arrays(self) -> Dict[str, np.ndarray]:
+        """加载所有附加数组（不包含帧索引）。"""
+        arrays = {}
+        for file_name in sorted(os.listdir(self.cache_dir)):
+            if file_name.endswith('.npy') and file_name != FRAMES_INDEX_FILE:
+                arrays[file_name[:-4]] = np.load(os.path.join(self.cache_dir, file_name))
+        return arrays
+
+    def writer(self) -> FrameArenaWriter:
+        """创建一个用于重建该缓存的写入器。"""
+        return FrameArenaWriter(self.cache_dir)
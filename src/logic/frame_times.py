@@ -0,0 +1,57 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+# 逐帧时间戳：与视频帧一一对应的图像消息时间（秒，Unix 时间），由 process_data.py 写在视频旁。
+TIMESTAMPS_FILE = 'timestamps.npy'
+
+
+def load_frame_timestamps(video_dir: str) -> Optional[np.ndarray]:
+    """
+    加载视频目录中的逐帧时间戳。
+
+    Returns:
+        Optional[np.ndarray]: float64 秒时间戳；文件不存在或为空时返回 None。
+    """
+    path = os.path.join(video_dir, TIMESTAMPS_FILE)
+    if not os.path.exists(path):
+        return None
+    timestamps = np.load(path)
+    return timestamps if len(timestamps) > 0 else None
+
+
+def estimate_fps(timestamps: Optional[np.ndarray], default: float = 30.0) -> float:
+    """
+    由逐帧时间戳估计帧率：取相邻帧间隔的中位数，个别丢帧或录制暂停不影响结果。
+
+    Args:
+        timestamps (Optional[np.ndarray]): 逐帧时间戳（秒）。
+        default (float): 帧数不足两帧或时间戳无效时返回的帧率。
+
+    Returns:
+        float: 帧率，保留三位小数。
+    """
+    if timestamps is None or len(timestamps) < 2:
+        return default
+    interval = float(np.median(np.diff(timestamps)))
+    return round(1.0 / interval, 3) if interval > 0 else default
+
+
+def frame_at_time(timestamps: np.ndarray, t: float) -> int:
+    """
+    二分查找时间戳最接近 t 的帧。
+
+    Args:
+        timestamps (np.ndarray): 单调不减的逐帧时间戳（秒）。
+        t (float): 要查找的时间（秒）。
+
+    Returns:
+        int: 帧号；t 超出范围时为第一帧或最后一帧。
+    """
+    i = int(np.searchsorted(timestamps, t))
+    if i <= 0:
+        return 0
+    if i >= len(timestamps):
+        return len(timestamps) - 1
+    return i if timestamps[i] - t < t - timestamps[i - 1] else i - 1
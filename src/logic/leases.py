@@ -0,0 +1,186 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Optional, Set
+
+LEASE_SUFFIX = '.lease'
+DONE_SUFFIX = '.done'
+
+
+def default_owner() -> str:
+    """租约持有者标识：主机名、进程号和随机后缀，容器重启后不会与旧租约混淆。"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseManager:
+    """
+    基于共享文件系统（NFS）上租约文件的分布式任务认领。
+
+    每个录制对应 lease_dir 中的一个 <名称>.lease 文件，用 O_CREAT | O_EXCL 原子创建，保证同一时间只有一个节点持有。
+    持有期间后台线程定期用 os.utime 更新租约的修改时间（心跳）；修改时间超过 ttl 秒未更新的租约视为持有者已崩溃，
+    其他节点先把它原子地重命名移走再重新创建，多个节点同时回收时只有一个能成功。
+    处理成功后写入 <名称>.done 标记（记录调用方给出的 token，例如源目录签名和处理选项），token 相同的录制不再被认领。
+
+    过期判断比较的是本机时间与文件服务器记录的修改时间，ttl 应远大于节点之间的时钟偏差和心跳间隔。
+    """
+    def __init__(self, lease_dir: str, ttl: float = 120.0, owner: Optional[str] = None):
+        """
+        Args:
+            lease_dir (str): 所有节点共享的租约目录。
+            ttl (float): 租约过期时间（秒），心跳间隔为 ttl / 4。
+            owner (Optional[str]): 持有者标识，默认见 default_owner。
+        """
+        self.lease_dir = lease_dir
+        self.ttl = ttl
+        self.owner = owner or default_owner()
+        self.lost: Set[str] = set()
+        self._held: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(lease_dir, exist_ok=True)
+
+    def _path(self, name: str, suffix: str = LEASE_SUFFIX) -> str:
+        return os.path.join(self.lease_dir, name + suffix)
+
+    def __enter__(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name='lease-heartbeat', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for name in list(self._held):
+            self.release(name)
+
+    def try_acquire(self, name: str) -> bool:
+        """
+        尝试认领一个录制。
+
+        Returns:
+            bool: 是否认领成功；其他节点持有未过期的租约时为 False。
+        """
+        path = self._path(name)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._reclaim_expired(path):
+                    return False
+                continue
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'owner': self.owner, 'acquired': time.time()}, f)
+            with self._lock:
+                self._held.add(name)
+                self.lost.discard(name)
+            return True
+        return False
+
+    def _reclaim_expired(self, path: str) -> bool:
+        """租约已过期（或已消失）时把它移走并返回 True，调用方随后重新尝试创建。"""
+        try:
+            if time.time() - os.stat(path).st_mtime <= self.ttl:
+                return False
+        except FileNotFoundError:
+            return True
+        tombstone = f"{path}.expired-{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(path, tombstone)
+        except FileNotFoundError:
+            return True  # 其他节点已经回收
+        try:
+            # stat 与 rename 之间租约可能已被其他节点回收并重建，确认移走的仍是过期的租约，否则放回原处
+            if time.time() - os.stat(tombstone).st_mtime <= self.ttl:
+                try:
+                    os.link(tombstone, path)
+                except FileExistsError:
+                    pass
+                return False
+            previous = self._read(tombstone)
+            print(f"Reclaimed expired lease {os.path.basename(path)} from {previous.get('owner', 'unknown')}.")
+            return True
+        finally:
+            try:
+                os.remove(tombstone)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _read(path: str) -> dict:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.ttl / 4):
+            with self._lock:
+                held = list(self._held)
+            for name in held:
+                path = self._path(name)
+                try:
+                    if self._read_owner(path) not in (None, self.owner):
+                        raise FileNotFoundError(path)
+                    os.utime(path)
+                except FileNotFoundError:
+                    # 租约已过期并被其他节点回收；心跳线程不打印日志，由调用方在任务结束时检查 lost
+                    with self._lock:
+                        self._held.discard(name)
+                        self.lost.add(name)
+                except OSError:
+                    pass  # NFS 上的暂时性错误：保留租约，下一次心跳重试
+
+    @staticmethod
+    def _read_owner(path: str) -> Optional[str]:
+        """
+        读取租约的持有者。
+
+        Returns:
+            Optional[str]: 持有者标识；暂时无法读取或解析（例如其他节点正在写入）时为 None。
+
+        Raises:
+            FileNotFoundError: 租约文件不存在。
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lease = json.load(f)
+        except FileNotFoundError:
+            raise
+        except (OSError, ValueError):
+            return None
+        return lease.get('owner') if isinstance(lease, dict) else None
+
+    def release(self, name: str, done_token=None) -> None:
+        """
+        释放租约。
+
+        Args:
+            name (str): 录制名称。
+            done_token: 不为 None 时写入完成标记，之后 is_done(name, done_token) 为 True。
+        """
+        if done_token is not None:
+            temp_path = self._path(name, f"{DONE_SUFFIX}.tmp-{os.getpid()}")
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'token': done_token, 'owner': self.owner, 'finished': time.time()}, f, ensure_ascii=False)
+            os.replace(temp_path, self._path(name, DONE_SUFFIX))
+        with self._lock:
+            held = name in self._held
+            self._held.discard(name)
+        path = self._path(name)
+        if held and self._read(path).get('owner') == self.owner:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def is_done(self, name: str, done_token) -> bool:
+        """录制是否已由某个节点以相同的 token 处理完成。"""
+        marker = self._read(self._path(name, DONE_SUFFIX))
+        return 'token' in marker and marker['token'] == json.loads(json.dumps(done_token))
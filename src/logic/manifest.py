@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import shutil
+import time
+from typing import Dict, List, Optional
+
+from logic.frame_cache import source_signature
+
+# 处理工具的版本号。输出格式或处理逻辑发生变化时递增，--resume 会据此重新处理旧版本的输出。
+TOOL_VERSION = '1.1'
+MANIFEST_FILE = 'manifest.json'
+
+# 判断输出是否过期时比较的字段
+MANIFEST_KEYS = ('tool_version', 'sources', 'topics', 'options')
+
+
+def build_manifest(source_dir: str, source_files: List[str], topics: Dict[str, str], options: dict) -> dict:
+    """
+    构建一个录制的输出清单。
+
+    Args:
+        source_dir (str): 录制目录。
+        source_files (List[str]): 相对于 source_dir 的源 bag 路径。
+        topics (Dict[str, str]): 使用的 topic，例如 {'image': 'realsence_color_img'}。
+        options (dict): 影响输出内容的处理选项。
+
+    Returns:
+        dict: 清单，sources 记录每个源文件的 [大小, mtime_ns]（文件不存在时为 None）。
+    """
+    signature = source_signature([os.path.join(source_dir, f) for f in source_files])
+    return {
+        'tool_version': TOOL_VERSION,
+        'source_dir': os.path.basename(os.path.normpath(source_dir)),
+        'sources': dict(zip(source_files, signature)),
+        'topics': dict(topics),
+        'options': dict(options),
+    }
+
+
+def read_manifest(output_dir: str) -> Optional[dict]:
+    """读取输出目录中的清单，不存在或无法解析时返回 None。"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def write_manifest(output_dir: str, manifest: dict) -> None:
+    """把清单写入输出目录，并记录写入时间。"""
+    manifest = dict(manifest, created=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+
+
+def manifest_matches(manifest: Optional[dict], expected: dict) -> bool:
+    """比较两个清单的工具版本、源文件、topic 和选项是否一致。"""
+    if manifest is None:
+        return False
+    # 经过 JSON 往返后再比较，避免元组与列表等类型差异
+    expected = json.loads(json.dumps({key: expected.get(key) for key in MANIFEST_KEYS}))
+    return all(manifest.get(key) == expected[key] for key in MANIFEST_KEYS)
+
+
+def _entry_manifests(output_dir: str):
+    """
+    依次产出一个录制的入口清单：output_dir（单个输出）和 output_dir_0（分段输出）。
+    两者都不存在时（第一段被跳过）产出编号最小的 output_dir_<i> 的清单；每个输出的清单都记录了完整的 outputs 和 skipped。
+    """
+    found = False
+    for entry in (output_dir, f"{output_dir}_0"):
+        manifest = read_manifest(entry)
+        if manifest is not None:
+            found = True
+            yield manifest
+    if found:
+        return
+    parent, name = os.path.split(output_dir)
+    pattern = re.compile(rf'^{re.escape(name)}_(\d+)$')
+    try:
+        entries = os.listdir(parent or '.')
+    except FileNotFoundError:
+        return
+    for i in sorted(int(match.group(1)) for match in map(pattern.match, entries) if match):
+        manifest = read_manifest(f"{output_dir}_{i}")
+        if manifest is not None:
+            yield manifest
+            return
+
+
+def outputs_up_to_date(output_dir: str, expected: dict) -> bool:
+    """
+    判断一个录制此前的输出是否完整且与 expected 一致。
+    入口清单的 outputs 字段列出该录制实际写出的所有输出目录；skipped 字段中的段（第一帧无法解码）没有输出目录，视为已完成。
+    """
+    parent = os.path.dirname(output_dir)
+    for manifest in _entry_manifests(output_dir):
+        if manifest_matches(manifest, expected):
+            outputs = manifest.get('outputs') or []
+            return all(manifest_matches(read_manifest(os.path.join(parent, name)), expected) for name in outputs)
+    return False
+
+
+def previous_outputs(output_dir: str) -> List[str]:
+    """返回此前运行为该录制写出的输出目录名（来自入口清单），没有清单时返回空列表。"""
+    for manifest in _entry_manifests(output_dir):
+        return list(manifest.get('outputs') or [])
+    return []
+
+
+def is_temp_output_dir(name: str) -> bool:
+    """判断目录名是否为写入中或待删除的临时输出目录（见 temp_output_dir、replace_directory）。"""
+    return re.search(r'\.(tmp|old)-\d+$', name) is not None
+
+
+def temp_output_dir(output_dir: str) -> str:
+    """写入中的临时目录，与最终目录位于同一父目录下，保证重命名是原子的。"""
+    return f"{output_dir}.tmp-{os.getpid()}"
+
+
+def remove_stale_temp_dirs(output_dir: str) -> None:
+    """删除此前被中断的运行留下的临时目录（output_dir 及其分段 output_dir_<i> 的）。"""
+    parent, name = os.path.split(output_dir)
+    pattern = re.compile(rf'^{re.escape(name)}(_\d+)?\.(tmp|old)-\d+$')
+    try:
+        entries = os.listdir(parent or '.')
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if pattern.match(entry):
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+def replace_directory(temp_dir: str, output_dir: str) -> None:
+    """
+    用写好的临时目录替换最终目录：旧目录先被移开，新目录重命名到位后再删除旧目录。
+    中断时最多留下缺失的输出（下次运行会重新处理），不会留下写了一半的输出。
+    """
+    old_dir = None
+    if os.path.exists(output_dir):
+        old_dir = f"{output_dir}.old-{os.getpid()}"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.rename(output_dir, old_dir)
+    os.rename(temp_dir, output_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
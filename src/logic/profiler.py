@@ -0,0 +1,185 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    返回进程启动以来的峰值常驻内存（MB），平台不支持时返回 None。
+    进程池中的工作进程会依次处理多个目录，这个值是所有目录中的最大值，不能归到单个目录上。
+
+    Args:
+        children (bool): 为 True 时返回已结束子进程（分片提取进程、ffmpeg 等）中的最大峰值。
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Linux 上 ru_maxrss 的单位是 KiB，macOS 上是字节
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return usage.ru_maxrss * scale / 1e6
+
+
+def current_rss_mb() -> Optional[float]:
+    """返回当前的常驻内存（MB，读取 /proc/self/statm），平台不支持时返回 None。"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, IndexError, ValueError, AttributeError):
+        return None
+
+
+class RssSampler:
+    """在后台线程中定期采样当前进程的常驻内存，记录从创建到 stop() 之间的峰值。"""
+    def __init__(self, interval: float = 0.05):
+        """
+        Args:
+            interval (float): 采样间隔（秒）。
+        """
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+            self._thread.start()
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        rss = current_rss_mb()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def stop(self) -> Optional[float]:
+        """停止采样并返回峰值（MB），平台不支持时返回 None。"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._sample()
+        return self.peak
+
+
+class StageProfiler:
+    """
+    线程安全的分阶段计时器和计数器。
+
+    各阶段的耗时按调用累加；在多个线程中并发执行的阶段（例如解码）累加的是各线程耗时之和，
+    可能大于墙钟时间。创建时开始在后台采样常驻内存，report() 时停止。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = defaultdict(float)
+        self._calls = defaultdict(int)
+        self._counters = defaultdict(int)
+        self._start = time.perf_counter()
+        self._rss = RssSampler()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """对 with 语句块计时，累加到阶段 name。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float, calls: int = 1) -> None:
+        """累加一个阶段的耗时（秒）。"""
+        with self._lock:
+            self._seconds[name] += seconds
+            self._calls[name] += calls
+
+    def count(self, name: str, value: int = 1) -> None:
+        """累加计数器，例如读取的字节数或写出的帧数。"""
+        with self._lock:
+            self._counters[name] += value
+
+    def report(self) -> dict:
+        """
+        汇总计时结果并停止内存采样。
+
+        Returns:
+            dict: 包含 wall_seconds、stages（{阶段: {'seconds', 'calls'}}）、counters、fps、
+                  本次计时期间采样到的峰值内存 peak_rss_mb，以及进程启动以来的峰值
+                  process_peak_rss_mb / process_peak_rss_children_mb（ru_maxrss，进程被复用时包含之前的目录）。
+        """
+        wall = time.perf_counter() - self._start
+        with self._lock:
+            stages = {name: {'seconds': round(self._seconds[name], 6), 'calls': self._calls[name]}
+                      for name in sorted(self._seconds)}
+            counters = dict(sorted(self._counters.items()))
+        return {
+            'wall_seconds': round(wall, 6),
+            'stages': stages,
+            'counters': counters,
+            'fps': round(counters.get('frames', 0) / wall, 3) if wall > 0 else 0.0,
+            'peak_rss_mb': self._rss.stop(),
+            'process_peak_rss_mb': peak_rss_mb(),
+            'process_peak_rss_children_mb': peak_rss_mb(children=True),
+        }
+
+
+class NullProfiler:
+    """不做任何记录的计时器，未开启性能分析时使用，调用方无需判断。"""
+    def stage(self, name: str):
+        return contextlib.nullcontext()
+
+    def add(self, name: str, seconds: float, calls: int = 1) -> None:
+        pass
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+# report 中的峰值内存字段，合并时取最大值
+RSS_KEYS = ('peak_rss_mb', 'process_peak_rss_mb', 'process_peak_rss_children_mb')
+
+
+def merge_reports(reports: Iterable[dict], wall_seconds: float) -> dict:
+    """
+    合并多个目录的 report：阶段耗时与计数器求和，峰值内存取最大值，fps 按总墙钟时间计算。
+
+    Args:
+        reports: StageProfiler.report() 的结果。
+        wall_seconds (float): 整个运行的墙钟时间（秒）。
+    """
+    seconds, calls, counters = defaultdict(float), defaultdict(int), defaultdict(int)
+    rss = defaultdict(list)
+    for report in reports:
+        for name, stage in report['stages'].items():
+            seconds[name] += stage['seconds']
+            calls[name] += stage['calls']
+        for name, value in report['counters'].items():
+            counters[name] += value
+        for key in RSS_KEYS:
+            if report.get(key) is not None:
+                rss[key].append(report[key])
+    merged = {
+        'wall_seconds': round(wall_seconds, 6),
+        'stages': {name: {'seconds': round(seconds[name], 6), 'calls': calls[name]} for name in sorted(seconds)},
+        'counters': dict(sorted(counters.items())),
+        'fps': round(counters.get('frames', 0) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+    }
+    merged.update({key: max(rss[key]) if rss[key] else None for key in RSS_KEYS})
+    return merged
+
+
+def append_jsonl(path: str, records: List[Dict]) -> None:
+    """把记录逐行追加到 JSON Lines 文件，便于多次运行的结果累积后绘制趋势。"""
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
@@ -0,0 +1,146 @@
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# ROS1 基本类型在序列化数据中的 numpy dtype（小端）
+PRIMITIVE_DTYPES = {
+    'bool': np.dtype('<u1'), 'int8': np.dtype('<i1'), 'uint8': np.dtype('<u1'),
+    'byte': np.dtype('<i1'), 'char': np.dtype('<u1'),
+    'int16': np.dtype('<i2'), 'uint16': np.dtype('<u2'),
+    'int32': np.dtype('<i4'), 'uint32': np.dtype('<u4'),
+    'int64': np.dtype('<i8'), 'uint64': np.dtype('<u8'),
+    'float32': np.dtype('<f4'), 'float64': np.dtype('<f8'),
+    'time': np.dtype([('secs', '<u4'), ('nsecs', '<u4')]),
+    'duration': np.dtype([('secs', '<i4'), ('nsecs', '<i4')]),
+}
+
+_UINT32 = struct.Struct('<I')
+
+# 字段布局类型
+_FIXED = 'fixed'            # 定长字段（基本类型标量或定长数组），直接跳过 size 字节
+_STRING = 'string'          # uint32 长度 + 字节
+_ARRAY = 'array'            # uint32 元素个数 + 基本类型元素
+_STRING_ARRAY = 'strings'   # uint32 元素个数 + 若干 string
+_HEADER = 'header'          # std_msgs/Header: uint32 seq, time stamp, string frame_id
+
+
+def parse_fields(msg_def: str) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    解析消息定义文本中顶层消息的字段（忽略注释、常量和依赖类型的定义）。
+
+    Args:
+        msg_def (str): 消息定义全文（rosbag 连接中的 msg_def 或消息类的 _full_text）。
+
+    Returns:
+        List[Tuple[str, str, Optional[int]]]: 每个字段的 (名称, 基础类型, 数组长度)。
+            数组长度为 None 表示不是数组，-1 表示变长数组。
+    """
+    fields = []
+    for line in msg_def.splitlines():
+        if line.startswith('=' * 10):
+            break  # 之后是依赖类型的定义
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split(None, 1)
+        if len(parts) != 2 or '=' in parts[1]:
+            continue  # 常量
+        field_type, name = parts[0], parts[1].strip()
+        length = None
+        if field_type.endswith(']'):
+            field_type, size = field_type[:-1].split('[', 1)
+            length = int(size) if size else -1
+        fields.append((name, field_type, length))
+    return fields
+
+
+def _layout(field_type: str, length: Optional[int]):
+    """返回字段的 (布局类型, 参数)；无法在不反序列化的情况下跳过该字段时返回 None。"""
+    if field_type in ('Header', 'std_msgs/Header') and length is None:
+        return _HEADER, None
+    if field_type == 'string':
+        if length is None:
+            return _STRING, None
+        return _STRING_ARRAY, length
+    dtype = PRIMITIVE_DTYPES.get(field_type)
+    if dtype is None:
+        return None  # 嵌套的消息类型
+    if length is None:
+        return _FIXED, dtype
+    if length < 0:
+        return _ARRAY, dtype
+    return _FIXED, np.dtype((dtype, (length,)))
+
+
+class RawFieldReader:
+    """
+    直接从 ROS1 序列化数据中读取单个字段，不创建消息对象。
+
+    根据消息定义计算目标字段之前的各字段如何跳过；目标字段之前只允许出现基本类型、字符串、
+    基本类型数组和 std_msgs/Header，遇到嵌套的消息类型时构造失败，调用方应回退到完整反序列化。
+    uint8[] 字段以零拷贝 memoryview 返回，其余基本类型数组以 numpy 数组返回。
+    """
+    def __init__(self, msg_def: str, field: str):
+        """
+        Args:
+            msg_def (str): 消息定义全文。
+            field (str): 要读取的顶层字段名。
+
+        Raises:
+            ValueError: 字段不存在，或无法在不反序列化的情况下定位该字段。
+        """
+        self.field = field
+        self._skips = []
+        for name, field_type, length in parse_fields(msg_def):
+            layout = _layout(field_type, length)
+            if layout is None:
+                raise ValueError(f"Field '{name}' of type '{field_type}' cannot be skipped without deserialization.")
+            if name == field:
+                if layout[0] not in (_FIXED, _ARRAY, _STRING):
+                    raise ValueError(f"Field '{name}' of type '{field_type}' is not supported.")
+                self._target = layout
+                return
+            self._skips.append(layout)
+        raise ValueError(f"Field '{field}' not found in message definition.")
+
+    def _skip(self, buffer, pos: int) -> int:
+        for kind, arg in self._skips:
+            if kind == _FIXED:
+                pos += arg.itemsize
+            elif kind == _ARRAY:
+                pos += 4 + _UINT32.unpack_from(buffer, pos)[0] * arg.itemsize
+            elif kind == _STRING:
+                pos += 4 + _UINT32.unpack_from(buffer, pos)[0]
+            elif kind == _HEADER:
+                pos += 12
+                pos += 4 + _UINT32.unpack_from(buffer, pos)[0]
+            else:
+                count = arg if arg >= 0 else _UINT32.unpack_from(buffer, pos)[0]
+                if arg < 0:
+                    pos += 4
+                for _ in range(count):
+                    pos += 4 + _UINT32.unpack_from(buffer, pos)[0]
+        return pos
+
+    def __call__(self, buffer):
+        """
+        从一条消息的序列化数据中读取目标字段。
+
+        Args:
+            buffer: 序列化数据（bytes 或 memoryview）。
+        """
+        pos = self._skip(buffer, 0)
+        kind, dtype = self._target
+        if kind == _STRING:
+            size = _UINT32.unpack_from(buffer, pos)[0]
+            return bytes(buffer[pos + 4:pos + 4 + size]).decode('utf-8')
+        if kind == _ARRAY:
+            count = _UINT32.unpack_from(buffer, pos)[0]
+            if dtype == PRIMITIVE_DTYPES['uint8']:
+                return memoryview(buffer)[pos + 4:pos + 4 + count]
+            return np.frombuffer(buffer, dtype=dtype, count=count, offset=pos + 4)
+        if dtype.subdtype is not None:
+            base, shape = dtype.subdtype
+            return np.frombuffer(buffer, dtype=base, count=shape[0], offset=pos)
+        return np.frombuffer(buffer, dtype=dtype, count=1, offset=pos)[0]
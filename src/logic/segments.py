@@ -0,0 +1,88 @@
+from typing import Sequence
+
+import numpy as np
+
+# 键盘事件
+EVENT_START = 'start'
+EVENT_STOP = 'stop'
+EVENT_STOP_AND_DELETE = 'stop_and_delete'
+
+
+def keyboard_intervals(times: Sequence[float], events: Sequence[str]) -> np.ndarray:
+    """
+    根据键盘事件生成有效的时间区间（向量化实现）。
+
+    每个 'start' 与下一个 'start' 之间的事件构成一组：组内有 'stop_and_delete' 时该 'start' 作废，
+    否则取组内第一个 'stop' 作为区间终点；组内没有 'stop' 时不生成区间。其他事件被忽略。
+
+    Args:
+        times: 事件时间（秒），无需排序。
+        events: 与 times 一一对应的事件名称。
+
+    Returns:
+        np.ndarray: 形状为 [K, 2] 的 (开始时间, 结束时间) 数组，按开始时间排序。
+    """
+    times = np.asarray(times, dtype=np.float64)
+    events = np.asarray(events, dtype=object)
+    if times.size == 0:
+        return np.zeros((0, 2))
+    order = np.argsort(times, kind='stable')
+    times, events = times[order], events[order]
+
+    is_start = events == EVENT_START
+    # 每个事件所属的组号：第 k 个 'start' 及其后的事件属于第 k 组，第一个 'start' 之前的事件属于第 0 组
+    group = np.cumsum(is_start)
+    num_groups = int(group[-1])
+    if num_groups == 0:
+        return np.zeros((0, 2))
+
+    deleted = np.bincount(group[events == EVENT_STOP_AND_DELETE], minlength=num_groups + 1) > 0
+    stop_positions = np.flatnonzero(events == EVENT_STOP)
+    stop_groups, first = np.unique(group[stop_positions], return_index=True)
+    stop_time = np.full(num_groups + 1, np.nan)
+    stop_time[stop_groups] = times[stop_positions[first]]
+
+    start_time = np.full(num_groups + 1, np.nan)
+    start_time[1:] = times[is_start]
+    keep = ~deleted & ~np.isnan(stop_time)
+    keep[0] = False
+    return np.column_stack([start_time[keep], stop_time[keep]])
+
+
+def intervals_to_indices(timestamps, intervals) -> np.ndarray:
+    """
+    将时间区间映射到已排序时间戳数组上的闭区间索引 [start_idx, end_idx]，不包含任何时间戳的区间被丢弃。
+
+    Args:
+        timestamps: 升序排列的时间戳 (Numpy array)。
+        intervals: 形状为 [K, 2] 的 (开始时间, 结束时间)。
+
+    Returns:
+        np.ndarray: 形状为 [K', 2] 的索引区间 (np.int64)。
+    """
+    timestamps = np.asarray(timestamps)
+    intervals = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+    start_idx = np.searchsorted(timestamps, intervals[:, 0], side='left')
+    end_idx = np.searchsorted(timestamps, intervals[:, 1], side='right') - 1
+    keep = start_idx <= end_idx
+    return np.column_stack([start_idx[keep], end_idx[keep]]).astype(np.int64)
+
+
+def split_by_gap(timestamps, max_gap: float) -> np.ndarray:
+    """
+    在相邻时间戳之差超过 max_gap 的位置切分，返回各段的闭区间索引。
+
+    Args:
+        timestamps: 升序排列的时间戳 (Numpy array，秒)。
+        max_gap (float): 允许的最大间隔（秒）。
+
+    Returns:
+        np.ndarray: 形状为 [K, 2] 的索引区间 (np.int64)；时间戳为空时 K 为 0。
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if timestamps.size == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(timestamps) > max_gap) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks - 1, [timestamps.size - 1]])
+    return np.column_stack([starts, ends]).astype(np.int64)
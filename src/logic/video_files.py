@@ -0,0 +1,22 @@
+import os
+from typing import Optional
+
+# 处理后的视频文件名，按优先级排列：重编码输出为 video.mp4，JPEG 直通输出为 video.avi
+VIDEO_FILE_NAMES = ('video.mp4', 'video.avi')
+
+
+def find_video_file(project_dir: str) -> Optional[str]:
+    """
+    在视频项目目录中查找处理后的视频文件。
+
+    Args:
+        project_dir (str): 视频项目目录（process_data.py 的单个输出目录）。
+
+    Returns:
+        Optional[str]: 视频文件的路径；目录中没有视频时返回 None。
+    """
+    for name in VIDEO_FILE_NAMES:
+        path = os.path.join(project_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
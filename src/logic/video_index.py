@@ -0,0 +1,355 @@
+import os
+import struct
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from logic.frame_times import TIMESTAMPS_FILE
+
+# 逐帧索引：数据在视频文件中的绝对字节偏移、长度，以及是否为关键帧（可独立解码）。
+FRAME_INDEX_DTYPE = np.dtype([('offset', '<i8'), ('size', '<i8'), ('keyframe', '?')])
+FRAME_INDEX_FILE = 'video_index.npy'
+
+_MP4_CONTAINER_BOXES = (b'moov', b'trak', b'mdia', b'minf', b'stbl')
+
+
+def make_frame_index(offsets, sizes, keyframes=None) -> np.ndarray:
+    """
+    构建逐帧索引数组。
+
+    Args:
+        offsets: 每帧数据的绝对字节偏移。
+        sizes: 每帧数据的字节数。
+        keyframes: 每帧是否为关键帧；为 None 时视为全部是关键帧。
+
+    Returns:
+        np.ndarray: dtype 为 FRAME_INDEX_DTYPE 的结构化数组。
+    """
+    index = np.zeros(len(offsets), dtype=FRAME_INDEX_DTYPE)
+    index['offset'] = offsets
+    index['size'] = sizes
+    index['keyframe'] = True if keyframes is None else keyframes
+    return index
+
+
+def _iter_boxes(data: bytes, start: int, end: int):
+    """遍历 [start, end) 范围内的 MP4 box，产出 (类型, 内容起点, box 终点)。"""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            break
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _read_moov(path: str) -> Optional[bytes]:
+    """只把 moov box 读入内存，mdat 中的媒体数据不会被读取。"""
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        pos = 0
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            header = f.read(16)
+            size, box_type = struct.unpack('>I4s', header[:8])
+            if size == 1:
+                size = struct.unpack('>Q', header[8:16])[0]
+            elif size == 0:
+                size = file_size - pos
+            if box_type == b'moov':
+                f.seek(pos)
+                return f.read(size)
+            if size < 8:
+                return None
+            pos += size
+    return None
+
+
+def _find_video_stbl(moov: bytes, start: int, end: int) -> Optional[dict]:
+    """在 moov 中查找第一个视频轨道的 stbl，返回其子 box 的 {类型: (起点, 终点)}。"""
+    for box_type, body, box_end in _iter_boxes(moov, start, end):
+        if box_type != b'trak':
+            continue
+        handler, stbl = None, None
+        stack = [(body, box_end)]
+        while stack:
+            s, e = stack.pop()
+            for child, child_body, child_end in _iter_boxes(moov, s, e):
+                if child == b'hdlr':
+                    handler = moov[child_body + 8:child_body + 12]
+                elif child == b'stbl':
+                    stbl = {t: (b, be) for t, b, be in _iter_boxes(moov, child_body, child_end)}
+                elif child in _MP4_CONTAINER_BOXES:
+                    stack.append((child_body, child_end))
+        if handler == b'vide' and stbl is not None:
+            return stbl
+    return None
+
+
+def read_mp4_frame_index(path: str) -> Optional[np.ndarray]:
+    """
+    从 MP4 的 stsz/stco/stsc/stss 表中读取逐帧索引，不解码任何视频数据。
+
+    Args:
+        path (str): MP4 文件路径。
+
+    Returns:
+        Optional[np.ndarray]: 按解码顺序排列的逐帧索引；文件中没有视频轨道时返回 None。
+    """
+    moov = _read_moov(path)
+    if moov is None:
+        return None
+    stbl = _find_video_stbl(moov, 8, len(moov))
+    if stbl is None or b'stsz' not in stbl:
+        return None
+
+    def table(box_type, fmt, fields):
+        body, _ = stbl[box_type]
+        count = struct.unpack('>I', moov[body + 4:body + 8])[0]
+        return np.frombuffer(moov, dtype=np.dtype(fmt), count=count * fields, offset=body + 8).reshape(count, fields)
+
+    body, _ = stbl[b'stsz']
+    sample_size, sample_count = struct.unpack('>II', moov[body + 4:body + 12])
+    if sample_size:
+        sizes = np.full(sample_count, sample_size, dtype=np.int64)
+    else:
+        sizes = np.frombuffer(moov, dtype='>u4', count=sample_count, offset=body + 12).astype(np.int64)
+
+    if b'co64' in stbl:
+        chunk_offsets = table(b'co64', '>u8', 1)[:, 0].astype(np.int64)
+    else:
+        chunk_offsets = table(b'stco', '>u4', 1)[:, 0].astype(np.int64)
+
+    # stsc 以游程形式记录每个 chunk 的样本数，展开到每个 chunk
+    stsc = table(b'stsc', '>u4', 3).astype(np.int64)
+    first_chunks = stsc[:, 0] - 1
+    run_lengths = np.diff(np.append(first_chunks, len(chunk_offsets)))
+    samples_per_chunk = np.repeat(stsc[:, 1], run_lengths)
+
+    chunk_of_sample = np.repeat(np.arange(len(chunk_offsets)), samples_per_chunk)[:sample_count]
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    chunk_first_sample = np.cumsum(samples_per_chunk) - samples_per_chunk
+    offsets = chunk_offsets[chunk_of_sample] + starts - starts[chunk_first_sample[chunk_of_sample]]
+
+    keyframes = None
+    if b'stss' in stbl:
+        keyframes = np.zeros(sample_count, dtype=bool)
+        keyframes[table(b'stss', '>u4', 1)[:, 0].astype(np.int64) - 1] = True
+    return make_frame_index(offsets, sizes, keyframes)
+
+
+def _read_descriptor(data: bytes, pos: int) -> Tuple[int, int, int]:
+    """读取 esds 中的一个 MPEG-4 描述符头（长度为 1-4 字节的变长编码），返回 (标签, 内容起点, 内容终点)。"""
+    tag, pos, size = data[pos], pos + 1, 0
+    for _ in range(4):
+        byte, pos = data[pos], pos + 1
+        size = (size << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            break
+    return tag, pos, pos + size
+
+
+def _esds_decoder_config(data: bytes, body: int) -> Optional[bytes]:
+    """从 esds 的 DecoderSpecificInfo 中取出 MPEG-4 Part 2 的 VOS/VOL 头。"""
+    tag, pos, _ = _read_descriptor(data, body + 4)
+    if tag != 0x03:
+        return None
+    flags, pos = data[pos + 2], pos + 3
+    if flags & 0x80:
+        pos += 2
+    if flags & 0x40:
+        pos += 1 + data[pos]
+    if flags & 0x20:
+        pos += 2
+    tag, pos, _ = _read_descriptor(data, pos)
+    if tag != 0x04:
+        return None
+    tag, pos, end = _read_descriptor(data, pos + 13)
+    return bytes(data[pos:end]) if tag == 0x05 else None
+
+
+def _read_mp4v_header(path: str) -> Optional[bytes]:
+    """
+    读取 mp4v（MPEG-4 Part 2）视频轨道的 VOS/VOL 头。mp4v 的样本前加上该头即可拼接成可独立解码的裸码流。
+
+    Returns:
+        Optional[bytes]: 码流头；不是 mp4v 编码或没有 esds 时返回 None。
+    """
+    moov = _read_moov(path)
+    stbl = None if moov is None else _find_video_stbl(moov, 8, len(moov))
+    if stbl is None or b'stsd' not in stbl:
+        return None
+    body, end = stbl[b'stsd']
+    # stsd 的第一个样本描述：VisualSampleEntry 的固定字段共 78 字节，之后是 esds 等子 box
+    entry_size, codec = struct.unpack('>I4s', moov[body + 8:body + 16])
+    if codec != b'mp4v':
+        return None
+    for box_type, child_body, _ in _iter_boxes(moov, body + 16 + 78, min(end, body + 8 + entry_size)):
+        if box_type == b'esds':
+            return _esds_decoder_config(moov, child_body)
+    return None
+
+
+def decode_mp4_frames(video_path: str, index: np.ndarray, start: int, end: int) -> Iterator[np.ndarray]:
+    """
+    帧精确地解码 MP4 的 [start, end] 帧。mp4v 编码时按逐帧索引取出 start 之前最近的关键帧到 end 的样本，
+    拼接成裸码流后顺序解码，不依赖 CAP_PROP_POS_FRAMES 定位（它对 mp4v 并不逐帧精确）；
+    其他编码格式定位到该关键帧后顺序解码。
+
+    Args:
+        video_path (str): MP4 文件路径。
+        index (np.ndarray): 该文件的逐帧索引（video_index.npy 或 read_mp4_frame_index 的结果）。
+        start (int): 第一帧。
+        end (int): 最后一帧（包含）。
+
+    Yields:
+        np.ndarray: 依次为第 start 到 end 帧的 BGR 图像；视频提前结束时数量更少。
+    """
+    if start >= len(index):
+        return
+    keyframes = np.flatnonzero(index['keyframe'][:start + 1])
+    first = int(keyframes[-1]) if len(keyframes) else 0
+    header = _read_mp4v_header(video_path)
+    temp_path = None
+    if header is None:
+        capture = cv2.VideoCapture(video_path)
+        if first > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, first)
+    else:
+        fd, temp_path = tempfile.mkstemp(suffix='.m4v')
+        with os.fdopen(fd, 'wb') as out, open(video_path, 'rb') as f:
+            out.write(header)
+            for offset, size in zip(index['offset'][first:end + 1], index['size'][first:end + 1]):
+                f.seek(int(offset))
+                out.write(f.read(int(size)))
+        capture = cv2.VideoCapture(temp_path)
+    try:
+        for _ in range(start - first):
+            if not capture.grab():
+                return
+        for _ in range(start, end + 1):
+            ret, frame = capture.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        capture.release()
+        if temp_path is not None:
+            os.remove(temp_path)
+
+
+def decode_frames(video_path: str, start: int, end: int) -> Iterator[np.ndarray]:
+    """
+    从视频开头顺序解码，依次产出第 start 到 end 帧。用于没有逐帧索引、无法从关键帧开始解码的视频。
+
+    Yields:
+        np.ndarray: BGR 图像；视频提前结束时数量更少。
+    """
+    capture = cv2.VideoCapture(video_path)
+    try:
+        for i in range(end + 1):
+            ret, frame = capture.read()
+            if not ret:
+                return
+            if i >= start:
+                yield frame
+    finally:
+        capture.release()
+
+
+def save_frame_index(video_dir: str, index: np.ndarray) -> str:
+    """
+    将逐帧索引写为视频旁的 video_index.npy。
+
+    Returns:
+        str: 索引文件路径。
+    """
+    path = os.path.join(video_dir, FRAME_INDEX_FILE)
+    np.save(path, index)
+    return path
+
+
+def load_frame_index(video_dir: str) -> Optional[np.ndarray]:
+    """
+    加载视频目录中的 video_index.npy（以 memory-map 方式）。
+
+    Returns:
+        Optional[np.ndarray]: 逐帧索引；文件不存在时返回 None。
+    """
+    path = os.path.join(video_dir, FRAME_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+def count_video_frames(video_dir: str, video_path: Optional[str] = None) -> int:
+    """
+    不解码地获取视频的真实帧数：依次使用逐帧索引、逐帧时间戳（TIMESTAMPS_FILE）、MP4 的 stsz 表，
+    都没有时才读取 OpenCV 报告的 CAP_PROP_FRAME_COUNT。
+
+    Args:
+        video_dir (str): 视频项目目录。
+        video_path (Optional[str]): 视频文件路径，用于后两种方式；为 None 时只使用目录中的 .npy 文件。
+
+    Returns:
+        int: 帧数；无法确定时为 0。
+    """
+    index = load_frame_index(video_dir)
+    if index is not None:
+        return len(index)
+    timestamps_path = os.path.join(video_dir, TIMESTAMPS_FILE)
+    if os.path.exists(timestamps_path):
+        return len(np.load(timestamps_path, mmap_mode='r'))
+    if video_path is None:
+        return 0
+    if video_path.endswith('.mp4'):
+        index = read_mp4_frame_index(video_path)
+        if index is not None:
+            return len(index)
+    capture = cv2.VideoCapture(video_path)
+    num_frames = max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+    capture.release()
+    return num_frames
+
+
+class JpegFrameReader:
+    """
+    基于逐帧索引直接读取全帧内 MJPEG 视频中的任意一帧：
+    一次 seek + read 取出该帧的 JPEG 数据后解码，定位耗时与帧号无关。
+    """
+    def __init__(self, video_path: str, index: np.ndarray):
+        """
+        Args:
+            video_path (str): MJPEG AVI 文件路径。
+            index (np.ndarray): 该文件的逐帧索引，必须全部为关键帧。
+        """
+        if not bool(np.all(index['keyframe'])):
+            raise ValueError(f"{video_path} is not all-intra; direct frame access is not possible.")
+        self.index = index
+        self._file = open(video_path, 'rb')
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def read_jpeg(self, frame_index: int) -> bytes:
+        """读取指定帧的原始 JPEG 数据。"""
+        entry = self.index[frame_index]
+        self._file.seek(int(entry['offset']))
+        return self._file.read(int(entry['size']))
+
+    def read(self, frame_index: int):
+        """读取并解码指定帧，返回 BGR 图像；解码失败时返回 None。"""
+        data = self.read_jpeg(frame_index)
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    def close(self) -> None:
+        self._file.close()
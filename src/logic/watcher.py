@@ -0,0 +1,96 @@
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 目录签名：(文件数, 总字节数, 最新的 mtime_ns)
+Signature = Tuple[int, int, int]
+
+
+def directory_signature(path: str) -> Optional[Signature]:
+    """
+    用 os.scandir 递归统计目录中的文件数、总大小和最新修改时间。
+
+    Returns:
+        Optional[Signature]: 目录签名；目录不存在、为空或仍有正在录制的 *.active 文件时返回 None。
+    """
+    count, size, mtime = 0, 0, 0
+    stack = [path]
+    try:
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if entry.name.endswith('.active'):
+                        return None  # rosbag record 仍在写入
+                    stat = entry.stat(follow_symlinks=False)
+                    count += 1
+                    size += stat.st_size
+                    mtime = max(mtime, stat.st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    return (count, size, mtime) if count else None
+
+
+class RecordingWatcher:
+    """
+    轮询 bag 根目录，找出已经拷贝完成的录制目录。
+
+    目录的签名（文件数、总大小、最新修改时间）连续 settle_time 秒保持不变时视为拷贝完成。
+    已交给调用方的目录在签名再次变化（例如录制被重新拷贝）或调用方撤销认领（例如处理失败）之前不会重复返回。
+    """
+    def __init__(self, root: str, settle_time: float = 30.0):
+        """
+        Args:
+            root (str): bag 根目录，每个子目录是一个录制。
+            settle_time (float): 签名需要保持不变的时间（秒）。
+        """
+        self.root = root
+        self.settle_time = settle_time
+        self._seen: Dict[str, Tuple[Signature, float]] = {}
+        self._claimed: Dict[str, Signature] = {}
+
+    def poll(self, now: Optional[float] = None) -> List[Tuple[str, Signature]]:
+        """
+        扫描一次根目录。
+
+        Args:
+            now (Optional[float]): 当前时间（time.monotonic()），默认取当前时间。
+
+        Returns:
+            List[Tuple[str, Signature]]: 已稳定且尚未交出的 (录制目录, 签名)，按目录名排序。
+        """
+        now = time.monotonic() if now is None else now
+        try:
+            with os.scandir(self.root) as entries:
+                names = sorted(entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.'))
+        except FileNotFoundError:
+            return []
+
+        ready = []
+        for name in names:
+            path = os.path.join(self.root, name)
+            signature = directory_signature(path)
+            if signature is None:
+                self._seen.pop(path, None)
+                continue
+            previous = self._seen.get(path)
+            if previous is None or previous[0] != signature:
+                self._seen[path] = (signature, now)
+                continue
+            if now - previous[1] >= self.settle_time and self._claimed.get(path) != signature:
+                ready.append((path, signature))
+        # 已删除的目录不再跟踪
+        for path in set(self._seen) - {os.path.join(self.root, name) for name in names}:
+            del self._seen[path]
+        return ready
+
+    def claim(self, path: str, signature: Signature) -> None:
+        """标记该目录的当前签名已交给调用方处理。"""
+        self._claimed[path] = signature
+
+    def unclaim(self, path: str, signature: Signature) -> None:
+        """撤销 claim（例如处理失败），该目录在之后的轮询中会再次返回；签名已被重新认领时不做任何事。"""
+        if self._claimed.get(path) == signature:
+            del self._claimed[path]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+生成与真实录制目录结构和 topic 相同的合成 bag，用于在没有机器人数据时测试和基准测试 process_data。
+消息类型通过 genpy.dynamic 根据消息定义动态生成，不依赖机器人的消息包。
+用法: python3 make_synthetic_bags.py ../bagdata_synthetic --minutes 1 10 --size 640x480
+"""
+
+import os
+import argparse
+import numpy as np
+import cv2
+import rosbag
+import genpy
+from genpy.dynamic import generate_dynamic
+
+# 录制开始时间（2025-03-11 11:18:45），与真实数据的时间戳量级一致
+START_TIME = 1741663125.0
+
+_SEPARATOR = '=' * 80
+
+HEADER_DEF = """MSG: std_msgs/Header
+uint32 seq
+time stamp
+string frame_id
+"""
+
+# (消息类型, 消息定义全文)。手部和机械臂状态只包含 process_data 读取的字段。
+IMAGE_MSG = ('sensor_msgs/CompressedImage', f"""Header header
+string format
+uint8[] data
+{_SEPARATOR}
+{HEADER_DEF}""")
+
+ARM_MSG = ('synthetic_msgs/ArmStatus', f"""Header header
+float64[] joint_status
+{_SEPARATOR}
+{HEADER_DEF}""")
+
+HAND_MSG = ('synthetic_msgs/HandStatus', f"""Header header
+synthetic_msgs/HandState[] hand_states
+synthetic_msgs/SensorState[] sensor_states
+{_SEPARATOR}
+{HEADER_DEF}{_SEPARATOR}
+MSG: synthetic_msgs/HandState
+float64[] position
+{_SEPARATOR}
+MSG: synthetic_msgs/SensorState
+synthetic_msgs/FingerSensorState[] finger_sensor_states
+{_SEPARATOR}
+MSG: synthetic_msgs/FingerSensorState
+geometry_msgs/Vector3 calc_force
+{_SEPARATOR}
+MSG: geometry_msgs/Vector3
+float64 x
+float64 y
+float64 z
+""")
+
+KEYBOARD_MSG = ('std_msgs/String', "string data\n")
+
+def message_classes():
+    """
+    动态生成四种消息类。
+    :return: 字典 {'image', 'arm', 'hand', 'keyboard': 消息类}，手部状态的子类型以 'hand.<名称>' 为键。
+    """
+    classes = {}
+    for key, (msg_type, msg_def) in (('image', IMAGE_MSG), ('arm', ARM_MSG), ('hand', HAND_MSG),
+                                     ('keyboard', KEYBOARD_MSG)):
+        generated = generate_dynamic(msg_type, msg_def)
+        classes[key] = generated[msg_type]
+        if key == 'hand':
+            for name in ('HandState', 'SensorState', 'FingerSensorState'):
+                classes[f'hand.{name}'] = generated[f'synthetic_msgs/{name}']
+            classes['hand.Vector3'] = generated['geometry_msgs/Vector3']
+    return classes
+
+def timeline(duration, rate, rng, jitter=0.2):
+    """
+    生成 [0, duration) 内频率为 rate 的接收时间（秒），每个时间加上不超过 jitter / rate 的随机抖动。
+    """
+    ts = np.arange(0.0, duration, 1.0 / rate)
+    return ts + rng.uniform(0, jitter / rate, ts.size)
+
+def make_jpeg_pool(num_frames, width, height, jpeg_quality, rng):
+    """
+    生成 num_frames 帧带运动和噪声的合成画面并编码为 JPEG。
+    """
+    yy, xx = np.mgrid[0:height, 0:width]
+    pool = []
+    for i in range(num_frames):
+        frame = np.dstack([(xx + 3 * i) % 256, (yy + 2 * i) % 256, ((xx + yy) // 2 + i) % 256]).astype(np.uint8)
+        frame = cv2.add(frame, rng.integers(0, 16, frame.shape, dtype=np.uint8))
+        pool.append(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])[1].tobytes())
+    return pool
+
+def to_ros_time(seconds):
+    return genpy.Time.from_sec(START_TIME + seconds)
+
+def write_recording(recording_dir, minutes=1.0, fps=30, size=(640, 480), arm_rate=100, hand_rate=100, arm_joints=7,
+                    hand_joints=12, fingers=5, segments=4, jpeg_quality=90, unique_frames=120, seed=0):
+    """
+    写出一个合成录制目录，文件布局和 topic 与 process_directory 读取的一致：
+    realsence_color_img.bag、right_arm_status.bag、xhand/right_hand_status.bag 和 keyboard.bag。
+    :param minutes: 录制时长（分钟）。
+    :param fps: 图像帧率。
+    :param size: 图像尺寸 (宽, 高)。
+    :param arm_rate: 机械臂状态频率 (Hz)。
+    :param hand_rate: 手部状态频率 (Hz)。
+    :param segments: keyboard.bag 中 start/stop 区间的数量，均匀分布在整个录制上。
+    :param unique_frames: 预先编码的不同画面数量，图像按该数量循环使用，避免生成长录制时逐帧编码 JPEG。
+    :return: 各数据流的消息数 {'image': ..., 'arm': ..., 'hand': ..., 'keyboard': ...}。
+    """
+    rng = np.random.default_rng(seed)
+    classes = message_classes()
+    duration = minutes * 60.0
+    os.makedirs(os.path.join(recording_dir, 'xhand'), exist_ok=True)
+    counts = {}
+
+    img_ts = timeline(duration, fps, rng)
+    pool = make_jpeg_pool(max(1, min(unique_frames, img_ts.size)), size[0], size[1], jpeg_quality, rng)
+    with rosbag.Bag(os.path.join(recording_dir, 'realsence_color_img.bag'), 'w') as bag:
+        for i, t in enumerate(img_ts):
+            msg = classes['image']()
+            msg.header.seq, msg.header.stamp, msg.header.frame_id = i, to_ros_time(t), 'camera_color_optical_frame'
+            msg.format = 'rgb8; jpeg compressed bgr8'
+            msg.data = pool[i % len(pool)]
+            bag.write('realsence_color_img', msg, to_ros_time(t))
+    counts['image'] = img_ts.size
+
+    arm_ts = timeline(duration, arm_rate, rng)
+    phases = rng.uniform(0, 2 * np.pi, arm_joints)
+    arm = np.sin(arm_ts[:, None] * 0.5 + phases)
+    with rosbag.Bag(os.path.join(recording_dir, 'right_arm_status.bag'), 'w') as bag:
+        for i, t in enumerate(arm_ts):
+            msg = classes['arm']()
+            msg.header.seq, msg.header.stamp = i, to_ros_time(t)
+            msg.joint_status = arm[i].tolist()
+            bag.write('right_arm_status', msg, to_ros_time(t))
+    counts['arm'] = arm_ts.size
+
+    hand_ts = timeline(duration, hand_rate, rng)
+    phases = rng.uniform(0, 2 * np.pi, hand_joints)
+    hand = np.abs(np.sin(hand_ts[:, None] * 0.8 + phases))
+    forces = rng.standard_normal((hand_ts.size, fingers, 3)) * 0.1 + np.array([0.0, 0.0, 1.0])
+    Vector3, FingerSensorState = classes['hand.Vector3'], classes['hand.FingerSensorState']
+    with rosbag.Bag(os.path.join(recording_dir, 'xhand', 'right_hand_status.bag'), 'w') as bag:
+        for i, t in enumerate(hand_ts):
+            msg = classes['hand']()
+            msg.header.seq, msg.header.stamp = i, to_ros_time(t)
+            msg.hand_states = [classes['hand.HandState'](position=hand[i].tolist())]
+            msg.sensor_states = [classes['hand.SensorState'](finger_sensor_states=[
+                FingerSensorState(calc_force=Vector3(*force)) for force in forces[i].tolist()])]
+            bag.write('/xhand/right_hand_status', msg, to_ros_time(t))
+    counts['hand'] = hand_ts.size
+
+    # 每个区间占其时间片的中间 80%
+    events = []
+    for k in range(segments):
+        slot = duration / max(1, segments)
+        events += [(k * slot + 0.1 * slot, 'start'), (k * slot + 0.9 * slot, 'stop')]
+    with rosbag.Bag(os.path.join(recording_dir, 'keyboard.bag'), 'w') as bag:
+        for t, event in events:
+            bag.write('keyboard_input', classes['keyboard'](data=event), to_ros_time(t))
+    counts['keyboard'] = len(events)
+    return counts
+
+def parse_size(text):
+    width, height = map(int, text.lower().split('x'))
+    return width, height
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic recording directories for testing and benchmarking.")
+    parser.add_argument('output_dir', type=str, help='Directory to write the recordings into (one subfolder per recording).')
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1], help='Length of each recording to generate.')
+    parser.add_argument('--fps', type=float, default=30, help='Image frame rate.')
+    parser.add_argument('--size', type=str, default='640x480', help='Image size, WIDTHxHEIGHT.')
+    parser.add_argument('--arm-rate', type=float, default=100, help='Arm status rate (Hz).')
+    parser.add_argument('--hand-rate', type=float, default=100, help='Hand status rate (Hz).')
+    parser.add_argument('--segments', type=int, default=4, help='Number of start/stop intervals in keyboard.bag.')
+    parser.add_argument('--jpeg-quality', type=int, default=90, help='JPEG quality of the synthetic images.')
+    parser.add_argument('--unique-frames', type=int, default=120, help='Number of distinct images, cycled over the recording.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    args = parser.parse_args()
+
+    for i, minutes in enumerate(args.minutes):
+        recording_dir = os.path.join(args.output_dir, f"synthetic_{minutes:g}min_{i}")
+        counts = write_recording(recording_dir, minutes, args.fps, parse_size(args.size), args.arm_rate,
+                                 args.hand_rate, segments=args.segments, jpeg_quality=args.jpeg_quality,
+                                 unique_frames=args.unique_frames, seed=args.seed + i)
+        print(f"Wrote {recording_dir}: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+
+if __name__ == '__main__':
+    main()
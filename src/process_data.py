@@ -4,30 +4,123 @@
 import os
 import sys
 import argparse
+import time
+import queue
+import itertools
+import threading
+import shutil
+import tempfile
+import contextlib
+import collections
+import traceback
+import signal
+import multiprocessing
+import concurrent.futures
 import rosbag
+import genpy
 import cv2
 import numpy as np
 from tqdm import tqdm
 
-def decode_image_from_ros_msg(msg):
+from logic.alignment import TimelineAligner
+from logic.avi_writer import MjpegAviWriter
+from logic.ffmpeg_writer import FfmpegPipeWriter
+from logic.video_files import find_video_file
+from logic.video_index import read_mp4_frame_index, save_frame_index
+from logic.frame_times import estimate_fps
+from logic.frame_cache import FrameCache, source_signature
+from logic.raw_message import RawFieldReader
+from logic.columns import ColumnBuffer
+from logic.segments import keyboard_intervals, intervals_to_indices, split_by_gap
+from logic.manifest import (TOOL_VERSION, build_manifest, outputs_up_to_date, previous_outputs, write_manifest,
+                            temp_output_dir, remove_stale_temp_dirs, replace_directory)
+from logic.profiler import NULL_PROFILER, StageProfiler, merge_reports, append_jsonl
+from logic.watcher import RecordingWatcher, directory_signature
+from logic.leases import LeaseManager
+
+# 视频编码配置：'mp4v' 为 OpenCV 默认的长 GOP 编码；'short-gop' 通过 ffmpeg 以固定的短关键帧间隔编码；
+# 'intra' 每帧都是独立的 JPEG（MJPEG AVI），配合 video_index.npy 可以直接定位任意帧。
+ENCODING_PROFILES = ('mp4v', 'short-gop', 'intra')
+
+# 全局编码器名额（threading 或 multiprocessing 的 BoundedSemaphore），限制同时写入的 VideoWriter 数量。
+# 为 None 时不做限制。
+_encoder_slots = None
+
+def init_encoder_slots(slots):
     """
-    从 ROS 压缩图像消息中解码出 OpenCV 图像。
-    :param msg: ROS 压缩图像消息 (sensor_msgs/CompressedImage)
+    设置全局编码器名额。也用作进程池的 initializer，使所有工作进程共享同一个信号量。
+    :param slots: BoundedSemaphore 实例或 None。
+    """
+    global _encoder_slots
+    _encoder_slots = slots
+
+# 当前目录的分阶段计时器（--profile），未开启时为不做记录的 NULL_PROFILER。
+# 每个进程同一时间只处理一个目录，由 run_directory_job 设置和重置。
+_profiler = NULL_PROFILER
+
+def count_bytes_read(path):
+    """
+    把完整读取的 bag 文件大小计入 --profile 的 bag_bytes_read 计数器。
+    """
+    if os.path.exists(path):
+        _profiler.count('bag_bytes_read', os.path.getsize(path))
+
+def decode_image(payload):
+    """
+    从压缩图像数据中解码出 OpenCV 图像。
+    :param payload: 压缩图像数据（bytes 或零拷贝的 memoryview）
     :return: OpenCV BGR 图像
     """
     try:
-        np_arr = np.frombuffer(msg.data, np.uint8)
+        np_arr = np.frombuffer(payload, np.uint8)
         return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
     except Exception as e:
         print(f"Error decoding image: {e}")
         return None
 
-def extract_data_from_bag(bag_path, topic, extract_func):
+def decode_image_from_ros_msg(msg):
+    """
+    从 ROS 压缩图像消息中解码出 OpenCV 图像。
+    :param msg: ROS 压缩图像消息 (sensor_msgs/CompressedImage)
+    :return: OpenCV BGR 图像
+    """
+    return decode_image(msg.data)
+
+def raw_field_getter(field):
+    """
+    创建一个从 read_messages(raw=True) 的原始消息中读取单个顶层字段的函数。
+    根据消息定义直接从序列化数据中定位字段（见 logic.raw_message.RawFieldReader），不创建消息对象；
+    消息定义中目标字段之前有嵌套消息类型等无法跳过的字段时，回退为完整反序列化。
+    :param field: 字段名，例如 'data' 或 'joint_status'。
+    :return: 函数 raw_msg -> 字段值。uint8[] 字段返回零拷贝的 memoryview，其余基本类型数组返回 Numpy 数组。
+    """
+    readers = {}
+
+    def get_field(raw_msg):
+        _, data, md5sum, _, pytype = raw_msg[:5]
+        if md5sum not in readers:
+            try:
+                readers[md5sum] = RawFieldReader(pytype._full_text, field)
+            except ValueError as e:
+                print(f"Info: falling back to full deserialization for {pytype._type}.{field}: {e}")
+                readers[md5sum] = None
+        reader = readers[md5sum]
+        if reader is None:
+            msg = pytype()
+            msg.deserialize(data)
+            return getattr(msg, field)
+        return reader(data)
+
+    return get_field
+
+def extract_data_from_bag(bag_path, topic, extract_func, raw=False):
     """
     从指定的 bag 文件和 topic 中提取数据。
     :param bag_path: .bag 文件的路径。
     :param topic: 要读取的 topic 名称。
     :param extract_func: 一个函数，用于从每个消息中提取所需的数据。
+    :param raw: 为 True 时不反序列化消息，extract_func 接收 read_messages(raw=True) 的原始消息，
+                通常与 raw_field_getter 配合使用。
     :return: 一个元组 (timestamps, data)，其中 timestamps 是秒的列表，data 是提取的数据列表。
     """
     timestamps = []
@@ -38,7 +131,7 @@ def extract_data_from_bag(bag_path, topic, extract_func):
 
     try:
         with rosbag.Bag(bag_path, 'r') as bag:
-            for _, msg, t in bag.read_messages(topics=[topic]):
+            for _, msg, t in bag.read_messages(topics=[topic], raw=raw):
                 timestamps.append(t.to_sec())
                 extracted = extract_func(msg)
                 if extracted is not None:
@@ -46,15 +139,107 @@ def extract_data_from_bag(bag_path, topic, extract_func):
     except Exception as e:
         print(f"Error reading bag file {bag_path} for topic {topic}: {e}")
         return np.array([]), []
+    count_bytes_read(bag_path)
     
     if not timestamps:
         print(f"Warning: No messages found on topic '{topic}' in {bag_path}. Please check the topic name.")
 
     return np.array(timestamps), data
 
+def extract_columns_from_bag(bag_path, topic, extract_row, num_columns, raw=False):
+    """
+    从指定的 bag 文件和 topic 中按列提取数值数据，直接写入预分配的数组（容量取自 bag 中的消息数）。
+    :param extract_row: 函数 msg -> 元组，每个元素是该消息在对应列组中的一行数值序列。
+    :param num_columns: 列组数量，即 extract_row 返回元组的长度。
+    :param raw: 见 extract_data_from_bag。
+    :return: 一个元组 (timestamps, columns, valid)：秒时间戳数组、与列组一一对应的 [N, D] 数组列表，
+             以及每条消息的各列组长度是否都与第一条消息一致的掩码。
+    """
+    empty = (np.array([]), [np.zeros((0, 0)) for _ in range(num_columns)], np.zeros(0, dtype=bool))
+    if not os.path.exists(bag_path):
+        print(f"Warning: Bag file not found at {bag_path}")
+        return empty
+
+    try:
+        with rosbag.Bag(bag_path, 'r') as bag:
+            capacity = bag.get_message_count(topic_filters=[topic]) or 1024
+            timestamps = ColumnBuffer(capacity, width=1)
+            buffers = [ColumnBuffer(capacity) for _ in range(num_columns)]
+            for _, msg, t in bag.read_messages(topics=[topic], raw=raw):
+                timestamps.append((t.to_sec(),))
+                for buffer, row in zip(buffers, extract_row(msg)):
+                    buffer.append(row)
+    except Exception as e:
+        print(f"Error reading bag file {bag_path} for topic {topic}: {e}")
+        return empty
+    count_bytes_read(bag_path)
+
+    if len(timestamps) == 0:
+        print(f"Warning: No messages found on topic '{topic}' in {bag_path}. Please check the topic name.")
+        return empty
+
+    valid = np.logical_and.reduce([buffer.valid for buffer in buffers])
+    return timestamps.data[:, 0], [buffer.data for buffer in buffers], valid
+
+def extract_timestamps_from_bag(bag_path, topic):
+    """
+    流式模式的第一遍扫描：只读取 bag 索引中的时间戳，不读取也不反序列化消息体。
+    :param bag_path: .bag 文件的路径。
+    :param topic: 要读取的 topic 名称。
+    :return: 时间戳数组 (np.int64，单位纳秒)，顺序与 read_messages 的返回顺序一致。
+    """
+    if not os.path.exists(bag_path):
+        print(f"Warning: Bag file not found at {bag_path}")
+        return np.array([], dtype=np.int64)
+
+    try:
+        with rosbag.Bag(bag_path, 'r') as bag:
+            connections = list(bag._get_connections(topics=[topic]))
+            timestamps = [entry.time.to_nsec() for entry in bag._get_entries(connections)]
+    except Exception as e:
+        print(f"Error reading bag index {bag_path} for topic {topic}: {e}")
+        return np.array([], dtype=np.int64)
+
+    if not timestamps:
+        print(f"Warning: No messages found on topic '{topic}' in {bag_path}. Please check the topic name.")
+
+    return np.array(timestamps, dtype=np.int64)
+
+def nsec_to_sec(timestamps_ns):
+    """
+    将纳秒时间戳数组转换为秒，结果与 rospy.Time.to_sec() 逐位一致。
+    """
+    timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+    return (timestamps_ns // 1000000000).astype(np.float64) + (timestamps_ns % 1000000000).astype(np.float64) / 1e9
+
+def iter_messages_in_range(bag_path, topic, timestamps_ns, start_idx, end_idx, raw=False):
+    """
+    流式模式的第二遍扫描：按索引区间逐条产出消息，内存中始终只保留一条消息。
+    :param timestamps_ns: extract_timestamps_from_bag 返回的纳秒时间戳数组。
+    :param start_idx: 起始消息索引（包含）。
+    :param end_idx: 结束消息索引（包含）。
+    :param raw: 为 True 时产出 read_messages(raw=True) 的原始消息。
+    """
+    start_ns = int(timestamps_ns[start_idx])
+    end_ns = int(timestamps_ns[end_idx])
+    # read_messages 的时间窗口两端都是闭区间，窗口起点处与 start_idx 同时间戳的前序消息需要跳过
+    lead = start_idx - int(np.searchsorted(timestamps_ns, start_ns, side='left'))
+    count = end_idx - start_idx + 1
+
+    with rosbag.Bag(bag_path, 'r') as bag:
+        messages = bag.read_messages(
+            topics=[topic],
+            start_time=genpy.Time(start_ns // 1000000000, start_ns % 1000000000),
+            end_time=genpy.Time(end_ns // 1000000000, end_ns % 1000000000),
+            raw=raw,
+        )
+        for _, msg, _ in itertools.islice(messages, lead, lead + count):
+            yield msg
+
 def interpolate_data(target_ts, source_ts, source_data):
     """
-    将源数据插值到目标时间戳。
+    将源数据插值到目标时间戳（逐列调用 np.interp 的参考实现）。
+    process_directory 已改用 logic.alignment.TimelineAligner，此函数保留用于对照和基准测试。
     :param target_ts: 目标时间戳 (Numpy array)。
     :param source_ts: 源数据时间戳 (Numpy array)。
     :param source_data: 源数据 (Numpy array of shape [N, D])。
@@ -80,118 +265,394 @@ def interpolate_data(target_ts, source_ts, source_data):
 
 def get_keyboard_intervals(keyboard_bag_path):
     """
-    从 keyboard.bag 中提取事件，并生成有效的时间区间。
+    从 keyboard.bag 中提取事件，并生成有效的时间区间（见 logic.segments.keyboard_intervals）。
     - "start": 标记一个段的开始。
     - "stop": 标记一个段的结束。
     - "stop_and_delete": 使前一个 "start" 无效。
+    :return: 形状为 [K, 2] 的 (开始时间, 结束时间) 数组。
     """
     if not os.path.exists(keyboard_bag_path):
-        return []
+        return np.zeros((0, 2))
 
-    events = []
+    times, events = [], []
     with rosbag.Bag(keyboard_bag_path, 'r') as bag:
         for _, msg, t in bag.read_messages(topics=['keyboard_input']):
             # 直接使用 msg.data，并转换为小写以防万一
-            event_type = msg.data.lower()
-            if event_type in ["start", "stop", "stop_and_delete"]:
-                events.append((t.to_sec(), event_type))
+            times.append(t.to_sec())
+            events.append(msg.data.lower())
+    count_bytes_read(keyboard_bag_path)
 
-    # 按时间排序事件
-    events.sort(key=lambda x: x[0])
-    
-    intervals = []
-    i = 0
-    n = len(events)
-    while i < n:
-        # 寻找 'start' 事件
-        if events[i][1] == 'start':
-            start_time = events[i][0]
-            
-            # 查看从当前 'start' 到下一个 'start' 之间的所有事件
-            j = i + 1
-            sub_events = []
-            while j < n and events[j][1] != 'start':
-                sub_events.append(events[j])
-                j += 1
-
-            # 检查这个区间内是否有 'stop_and_delete'
-            has_delete = any(e[1] == 'stop_and_delete' for e in sub_events)
-            
-            # 如果没有 'stop_and_delete'，则寻找第一个 'stop'
-            if not has_delete:
-                first_stop = next((e for e in sub_events if e[1] == 'stop'), None)
-                if first_stop:
-                    intervals.append((start_time, first_stop[0]))
-            
-            # 将主索引移动到下一个 'start' 事件的位置
-            i = j
-        else:
-            i += 1
-            
-    return intervals
+    return keyboard_intervals(times, events)
 
-def map_time_intervals_to_indices(timestamps, intervals):
+def _decode_frame(payload, jpeg_quality=None):
     """
-    将时间区间映射到时间戳数组的索引区间。
+    解码一帧压缩图像；指定 jpeg_quality 时再把图像重新编码为 JPEG（用于 'intra' 编码配置）。
     """
-    if not intervals:
-        return []
+    with _profiler.stage('decode'):
+        frame = decode_image(payload)
+    if frame is None or jpeg_quality is None:
+        return frame
+    return _encode_jpeg(frame, jpeg_quality)
 
-    indices_intervals = []
-    for start_time, end_time in intervals:
-        start_indices = np.where(timestamps >= start_time)[0]
-        end_indices = np.where(timestamps <= end_time)[0]
-        
-        if start_indices.size > 0 and end_indices.size > 0:
-            start_idx = start_indices[0]
-            end_idx = end_indices[-1]
-            if start_idx <= end_idx:
-                indices_intervals.append((start_idx, end_idx))
-    
-    return indices_intervals
+def _encode_jpeg(frame, jpeg_quality):
+    """把图像编码为 JPEG，失败时返回 None。"""
+    with _profiler.stage('jpeg_encode'):
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return encoded if ok else None
+
+def iter_decoded_frames(img_payloads, decode_threads, jpeg_quality=None):
+    """
+    有界、保序的多线程解码：cv2.imdecode 会释放 GIL，因此多个线程可以真正并行解码。
+    同时在途的解码任务最多为 decode_threads * 2 个，内存占用与段长度无关。
+    :param img_payloads: 按顺序产出压缩图像数据的可迭代对象。
+    :param decode_threads: 解码线程数。
+    :param jpeg_quality: 不为 None 时在解码线程中把图像重新编码为该质量的 JPEG，产出 JPEG 数据而不是图像。
+    :return: 按输入顺序产出解码后图像（解码失败时为 None）的生成器。
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, decode_threads)) as executor:
+        pending = collections.deque()
+        for payload in img_payloads:
+            pending.append(executor.submit(_decode_frame, payload, jpeg_quality))
+            if len(pending) >= max(1, decode_threads) * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
-def save_data_segment(output_dir, img_data, arm_data, hand_pos_data, hand_force_data, start_idx, end_idx):
+def save_data_segment(output_dir, img_payloads, sensor_data, start_idx, end_idx, frame_arrays=None, decode_threads=4,
+                      sensor_format='npy', passthrough=False, encoding='mp4v', gop=10, jpeg_quality=95):
     """
     将指定索引区间的数据保存到一个分段子目录中。
+    解码在线程池中进行，视频编码与文本输出在独立的写入线程中进行，两者通过有界队列衔接。
+    指定了全局编码器名额（init_encoder_slots）时，同时进行的 VideoWriter 编码调用数受其限制。
+    :param img_payloads: 按顺序产出该区间内 end_idx - start_idx + 1 帧压缩图像数据（msg.data 或帧缓存中的
+                         memoryview）的可迭代对象（列表或生成器）。
+    :param sensor_data: 有序字典 {文件名: 已对齐到图像时间戳的数组}，例如 {'arm': ..., 'hand': ..., 'hand_force': ...}。
+    :param frame_arrays: 按帧对齐、只以 .npy 保存的附加数组，例如 {'timestamps': img_ts}。
+    :param decode_threads: 解码线程数。
+    :param sensor_format: 'npy' 每个数组一次性写成可 memory-map 的 .npy 文件，
+                          'txt' 逐行写入兼容旧格式的 .txt 文件，'both' 两者都写。
+    :param passthrough: 为 True 时不解码、不重编码，把原始 JPEG 数据直接封装为 MJPEG 的 video.avi，
+                        只解码第一帧以获取尺寸。
+    :param encoding: 视频编码配置，见 ENCODING_PROFILES。每种配置都会在视频旁写出逐帧索引 video_index.npy。
+    :param gop: 'short-gop' 配置的关键帧间隔（帧）。
+    :param jpeg_quality: 'intra' 配置重新编码 JPEG 时的质量。
+    :return: 写入视频的帧数（第一帧无法解码时为 0）。解码失败的帧不写入视频，.npy/.txt 中也不保留对应的行，
+             逐帧时间戳 timestamps.npy 的长度因此总是等于视频的真实帧数。
     """
     os.makedirs(output_dir, exist_ok=True)
+    timestamps = (frame_arrays or {}).get('timestamps')
+    fps = estimate_fps(timestamps[start_idx:end_idx + 1] if timestamps is not None else None)
+
+    rows = _write_segment_video(output_dir, img_payloads, sensor_data if sensor_format in ('txt', 'both') else {},
+                                start_idx, end_idx, decode_threads, passthrough, encoding, gop, jpeg_quality, fps)
+    if rows is None:
+        return 0
+    num_frames = len(rows)
+    if num_frames == end_idx - start_idx + 1:
+        rows = slice(start_idx, end_idx + 1)
+
+    with _profiler.stage('write'):
+        if sensor_format in ('npy', 'both'):
+            for name, data in sensor_data.items():
+                if data.size > 0:
+                    np.save(os.path.join(output_dir, f'{name}.npy'), np.ascontiguousarray(data[rows]))
+        for name, data in (frame_arrays or {}).items():
+            np.save(os.path.join(output_dir, f'{name}.npy'), np.ascontiguousarray(data[rows]))
+    return num_frames
+
+def open_video_writer(output_dir, encoding, width, height, gop, fps=30):
+    """
+    按编码配置创建视频写入器。
+    :param fps: 写入容器的帧率，由逐帧时间戳测得（见 logic.frame_times.estimate_fps）。
+    :return: (写入器, 视频文件路径)。
+    """
+    if encoding == 'intra':
+        video_path = os.path.join(output_dir, 'video.avi')
+        return MjpegAviWriter(video_path, width, height, fps), video_path
 
     video_path = os.path.join(output_dir, 'video.mp4')
-    arm_txt_path = os.path.join(output_dir, 'arm.txt')
-    hand_txt_path = os.path.join(output_dir, 'hand.txt')
-    hand_force_txt_path = os.path.join(output_dir, 'hand_force.txt')
+    if encoding == 'short-gop':
+        video_writer = FfmpegPipeWriter(video_path, width, height, fps, gop=gop)
+        if video_writer.isOpened():
+            return video_writer, video_path
+        print("Warning: Falling back to mp4v encoding.")
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    return cv2.VideoWriter(video_path, fourcc, fps, (width, height)), video_path
 
-    first_image = decode_image_from_ros_msg(img_data[start_idx])
+def _write_segment_video(output_dir, img_payloads, text_data, start_idx, end_idx, decode_threads, passthrough=False,
+                         encoding='mp4v', gop=10, jpeg_quality=95, fps=30):
+    """
+    写入段的视频、逐帧索引以及（可选的）逐行文本文件。每次调用 VideoWriter 编码一帧时持有一个全局编码器名额，
+    JPEG 解码不占用名额。
+    :param text_data: 需要逐行写成 {name}.txt 的数组字典，为空时只写视频。
+    :param passthrough: 是否把原始 JPEG 数据直接封装为 MJPEG AVI。
+    :return: 写入视频的帧在原始数组中的索引（np.ndarray）；视频写入失败时为 None。
+    """
+    img_iter = iter(img_payloads)
+    first_payload = next(img_iter, None)
+    with _profiler.stage('decode'):
+        first_image = decode_image(first_payload) if first_payload is not None else None
     if first_image is None:
         print(f"Error decoding image for segment. Skipping segment.")
-        return
+        return None
     height, width, _ = first_image.shape
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video_writer = cv2.VideoWriter(video_path, fourcc, 30, (width, height))
+
+    if passthrough and bytes(first_payload[:2]) != b'\xff\xd8':
+        print(f"Warning: Image payload is not JPEG, falling back to re-encoding for {os.path.basename(output_dir)}.")
+        passthrough = False
+
+    if passthrough:
+        encoding = 'intra'
+        frames = itertools.chain([first_payload], img_iter)
+    elif encoding == 'intra':
+        # 第一帧已经解码过，直接编码，不再重复解码
+        frames = itertools.chain([_encode_jpeg(first_image, jpeg_quality)],
+                                 iter_decoded_frames(img_iter, decode_threads, jpeg_quality))
+    else:
+        frames = itertools.chain([first_image], iter_decoded_frames(img_iter, decode_threads))
+    video_writer, video_path = open_video_writer(output_dir, encoding, width, height, gop, fps)
+    encode_start = time.perf_counter()
 
     print(f"  - Generating segment in {os.path.basename(output_dir)} ({end_idx - start_idx + 1} frames)...")
-    with open(arm_txt_path, 'w') as arm_file, \
-         open(hand_txt_path, 'w') as hand_file, \
-         open(hand_force_txt_path, 'w') as hand_force_file:
-        
-        for i in tqdm(range(start_idx, end_idx + 1), desc=f"Segment {os.path.basename(output_dir)}", leave=False):
-            frame = decode_image_from_ros_msg(img_data[i])
-            if frame is not None:
-                video_writer.write(frame)
+    frame_queue = queue.Queue(maxsize=max(1, decode_threads) * 2)
+    writer_errors = []
+    written_rows = []
+    encoder_slot = _encoder_slots or contextlib.nullcontext()
+
+    def write_frames():
+        # 写入线程：按顺序写视频帧和对应的传感器数据行，跳过解码失败的帧。出错后继续取空队列，避免解码端阻塞。
+        with contextlib.ExitStack() as stack:
+            text_files = [(stack.enter_context(open(os.path.join(output_dir, f'{name}.txt'), 'w')), data)
+                          for name, data in text_data.items()]
+            while True:
+                item = frame_queue.get()
+                if item is None:
+                    break
+                if writer_errors:
+                    continue
+                i, frame = item
+                try:
+                    if frame is None:
+                        continue
+                    with encoder_slot, _profiler.stage('encode'):
+                        video_writer.write(frame)
+                    written_rows.append(i)
+
+                    with _profiler.stage('write'):
+                        for text_file, data in text_files:
+                            if data.size > 0:
+                                text_file.write(' '.join(map(str, data[i])) + '\n')
+                except Exception as e:
+                    writer_errors.append(e)
+
+    writer_thread = threading.Thread(target=write_frames, name=f"writer-{os.path.basename(output_dir)}", daemon=True)
+    writer_thread.start()
+    try:
+        for item in tqdm(zip(range(start_idx, end_idx + 1), frames), total=end_idx - start_idx + 1,
+                         desc=f"Segment {os.path.basename(output_dir)}", leave=False):
+            frame_queue.put(item)
+    finally:
+        frame_queue.put(None)
+        writer_thread.join()
+        video_writer.release()
+
+    if writer_errors:
+        raise writer_errors[0]
+
+    encode_time = time.perf_counter() - encode_start
+    _profiler.count('frames', len(written_rows))
+    if len(written_rows) < end_idx - start_idx + 1:
+        print(f"Warning: Dropped {end_idx - start_idx + 1 - len(written_rows)} frame(s) that could not be decoded.")
+    with _profiler.stage('write'):
+        if isinstance(video_writer, MjpegAviWriter):
+            frame_index = video_writer.frame_index
+        else:
+            frame_index = read_mp4_frame_index(video_path)
+        if frame_index is not None:
+            save_frame_index(output_dir, frame_index)
+    if frame_index is not None:
+        num_frames = len(frame_index)
+        print(f"  - Wrote {os.path.basename(video_path)} ({encoding}): {num_frames} frames, "
+              f"{os.path.getsize(video_path) / 1e6:.1f} MB, {num_frames / max(encode_time, 1e-9):.1f} fps, "
+              f"{np.count_nonzero(frame_index['keyframe'])} keyframes")
+    return np.array(written_rows, dtype=np.int64)
+
+def extract_hand_state(msg):
+    """
+    从手部状态消息中提取关节位置和每个手指受力的 x/y/z 分量（按手指顺序展开为一行）。
+    """
+    return (msg.hand_states[0].position,
+            [c for fs in msg.sensor_states[0].finger_sensor_states
+             for c in (fs.calc_force.x, fs.calc_force.y, fs.calc_force.z)])
+
+def read_streams_concurrently(readers):
+    """
+    用线程池并发读取多个 bag。读取主要耗时在 I/O 和解压上，网络存储上各个 bag 的延迟可以互相重叠。
+    打印每个数据流的消息数和耗时；某个数据流读取失败时该流的结果为 None，其余数据流不受影响。
+    :param readers: 字典 {数据流名称: 无参函数}，函数返回第一个元素为时间戳数组的元组。
+    :return: 字典 {数据流名称: 结果}，顺序与 readers 相同。
+    """
+    def timed(name, reader):
+        start = time.perf_counter()
+        try:
+            result = reader()
+        except Exception as e:
+            print(f"Error reading {name} stream: {e}")
+            result = None
+        return result, time.perf_counter() - start
+
+    start = time.perf_counter()
+    results, total = {}, 0.0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(readers))) as executor:
+        futures = {name: executor.submit(timed, name, reader) for name, reader in readers.items()}
+        for name, future in futures.items():
+            results[name], elapsed = future.result()
+            total += elapsed
+            _profiler.add(f'extract:{name}', elapsed)
+            count = len(results[name][0]) if results[name] is not None else 0
+            print(f"  - {name}: {count} messages in {elapsed:.2f}s")
+    print(f"Read {len(readers)} stream(s) in {time.perf_counter() - start:.2f}s (sequential total {total:.2f}s).")
+    return results
+
+def clean_sensor_streams(arm, hand):
+    """
+    清理机械臂和手部状态数据：用掩码一次性丢弃长度与第一条消息不一致的数据，并用一次向量化运算计算每个手指的合力大小。
+    :param arm: 机械臂数据的 extract_columns_from_bag 结果 (timestamps, [joint_status], valid)，读取失败时为 None。
+    :param hand: 手部数据的 extract_columns_from_bag 结果 (timestamps, [position, force_xyz], valid)，读取失败时为 None。
+    :return: 字典，包含 arm_ts、arm、hand_ts、hand_pos、hand_force、hand_force_xyz 六个 Numpy 数组。
+    """
+    arm_ts, arm_data = np.array([]), np.array([])
+    if arm is not None and len(arm[0]) > 0:
+        ts, (data,), valid = arm
+        print(f"Found {np.count_nonzero(valid)} valid arm states out of {len(valid)} total.")
+        arm_ts, arm_data = ts[valid], data[valid]
 
-            if arm_data.size > 0:
-                arm_file.write(' '.join(map(str, arm_data[i])) + '\n')
-            if hand_pos_data.size > 0:
-                hand_file.write(' '.join(map(str, hand_pos_data[i])) + '\n')
-            if hand_force_data.size > 0:
-                hand_force_file.write(' '.join(map(str, hand_force_data[i])) + '\n')
+    hand_ts, hand_pos_data, hand_force_data, hand_force_xyz = np.array([]), np.array([]), np.array([]), np.array([])
+    if hand is not None and len(hand[0]) > 0:
+        ts, (pos, force_xyz), valid = hand
+        print(f"Found {np.count_nonzero(valid)} valid hand states out of {len(valid)} total.")
+        hand_ts, hand_pos_data, hand_force_xyz = ts[valid], pos[valid], force_xyz[valid]
+        hand_force_data = np.linalg.norm(hand_force_xyz.reshape(len(hand_force_xyz), -1, 3), axis=2)
 
-    video_writer.release()
+    return {'arm_ts': arm_ts, 'arm': arm_data, 'hand_ts': hand_ts, 'hand_pos': hand_pos_data,
+            'hand_force': hand_force_data, 'hand_force_xyz': hand_force_xyz}
 
-def process_directory(source_dir, output_base_path, segment_mode):
+def append_frames_to_cache(writer, bag_path, topic):
+    """
+    把图像 bag 中的所有 JPEG 数据顺序写入帧缓存，逐条流式写入，内存占用与录制时长无关。
+    :param writer: logic.frame_cache.FrameArenaWriter 实例。
+    :return: (纳秒时间戳数组, None)。
+    """
+    timestamps = []
+    if not os.path.exists(bag_path):
+        print(f"Warning: Bag file not found at {bag_path}")
+        return np.array([], dtype=np.int64), None
+
+    get_data = raw_field_getter('data')
+    with rosbag.Bag(bag_path, 'r') as bag:
+        for _, raw_msg, t in bag.read_messages(topics=[topic], raw=True):
+            writer.add_frame(t.to_nsec(), get_data(raw_msg))
+            timestamps.append(t.to_nsec())
+    count_bytes_read(bag_path)
+    return np.array(timestamps, dtype=np.int64), None
+
+def extract_image_shard(bag_path, topic, timestamps_ns, start_idx, end_idx, shard_path):
+    """
+    分片提取的工作进程：只读取 [start_idx, end_idx] 区间对应时间窗口内的图像消息，
+    把 JPEG 数据依次写入 shard_path。
+    :return: 每帧 JPEG 数据的字节数 (np.int64 数组)。
+    """
+    sizes = []
+    get_data = raw_field_getter('data')
+    with open(shard_path, 'wb') as f:
+        for raw_msg in iter_messages_in_range(bag_path, topic, timestamps_ns, start_idx, end_idx, raw=True):
+            payload = get_data(raw_msg)
+            f.write(payload)
+            sizes.append(len(payload))
+    if len(sizes) != end_idx - start_idx + 1:
+        raise RuntimeError(f"Shard {start_idx}-{end_idx} of {bag_path} returned {len(sizes)} messages.")
+    return np.array(sizes, dtype=np.int64)
+
+def append_frames_to_cache_sharded(writer, bag_path, topic, shards):
+    """
+    把一个大的图像 bag 按时间窗口切成 shards 段，由多个进程并行提取，再按时间顺序拼接进帧缓存。
+    各段对应消息索引上的半开区间，消息不会重复或遗漏。
+    :param writer: logic.frame_cache.FrameArenaWriter 实例。
+    :return: (纳秒时间戳数组, None)。
+    """
+    timestamps_ns = extract_timestamps_from_bag(bag_path, topic)
+    if len(timestamps_ns) == 0:
+        return timestamps_ns, None
+
+    bounds = np.linspace(0, len(timestamps_ns), shards + 1).astype(np.int64)
+    ranges = [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+    print(f"Extracting {len(timestamps_ns)} images in {len(ranges)} shard(s)...")
+    # 调用方可能运行在读取线程中，使用 spawn 避免在多线程进程中 fork
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(len(ranges), os.cpu_count() or 1), mp_context=context) as executor:
+        futures = [executor.submit(extract_image_shard, bag_path, topic, timestamps_ns, lo, hi - 1, writer.shard_path(i))
+                   for i, (lo, hi) in enumerate(ranges)]
+        for i, ((lo, hi), future) in enumerate(zip(ranges, futures)):
+            writer.append_shard(writer.shard_path(i), timestamps_ns[lo:hi], future.result())
+    count_bytes_read(bag_path)
+    return timestamps_ns, None
+
+def remove_stale_outputs(output_base_path, previous, outputs):
+    """删除此前为该录制写出、本次不再产生的输出目录。"""
+    for name in previous:
+        if name not in outputs:
+            print(f"Removing stale output {name}.")
+            shutil.rmtree(os.path.join(os.path.dirname(output_base_path), name), ignore_errors=True)
+
+def write_empty_manifest(output_base_path, manifest, skipped=()):
+    """
+    记录一个没有产生任何输出的录制（没有图像、没有可处理的段，或所有段的第一帧都无法解码）：
+    删除旧的输出，并在 output_base_path 写入只含清单的目录（outputs 为空），--resume 据此跳过，不再每次重新读取 bag。
+    :param skipped: 因第一帧无法解码而跳过的段。
+    """
+    remove_stale_outputs(output_base_path, previous_outputs(output_base_path), [])
+    temp_dir = temp_output_dir(output_base_path)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    write_manifest(temp_dir, dict(manifest, outputs=[], skipped=list(skipped)))
+    replace_directory(temp_dir, output_base_path)
+
+def process_directory(source_dir, output_base_path, segment_mode, stream_mode=False, decode_threads=4,
+                      segment_workers=None, interp_mode='linear', max_gap=None, sensor_format='npy', passthrough=False,
+                      encoding='mp4v', gop=10, jpeg_quality=95, cache_dir=None, image_shards=1, segment_gap=None,
+                      resume=False):
     """
     处理单个数据目录，生成视频和文本文件。
+    :param stream_mode: 为 True 时先只读取图像时间戳，写入每个段时再从 bag 中流式读取图像，
+                        峰值内存与录制时长无关。
+    :param decode_threads: 每个段写入时使用的解码线程数。
+    :param segment_workers: 同一录制中同时写入的段数，每个段使用自己的 VideoWriter；None 时为 min(段数, CPU 核数)。
+                            所有进程同时编码的帧数由 --max-encoders（init_encoder_slots）另行限制。
+    :param interp_mode: 传感器数据对齐到图像时间戳的方式：'linear'、'nearest' 或 'previous'。
+    :param max_gap: 对齐时允许的最大时间间隔（秒），超出的帧会被统计并给出警告；为 None 时不检查。
+    :param sensor_format: 传感器数据的输出格式，见 save_data_segment。
+    :param passthrough: 为 True 时直接封装原始 JPEG 数据，输出 MJPEG 的 video.avi，见 save_data_segment。
+    :param encoding: 视频编码配置，见 ENCODING_PROFILES。
+    :param gop: 'short-gop' 配置的关键帧间隔（帧）。
+    :param jpeg_quality: 'intra' 配置的 JPEG 质量。
+    :param cache_dir: 帧缓存根目录。指定时，首次处理会把 JPEG 数据和清理后的传感器数据写入
+                      <cache_dir>/<目录名>，之后只要源 bag 的大小和修改时间不变，就直接从缓存读取，不再解析 bag。
+    :param segment_gap: 不为 None 时，在相邻图像时间戳之差超过该值（秒）的位置切分片段；
+                        与 segment_mode 同时使用时只在没有 keyboard.bag 或其中没有有效区间时生效。
+    :param image_shards: 大于 1 时把图像 bag 按时间窗口切分，由多个进程并行提取后拼接进帧缓存；
+                         未指定 cache_dir 时使用输出目录旁的临时缓存，处理完成后删除。
+    :param resume: 为 True 时根据输出目录中的 manifest.json 判断输出是否过期：源 bag 的大小/修改时间、topic、
+                   影响输出的选项和工具版本都未变化时跳过，否则重新生成该录制的所有输出并删除不再产生的旧片段。
+                   为 False 时沿用旧的判断方式：输出目录已存在即跳过。
+    :return: 处理结果，'processed' 或 'skipped'。
     """
+    if image_shards > 1 and not cache_dir:
+        options = dict(locals())
+        output_parent = os.path.dirname(os.path.abspath(output_base_path))
+        os.makedirs(output_parent, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='.frame-cache-', dir=output_parent) as options['cache_dir']:
+            return process_directory(**options)
+
     print(f"Processing directory: {source_dir}")
 
     # --- 1. 定义文件路径和 Topic 名称 ---
@@ -204,93 +665,502 @@ def process_directory(source_dir, output_base_path, segment_mode):
     ARM_TOPIC = 'right_arm_status'
     HAND_TOPIC = '/xhand/right_hand_status'
 
-    # --- 2. 提取数据 ---
-    img_ts, img_data = extract_data_from_bag(color_img_bag, IMG_TOPIC, lambda msg: msg)
+    # 输出清单：源文件、topic 和影响输出内容的选项（不包括线程数、缓存等只影响速度的选项）
+    manifest = build_manifest(
+        source_dir, ['realsence_color_img.bag', 'right_arm_status.bag', 'xhand/right_hand_status.bag', 'keyboard.bag'],
+        {'image': IMG_TOPIC, 'arm': ARM_TOPIC, 'hand': HAND_TOPIC, 'keyboard': 'keyboard_input'},
+        {'segment_mode': segment_mode, 'segment_gap': segment_gap, 'interp_mode': interp_mode, 'max_gap': max_gap,
+         'sensor_format': sensor_format, 'passthrough': passthrough, 'encoding': encoding, 'gop': gop,
+         'jpeg_quality': jpeg_quality})
+    if resume and outputs_up_to_date(output_base_path, manifest):
+        print(f"Outputs for {source_dir} are up to date. Skipping.")
+        return 'skipped'
+
+    # --- 2. 并发提取数据 ---
+    readers = {}
+    sensors, cache_writer = None, None
+    if cache_dir:
+        cache = FrameCache(os.path.join(cache_dir, os.path.basename(os.path.normpath(source_dir))))
+        source_bags = [color_img_bag, arm_status_bag, hand_status_bag]
+        if cache.is_valid(source_bags):
+            print(f"Using frame cache {cache.cache_dir}.")
+            sensors = cache.load_arrays()
+        else:
+            print(f"Building frame cache in {cache.cache_dir}...")
+            cache_writer = cache.writer()
+            if image_shards > 1:
+                readers['image'] = lambda: append_frames_to_cache_sharded(cache_writer, color_img_bag, IMG_TOPIC, image_shards)
+            else:
+                readers['image'] = lambda: append_frames_to_cache(cache_writer, color_img_bag, IMG_TOPIC)
+    elif stream_mode:
+        readers['image'] = lambda: (extract_timestamps_from_bag(color_img_bag, IMG_TOPIC), None)
+    else:
+        readers['image'] = lambda: extract_data_from_bag(color_img_bag, IMG_TOPIC, raw_field_getter('data'), raw=True)
+    if sensors is None:
+        get_joint_status = raw_field_getter('joint_status')
+        readers['arm'] = lambda: extract_columns_from_bag(
+            arm_status_bag, ARM_TOPIC, lambda msg: (get_joint_status(msg),), 1, raw=True)
+        readers['hand'] = lambda: extract_columns_from_bag(hand_status_bag, HAND_TOPIC, extract_hand_state, 2)
+
+    try:
+        streams = read_streams_concurrently(readers) if readers else {}
+
+        # --- 3. 数据清理 ---
+        if sensors is None:
+            with _profiler.stage('clean'):
+                sensors = clean_sensor_streams(streams['arm'], streams['hand'])
+        image = streams.get('image') or (np.array([]), None)
+        if cache_writer is not None:
+            if len(image[0]) > 0:
+                with _profiler.stage('cache_commit'):
+                    for name, array in sensors.items():
+                        cache_writer.save_array(name, array)
+                    cache_writer.commit(source_signature(source_bags))
+            else:
+                cache_writer.abort()
+    except BaseException:
+        if cache_writer is not None:
+            cache_writer.abort()
+        raise
+
+    arena = None
+    if cache_dir:
+        if cache_writer is None or len(image[0]) > 0:
+            arena = cache.open()
+            img_ts = nsec_to_sec(arena.timestamps_ns)
+        else:
+            img_ts = np.array([])
+    elif stream_mode:
+        img_ts_ns = image[0]
+        img_ts = nsec_to_sec(img_ts_ns)
+    else:
+        img_ts, img_data = image
     if len(img_ts) == 0:
         print(f"Critical: No image data found in {source_dir}. Skipping.")
-        return
+        if resume:
+            write_empty_manifest(output_base_path, manifest)
+        return 'skipped'
 
-    arm_ts, arm_data_list = extract_data_from_bag(arm_status_bag, ARM_TOPIC, lambda msg: list(msg.joint_status))
-    hand_ts, hand_data_list = extract_data_from_bag(hand_status_bag, HAND_TOPIC, lambda msg: {
-        'pos': msg.hand_states[0].position,
-        'force': [np.linalg.norm([fs.calc_force.x, fs.calc_force.y, fs.calc_force.z]) for fs in msg.sensor_states[0].finger_sensor_states]
-    })
-    
-    # --- 3. 数据清理 ---
-    if arm_data_list:
-        expected_len = len(arm_data_list[0])
-        combined = [(ts, d) for ts, d in zip(arm_ts, arm_data_list) if len(d) == expected_len]
-        print(f"Found {len(combined)} valid arm states out of {len(arm_data_list)} total.")
-        if combined: arm_ts, arm_data_list = zip(*combined)
-        else: arm_ts, arm_data_list = [], []
-    arm_ts = np.array(arm_ts)
-    arm_data = np.array(arm_data_list, dtype=np.float64) if arm_data_list else np.array([])
-
-    if hand_data_list:
-        expected_len = len(hand_data_list[0]['force'])
-        combined = [(ts, d) for ts, d in zip(hand_ts, hand_data_list) if len(d['force']) == expected_len]
-        print(f"Found {len(combined)} valid hand states out of {len(hand_data_list)} total.")
-        if combined: hand_ts, hand_data_list = zip(*combined)
-        else: hand_ts, hand_data_list = [], []
-    hand_ts = np.array(hand_ts)
-    if hand_data_list:
-        hand_pos_data = np.array([d['pos'] for d in hand_data_list], dtype=np.float64)
-        hand_force_data = np.array([d['force'] for d in hand_data_list], dtype=np.float64)
-    else:
-        hand_pos_data, hand_force_data = np.array([]), np.array([])
+    arm_ts, arm_data = sensors['arm_ts'], sensors['arm']
+    hand_ts, hand_pos_data, hand_force_data = sensors['hand_ts'], sensors['hand_pos'], sensors['hand_force']
+    hand_force_xyz = sensors['hand_force_xyz']
 
     print(f"Found {len(img_ts)} images, {len(arm_ts)} valid arm states, {len(hand_ts)} valid hand states.")
 
     # --- 4. 数据插值 ---
-    print("Interpolating data to image timestamps...")
-    interpolated_arm_data = interpolate_data(img_ts, arm_ts, arm_data)
-    interpolated_hand_pos = interpolate_data(img_ts, hand_ts, hand_pos_data)
-    interpolated_hand_force = interpolate_data(img_ts, hand_ts, hand_force_data)
+    print(f"Aligning data to image timestamps ({interp_mode})...")
+    with _profiler.stage('interpolate'):
+        aligner = TimelineAligner(img_ts, mode=interp_mode, max_gap=max_gap)
+        (interpolated_arm_data,), arm_valid = aligner.align(arm_ts, arm_data)
+        (interpolated_hand_pos, interpolated_hand_force, interpolated_hand_force_xyz), hand_valid = aligner.align(
+            hand_ts, hand_pos_data, hand_force_data, hand_force_xyz)
+    if max_gap is not None:
+        for name, valid in (('arm', arm_valid), ('hand', hand_valid)):
+            if not valid.all():
+                print(f"Warning: {np.count_nonzero(~valid)} of {len(valid)} frames have no {name} sample within {max_gap}s.")
+
+    sensor_data = {'arm': interpolated_arm_data, 'hand': interpolated_hand_pos, 'hand_force': interpolated_hand_force}
+    frame_arrays = {'timestamps': img_ts}
+    if hand_force_xyz.size > 0:
+        frame_arrays['hand_force_xyz'] = interpolated_hand_force_xyz
+    if max_gap is not None:
+        frame_arrays.update({'arm_valid': arm_valid, 'hand_valid': hand_valid})
 
     # --- 5. 定义要处理的段 ---
     segments_to_process = []
-    
+    indices_intervals = None
+
     if segment_mode and os.path.exists(keyboard_bag):
         print("Segment mode enabled. Reading keyboard events...")
-        time_intervals = get_keyboard_intervals(keyboard_bag)
-        
-        if time_intervals:
-            first_segment_path = f"{output_base_path}_0"
-            if os.path.exists(first_segment_path):
-                print(f"Segmented output starting with {first_segment_path} already exists. Skipping.")
-                return
-
-            indices_intervals = map_time_intervals_to_indices(img_ts, time_intervals)
-            for i, (start_idx, end_idx) in enumerate(indices_intervals):
-                segment_path = f"{output_base_path}_{i}"
-                segments_to_process.append({'path': segment_path, 'start': start_idx, 'end': end_idx})
+        with _profiler.stage('extract:keyboard'):
+            time_intervals = get_keyboard_intervals(keyboard_bag)
+
+        if len(time_intervals) > 0:
+            with _profiler.stage('segment'):
+                indices_intervals = intervals_to_indices(img_ts, time_intervals)
         else:
-            print("Warning: No valid start/stop intervals found in keyboard.bag. Saving as a single file.")
+            print("Warning: No valid start/stop intervals found in keyboard.bag."
+                  + (" Saving as a single file." if segment_gap is None else ""))
             segment_mode = False
 
-    if not segment_mode:
-        if os.path.exists(os.path.join(output_base_path, 'video.mp4')):
+    if indices_intervals is None and segment_gap is not None:
+        print(f"Splitting at image gaps longer than {segment_gap}s...")
+        with _profiler.stage('segment'):
+            indices_intervals = split_by_gap(img_ts, segment_gap)
+
+    if indices_intervals is not None:
+        first_segment_path = f"{output_base_path}_0"
+        if not resume and os.path.exists(first_segment_path):
+            print(f"Segmented output starting with {first_segment_path} already exists. Skipping.")
+            return 'skipped'
+        for i, (start_idx, end_idx) in enumerate(indices_intervals.tolist()):
+            segment_path = f"{output_base_path}_{i}"
+            segments_to_process.append({'path': segment_path, 'start': start_idx, 'end': end_idx})
+    elif not segment_mode:
+        if not resume and find_video_file(output_base_path):
              print(f"Output files already exist in {output_base_path}. Skipping.")
-             return
+             return 'skipped'
         segments_to_process.append({'path': output_base_path, 'start': 0, 'end': len(img_ts) - 1})
 
     if not segments_to_process:
         print("No data segments to process. Exiting.")
-        return
+        if resume:
+            write_empty_manifest(output_base_path, manifest)
+        return 'skipped'
 
-    # --- 6. 循环处理所有定义的段 ---
+    # --- 6. 并发处理所有定义的段 ---
     print(f"Found {len(segments_to_process)} segment(s) to process for {source_dir}.")
-    for segment in segments_to_process:
-        save_data_segment(
-            output_dir=segment['path'],
-            img_data=img_data,
-            arm_data=interpolated_arm_data,
-            hand_pos_data=interpolated_hand_pos,
-            hand_force_data=interpolated_hand_force,
+    previous = previous_outputs(output_base_path) if resume else []
+    remove_stale_temp_dirs(output_base_path)
+
+    def write_segment(segment):
+        if arena is not None:
+            img_payloads = arena.iter_frames(segment['start'], segment['end'])
+            _profiler.count('cache_bytes_read', int(arena.index['size'][segment['start']:segment['end'] + 1].sum()))
+        elif stream_mode:
+            get_data = raw_field_getter('data')
+
+            def read_payload(raw_msg):
+                payload = get_data(raw_msg)
+                _profiler.count('bag_bytes_read', len(raw_msg[1]))
+                return payload
+
+            img_payloads = map(read_payload, iter_messages_in_range(
+                color_img_bag, IMG_TOPIC, img_ts_ns, segment['start'], segment['end'], raw=True))
+        else:
+            img_payloads = img_data[segment['start']:segment['end'] + 1]
+        # 先写入临时目录，所有段完成后再整体重命名，中断时不会留下写了一半的输出
+        temp_dir = temp_output_dir(segment['path'])
+        written = save_data_segment(
+            output_dir=temp_dir,
+            img_payloads=img_payloads,
+            sensor_data=sensor_data,
             start_idx=segment['start'],
-            end_idx=segment['end']
+            end_idx=segment['end'],
+            frame_arrays=frame_arrays,
+            decode_threads=decode_threads,
+            sensor_format=sensor_format,
+            passthrough=passthrough,
+            encoding=encoding,
+            gop=gop,
+            jpeg_quality=jpeg_quality
         )
+        if not written:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return written
+
+    if segment_workers is None:
+        segment_workers = min(len(segments_to_process), os.cpu_count() or 1)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, segment_workers)) as executor:
+        futures = [executor.submit(write_segment, segment) for segment in segments_to_process]
+        written = [future.result() for future in futures]
+
+    # 清单只列出实际写出的段；第一帧无法解码而跳过的段记录在 skipped 中，--resume 视其为已完成
+    outputs = [os.path.basename(segment['path']) for segment, n in zip(segments_to_process, written) if n]
+    skipped = [os.path.basename(segment['path']) for segment, n in zip(segments_to_process, written) if not n]
+    for segment, num_frames in zip(segments_to_process, written):
+        if not num_frames:
+            continue
+        temp_dir = temp_output_dir(segment['path'])
+        # 记录真实帧数和由时间戳测得的帧率，读取方不必依赖容器元数据
+        fps = estimate_fps(img_ts[segment['start']:segment['end'] + 1])
+        with _profiler.stage('write'):
+            write_manifest(temp_dir, dict(manifest, outputs=outputs, skipped=skipped,
+                                          segment={'start': segment['start'], 'end': segment['end'],
+                                                   'num_frames': num_frames, 'fps': fps}))
+            replace_directory(temp_dir, segment['path'])
+        _profiler.count('segments')
+    if not outputs and resume:
+        write_empty_manifest(output_base_path, manifest, skipped)
+    else:
+        remove_stale_outputs(output_base_path, previous, outputs)
     print(f"Finished processing for {source_dir}.")
+    return 'processed'
+
+class _TaggedWriter:
+    """
+    给每一行输出加上目录标签的 stdout 包装器，避免多进程日志交错后无法区分来源。
+    """
+    def __init__(self, stream, tag):
+        self.stream = stream
+        self.tag = tag
+        self._at_line_start = True
+
+    def write(self, text):
+        for piece in text.splitlines(keepends=True):
+            if self._at_line_start:
+                self.stream.write(self.tag)
+            self.stream.write(piece)
+            self._at_line_start = piece.endswith('\n')
+            if self._at_line_start:
+                self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def run_directory_job(source_path, output_base_path, tag_logs=False, profile=False, **options):
+    """
+    处理单个目录并捕获所有异常，使一个目录的失败不会影响其他目录。
+    可以直接调用，也可以作为进程池的任务提交。
+    :param tag_logs: 为 True 时给该目录的每行日志加上 "[目录名] " 前缀。
+    :param profile: 为 True 时记录各阶段耗时、读取字节数、帧率和峰值内存，结果放在返回值的 profile 字段中。
+    :param options: 透传给 process_directory 的参数。
+    :return: 包含 name、status（'processed' / 'skipped' / 'failed'）、elapsed、error 和 profile 的字典。
+    """
+    global _profiler
+    name = os.path.basename(source_path)
+    start = time.perf_counter()
+    error = None
+    _profiler = StageProfiler() if profile else NULL_PROFILER
+    stdout = _TaggedWriter(sys.stdout, f"[{name}] ") if tag_logs else sys.stdout
+    with contextlib.redirect_stdout(stdout):
+        try:
+            status = process_directory(source_path, output_base_path, **options) or 'processed'
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+            print(f"Error: Failed to process {source_path}: {e}")
+            status, error = 'failed', str(e)
+        finally:
+            report = _profiler.report() if profile else None
+            _profiler = NULL_PROFILER
+    return {'name': name, 'status': status, 'elapsed': time.perf_counter() - start, 'error': error, 'profile': report}
+
+def print_summary(results, wall_time):
+    """
+    打印所有目录的处理汇总：成功、跳过、失败的目录以及总耗时。
+    """
+    print("\n===== Summary =====")
+    for status in ('processed', 'skipped', 'failed'):
+        group = [r for r in results if r['status'] == status]
+        print(f"{status.capitalize()}: {len(group)}")
+        for r in group:
+            detail = f" ({r['error']})" if r['error'] else ""
+            print(f"  - {r['name']}: {r['elapsed']:.1f}s{detail}")
+    print(f"Total wall time: {wall_time:.1f}s")
+
+def lease_token(source_path, options, signature=None):
+    """
+    租约完成标记的 token：源目录签名（文件数、总大小、最新修改时间）、工具版本和处理选项都相同时视为已处理。
+    """
+    return {'tool_version': TOOL_VERSION, 'signature': signature or directory_signature(source_path), 'options': options}
+
+def _crashed_result(name, error):
+    # 工作进程本身崩溃（例如被 OOM kill）时，run_directory_job 无法捕获异常
+    print(f"Error: Worker for {name} crashed: {error}")
+    return {'name': name, 'status': 'failed', 'elapsed': 0.0, 'error': str(error), 'profile': None}
+
+def _claim_recording(leases, name, token):
+    """
+    认领一个尚未完成的录制。录制已由某个节点以相同的 token 处理完，或正被其他节点持有时返回 False。
+    """
+    if leases.is_done(name, token) or not leases.try_acquire(name):
+        return False
+    if leases.is_done(name, token):
+        # 其他节点在检查与认领之间刚好处理完成并释放了租约
+        leases.release(name)
+        return False
+    return True
+
+def _finish_leased_job(leases, future, name, token):
+    """收集一个持有租约的任务的结果并释放租约，成功或跳过时写入完成标记。"""
+    try:
+        result = future.result()
+    except Exception as e:
+        result = _crashed_result(name, e)
+    if name in leases.lost:
+        print(f"Warning: Lease for {name} expired while it was being processed; another node may have processed it too.")
+    leases.release(name, token if result['status'] != 'failed' else None)
+    return result
+
+def run_leased_directories(jobs, leases, options, workers=1, encoder_slots=None, profile=False):
+    """
+    多节点模式：只处理本节点认领到租约的录制（见 logic.leases.LeaseManager）。
+    在途任务数不超过 workers，认领在提交时才进行，其余录制留给其他节点。
+    被其他节点持有的录制会每隔 ttl / 4 秒重试，直到出现完成标记，或其租约释放/过期后由本节点认领。
+    :param jobs: (录制目录, 输出目录) 列表。
+    :param leases: 已启动心跳的 LeaseManager。
+    :return: 本节点处理的每个目录的 run_directory_job 结果。
+    """
+    todo = collections.deque(jobs)
+    deferred, pending, results = [], {}, []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, workers), initializer=init_encoder_slots,
+                                                initargs=(encoder_slots,)) as executor:
+        while todo or deferred or pending:
+            if not todo and not pending:
+                time.sleep(leases.ttl / 4)
+                todo.extend(deferred)
+                deferred = []
+            while todo and len(pending) < max(1, workers):
+                source_path, output_base_path = todo.popleft()
+                name = os.path.basename(source_path)
+                token = lease_token(source_path, options)
+                if not _claim_recording(leases, name, token):
+                    if not leases.is_done(name, token):
+                        deferred.append((source_path, output_base_path))
+                    continue
+                print(f"Claimed {name}.", flush=True)
+                future = executor.submit(run_directory_job, source_path, output_base_path, tag_logs=True,
+                                         profile=profile, **options)
+                pending[future] = (name, token)
+            if pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name, token = pending.pop(future)
+                    results.append(_finish_leased_job(leases, future, name, token))
+    return results
+
+def run_all_directories(bag_base_dir, output_base_dir, options, workers=1, encoder_slots=None, profile=False,
+                        leases=None):
+    """
+    处理 bag_dir 下当前已有的所有录制目录，workers 大于 1 时使用进程池并行处理。
+    :param options: 透传给 process_directory 的参数。
+    :param encoder_slots: 所有工作进程共享的编码器名额。
+    :param profile: 是否记录性能数据，见 run_directory_job。
+    :param leases: 不为 None 时与其他节点通过租约分配录制，见 run_leased_directories。
+    :return: 每个目录的 run_directory_job 结果。
+    """
+    jobs = []
+    for dir_name in sorted(os.listdir(bag_base_dir)):
+        source_path = os.path.join(bag_base_dir, dir_name)
+        if os.path.isdir(source_path):
+            jobs.append((source_path, os.path.join(output_base_dir, dir_name)))
+    if leases is not None:
+        return run_leased_directories(jobs, leases, options, workers, encoder_slots, profile)
+
+    results = []
+    if workers > 1:
+        print(f"Processing {len(jobs)} directories with {workers} workers...")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_encoder_slots,
+                                                    initargs=(encoder_slots,)) as executor:
+            futures = {
+                executor.submit(run_directory_job, source_path, output_base_path, tag_logs=True,
+                                profile=profile, **options): source_path
+                for source_path, output_base_path in jobs
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(_crashed_result(os.path.basename(futures[future]), e))
+    else:
+        for source_path, output_base_path in jobs:
+            results.append(run_directory_job(source_path, output_base_path, profile=profile, **options))
+    return results
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def watch_directories(bag_base_dir, output_base_dir, options, workers=1, encoder_slots=None, poll_interval=10.0,
+                      settle_time=30.0, profile=False, leases=None):
+    """
+    守护模式：持续轮询 bag_dir，把拷贝完成的新录制交给进程池处理，直到收到 Ctrl-C 或 SIGTERM。
+    录制目录的文件数、总大小和最新修改时间连续 settle_time 秒不变（且没有 *.active 文件）时视为拷贝完成，
+    见 logic.watcher.RecordingWatcher。在途任务最多为 workers * 2 个（使用租约时为 workers 个），超出的录制留到之后的轮询再提交。
+    已处理过的录制在重新拷贝（签名变化）后会再次提交，是否重新生成输出由 process_directory 的跳过规则（或 --resume）决定；
+    处理失败的录制在之后的轮询中重试。
+    :param options: 透传给 process_directory 的参数。
+    :param encoder_slots: 所有工作进程共享的编码器名额。
+    :param poll_interval: 轮询间隔（秒）。
+    :param settle_time: 判断拷贝完成所需的稳定时间（秒）。
+    :param profile: 是否记录性能数据，见 run_directory_job。
+    :param leases: 不为 None 时只处理本节点认领到租约的录制，在途任务数不超过 workers（排队的任务不占用租约）；
+                   被其他节点持有的录制在之后的轮询中重试。
+    :return: 所有已完成任务的 run_directory_job 结果。
+    """
+    watcher = RecordingWatcher(bag_base_dir, settle_time)
+    max_pending = max(1, workers) * (1 if leases is not None else 2)
+    pending, results = {}, []
+    previous_handler = signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    print(f"Watching {bag_base_dir} for new recordings (poll every {poll_interval:g}s, settle {settle_time:g}s, "
+          f"{workers} worker(s)). Press Ctrl-C to stop.", flush=True)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=max(1, workers), initializer=init_encoder_slots,
+                                                      initargs=(encoder_slots,))
+    try:
+        while True:
+            for path, signature in watcher.poll():
+                if len(pending) >= max_pending:
+                    break  # 背压：其余录制留到下一次轮询
+                name = os.path.basename(path)
+                token = None
+                if leases is not None:
+                    token = lease_token(path, options, signature)
+                    if not _claim_recording(leases, name, token):
+                        if leases.is_done(name, token):
+                            watcher.claim(path, signature)
+                        continue  # 其他节点正在处理时，之后的轮询再确认
+                watcher.claim(path, signature)
+                future = executor.submit(run_directory_job, path, os.path.join(output_base_dir, name), tag_logs=True,
+                                         profile=profile, **options)
+                pending[future] = (path, signature, token)
+                print(f"Queued {name} ({len(pending)} in flight).", flush=True)
+
+            if not pending:
+                time.sleep(poll_interval)
+                continue
+            done, _ = concurrent.futures.wait(pending, timeout=poll_interval,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                result = _finish_watched_job(watcher, leases, future, *pending.pop(future))
+                print(f"{result['name']}: {result['status']} in {result['elapsed']:.1f}s.", flush=True)
+                results.append(result)
+    except KeyboardInterrupt:
+        print(f"\nStopping watch mode; waiting for {len(pending)} queued or running job(s) to finish...")
+        for future in pending:
+            future.cancel()
+    finally:
+        executor.shutdown(wait=True)
+        signal.signal(signal.SIGTERM, previous_handler)
+
+    for future, (path, signature, token) in pending.items():
+        if future.cancelled():
+            if leases is not None:
+                leases.release(os.path.basename(path))
+        else:
+            results.append(_finish_watched_job(watcher, leases, future, path, signature, token))
+    return results
+
+def _finish_watched_job(watcher, leases, future, path, signature, token):
+    """收集一个守护模式任务的结果；处理失败时撤销 watcher 的认领，之后的轮询会重试该录制。"""
+    name = os.path.basename(path)
+    if leases is not None:
+        result = _finish_leased_job(leases, future, name, token)
+    else:
+        try:
+            result = future.result()
+        except Exception as e:
+            result = _crashed_result(name, e)
+    if result['status'] == 'failed':
+        watcher.unclaim(path, signature)
+    return result
+
+def write_profile(path, results, wall_time, options):
+    """
+    把每个目录的性能数据和汇总追加写入 JSON Lines 文件，并打印各阶段的汇总耗时。
+    每行一条记录：type 为 'directory' 的记录对应一个目录，最后一条 type 为 'summary' 的记录是本次运行的汇总。
+    :param results: run_directory_job 的返回值列表。
+    :param wall_time: 本次运行的墙钟时间（秒）。
+    :param options: 本次运行的处理选项，随每条记录保存，便于比较不同配置。
+    """
+    run = {'run_started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(time.time() - wall_time)),
+           'tool_version': TOOL_VERSION, 'options': options}
+    reports = [r for r in results if r.get('profile') is not None]
+    records = [dict(run, type='directory', name=r['name'], status=r['status'], **r['profile']) for r in reports]
+    summary = merge_reports([r['profile'] for r in reports], wall_time)
+    records.append(dict(run, type='summary', directories=len(reports), **summary))
+    append_jsonl(path, records)
+
+    print("\n===== Profile =====")
+    for stage, stats in summary['stages'].items():
+        print(f"  {stage:<18} {stats['seconds']:>9.2f}s  ({stats['calls']} calls)")
+    bag_bytes = summary['counters'].get('bag_bytes_read', 0)
+    print(f"Read {bag_bytes / 1e6:.1f} MB from bags ({bag_bytes / 1e6 / max(wall_time, 1e-9):.1f} MB/s), "
+          f"{summary['counters'].get('frames', 0)} frames ({summary['fps']:.1f} fps)")
+    if summary['peak_rss_mb'] is not None:
+        print(f"Peak RSS per directory: {summary['peak_rss_mb']:.0f} MB "
+              f"(process lifetime {summary['process_peak_rss_mb'] or 0:.0f} MB, "
+              f"children {summary['process_peak_rss_children_mb'] or 0:.0f} MB)")
+    print(f"Profile appended to {path}")
 
 
 def main():
@@ -298,6 +1168,28 @@ def main():
     parser.add_argument('--bag_dir', type=str, default='../bagdata', help='Path to the root directory containing bag subfolders.')
     parser.add_argument('--output_dir', type=str, default='../video', help='Path to the root directory for output files.')
     parser.add_argument('--segment', action='store_true', help='Enable segmenting based on keyboard.bag events.')
+    parser.add_argument('--segment-by-gap', type=float, default=None, metavar='SECONDS', help='Split recordings at image timestamp gaps longer than SECONDS (used when no keyboard.bag intervals are available).')
+    parser.add_argument('--stream', action='store_true', help='Read image timestamps first and stream image messages segment by segment to keep memory usage flat.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of bag directories to process in parallel (process pool).')
+    parser.add_argument('--decode-threads', type=int, default=4, help='Number of threads decoding JPEG frames for each segment.')
+    parser.add_argument('--segment-workers', type=int, default=None, help='Number of segments of one recording written concurrently, each with its own VideoWriter. Defaults to min(number of segments, CPU count).')
+    parser.add_argument('--max-encoders', type=int, default=None, help='Maximum number of frames encoded concurrently by VideoWriters, shared by all workers and segments. Unlimited by default.')
+    parser.add_argument('--interp', type=str, default='linear', choices=TimelineAligner.MODES, help='How sensor streams are aligned to image timestamps.')
+    parser.add_argument('--max-gap', type=float, default=None, help='Flag frames whose nearest sensor sample is further away than this many seconds.')
+    parser.add_argument('--passthrough', action='store_true', help='Mux the original JPEG payloads into an MJPEG video.avi without decoding or re-encoding.')
+    parser.add_argument('--encoding', type=str, default='mp4v', choices=ENCODING_PROFILES, help='Video encoding profile: mp4v (long GOP), short-gop (ffmpeg, fixed keyframe interval) or intra (MJPEG, every frame a keyframe).')
+    parser.add_argument('--gop', type=int, default=10, help='Keyframe interval for the short-gop encoding profile.')
+    parser.add_argument('--jpeg-quality', type=int, default=95, help='JPEG quality for the intra encoding profile.')
+    parser.add_argument('--sensor-format', type=str, default='npy', choices=('npy', 'txt', 'both'), help='Write sensor data as memory-mappable .npy files, legacy .txt files, or both.')
+    parser.add_argument('--resume', action='store_true', help='Redo only outputs whose source bags, options or tool version changed (based on manifest.json).')
+    parser.add_argument('--image-shards', type=int, default=1, help='Split the image bag into N time windows and extract them in parallel processes.')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Cache extracted JPEG frames and sensor arrays here so re-runs skip bag parsing.')
+    parser.add_argument('--watch', action='store_true', help='Keep running and process new recordings as soon as they have finished copying into --bag_dir.')
+    parser.add_argument('--poll-interval', type=float, default=10.0, help='Seconds between scans of --bag_dir in watch mode.')
+    parser.add_argument('--settle-time', type=float, default=30.0, help='Seconds a recording directory must stay unchanged (size and mtime) before it is processed in watch mode.')
+    parser.add_argument('--lease-dir', type=str, default=None, help='Shared directory (e.g. on NFS) for lease files; lets several processing nodes split the recordings so each is processed by exactly one node.')
+    parser.add_argument('--lease-ttl', type=float, default=120.0, help='Seconds without a heartbeat after which a lease is considered abandoned and reclaimed.')
+    parser.add_argument('--profile', type=str, nargs='?', const='profile.jsonl', default=None, metavar='JSONL', help='Time each processing stage and append per-directory and summary records to JSONL (default: profile.jsonl).')
     args = parser.parse_args()
 
     bag_base_dir = os.path.abspath(args.bag_dir)
@@ -307,11 +1199,36 @@ def main():
         print(f"Error: Bag data directory not found at {bag_base_dir}")
         sys.exit(1)
 
-    for dir_name in sorted(os.listdir(bag_base_dir)):
-        source_path = os.path.join(bag_base_dir, dir_name)
-        if os.path.isdir(source_path):
-            output_base_path = os.path.join(output_base_dir, dir_name)
-            process_directory(source_path, output_base_path, args.segment)
+    options = {'segment_mode': args.segment, 'stream_mode': args.stream, 'decode_threads': args.decode_threads,
+               'segment_workers': args.segment_workers, 'interp_mode': args.interp, 'max_gap': args.max_gap,
+               'sensor_format': args.sensor_format, 'passthrough': args.passthrough, 'encoding': args.encoding,
+               'gop': args.gop, 'jpeg_quality': args.jpeg_quality,
+               'cache_dir': os.path.abspath(args.cache_dir) if args.cache_dir else None,
+               'image_shards': args.image_shards, 'segment_gap': args.segment_by_gap, 'resume': args.resume}
+    encoder_slots = None
+    if args.max_encoders is not None:
+        encoder_slots = multiprocessing.BoundedSemaphore(max(1, args.max_encoders))
+        init_encoder_slots(encoder_slots)
+    wall_start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        leases = None
+        if args.lease_dir:
+            leases = stack.enter_context(LeaseManager(os.path.abspath(args.lease_dir), args.lease_ttl))
+            print(f"Using leases in {leases.lease_dir} as {leases.owner}.")
+        if args.watch:
+            results = watch_directories(bag_base_dir, output_base_dir, options, args.workers, encoder_slots,
+                                        args.poll_interval, args.settle_time, profile=bool(args.profile), leases=leases)
+        else:
+            results = run_all_directories(bag_base_dir, output_base_dir, options, args.workers, encoder_slots,
+                                          profile=bool(args.profile), leases=leases)
+
+    results.sort(key=lambda r: r['name'])
+    wall_time = time.perf_counter() - wall_start
+    print_summary(results, wall_time)
+    if args.profile:
+        write_profile(args.profile, results, wall_time, dict(options, workers=args.workers))
+    if any(r['status'] == 'failed' for r in results):
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
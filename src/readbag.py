@@ -1,3 +1,7 @@
+import os
+import argparse
+import collections
+import concurrent.futures
 try:
     import rosbag
 except ImportError:
@@ -5,6 +9,8 @@ except ImportError:
 import numpy as np
 import cv2
 import matplotlib.pyplot as plt
+from logic.alignment import TimelineAligner
+from logic.segments import keyboard_intervals, split_by_gap
 try:
     from moviepy import ImageSequenceClip
 except:
@@ -81,215 +87,204 @@ def read_bag_file(bag_file):
             break
 
 
-def find_closest_timestamps(group1, group2):
-    result = []
-    i, j = 0, 0  # i 指向 group1，j 指向 group2
-    
-    while i < len(group1):
-        # 移动 j 指针，找到 group2 中大于等于 group1[i] 的位置
-        while j < len(group2) - 1 and group2[j + 1][0] < group1[i][0]:
-            j += 1
-        
-        # 选择 group2[j] 和 group2[j+1] 中最接近 group1[i] 的时间戳
-        if j + 1 < len(group2) and abs(group2[j + 1][0] - group1[i][0]) < abs(group2[j][0] - group1[i][0]):
-            result.append(group2[j + 1])
-        else:
-            result.append(group2[j])
-        
-        i += 1
-    
-    return result
-
-
-def get_image_arm_handstate(source_path):
+def get_image_arm_handstate(source_path, max_skew=None):
+    """
+    读取一个录制目录中的图像、机械臂和手部状态，并把机械臂和手部状态按最近时间戳对齐到每帧图像。
+
+    时间戳使用消息头中的 stamp。对齐使用 logic.alignment.TimelineAligner 的 'nearest' 模式，
+    只返回每帧对应的机械臂/手部消息下标，不复制消息数据。
+
+    参数：
+      - source_path: 录制目录。
+      - max_skew: 允许的最大时间差（秒），超出的帧在 valid 中标记为 False；为 None 时不检查。
+    返回：字典，包含
+      - img_ts: 图像时间戳 (np.float64 数组，秒)；images: 每帧的压缩图像数据列表。
+      - arm: 机械臂 joint_status 列表；hand: 手部关节位置列表；hand_force: 每条手部消息 5 个手指的 calc_force 列表。
+      - arm_index / hand_index: 每帧图像对应的 arm / hand 下标 (np.int64 数组)。
+      - valid: 每帧的机械臂和手部时间差是否都在 max_skew 以内。
+    """
     rgb_path = f'{source_path}/realsence_color_img.bag'
     right_hand_path = f'{source_path}/xhand/right_hand_status.bag'
     right_arm_path = f'{source_path}/right_arm_status.bag'
-    rgb_list, right_hand_list, right_arm_list = [], [], []
+    rgb_ts, images = [], []
+    hand_ts, hand_pos, hand_force = [], [], []
+    arm_ts, arm = [], []
     with rosbag.Bag(rgb_path, 'r') as bag:
-        for idx, (topic, msg, _) in enumerate(bag.read_messages()):
-            rgb_list.append((msg.header.stamp, msg.data))
+        for topic, msg, _ in bag.read_messages():
+            rgb_ts.append(msg.header.stamp.to_sec())
+            images.append(msg.data)
     with rosbag.Bag(right_hand_path, 'r') as bag:
-        for idx, (topic, msg, _) in enumerate(bag.read_messages()):
-            cur_force = []
-            cur_force.append(msg.sensor_states[0].finger_sensor_states[0].calc_force)
-            cur_force.append(msg.sensor_states[0].finger_sensor_states[1].calc_force)
-            cur_force.append(msg.sensor_states[0].finger_sensor_states[2].calc_force)
-            cur_force.append(msg.sensor_states[0].finger_sensor_states[3].calc_force)
-            cur_force.append(msg.sensor_states[0].finger_sensor_states[4].calc_force)
-            right_hand_list.append((msg.header.stamp, msg.hand_states[0].position, cur_force))
+        for topic, msg, _ in bag.read_messages():
+            hand_ts.append(msg.header.stamp.to_sec())
+            hand_pos.append(msg.hand_states[0].position)
+            hand_force.append([fs.calc_force for fs in msg.sensor_states[0].finger_sensor_states[:5]])
     with rosbag.Bag(right_arm_path, 'r') as bag:
-        for idx, (topic, msg, _) in enumerate(bag.read_messages()):
-            right_arm_list.append((msg.header.stamp, msg.joint_status))
-    
-    aligned_arm_list = find_closest_timestamps(rgb_list, right_arm_list)
-    aligned_hand_list = find_closest_timestamps(rgb_list, right_hand_list)
+        for topic, msg, _ in bag.read_messages():
+            arm_ts.append(msg.header.stamp.to_sec())
+            arm.append(msg.joint_status)
 
-    ret_list = []
-    print_stamp = []
-    for i in range(len(rgb_list)):
-        ret_list.append((rgb_list[i], aligned_arm_list[i], aligned_hand_list[i]))
-        print_stamp.append((rgb_list[i][0].to_sec(), aligned_arm_list[i][0].to_sec(), aligned_hand_list[i][0].to_sec()))
+    rgb_ts = np.array(rgb_ts, dtype=np.float64)
+    aligner = TimelineAligner(rgb_ts, mode='nearest', max_gap=max_skew)
+    plans = {}
+    for name, ts in (('arm', arm_ts), ('hand', hand_ts)):
+        ts = np.array(ts, dtype=np.float64)
+        if ts.size == 0:
+            raise ValueError(f"No {name} messages found in {source_path}")
+        plans[name] = aligner.plan(ts)
+        skew = np.abs(ts[plans[name].lo] - rgb_ts)
+        print(f"{name}: {ts.size} messages, max skew {skew.max(initial=0.0):.4f}s, mean skew {skew.mean() if skew.size else 0.0:.4f}s")
 
-    for item in print_stamp:
-        print(item)
-    return ret_list
+    valid = plans['arm'].valid & plans['hand'].valid
+    if max_skew is not None and not valid.all():
+        print(f"Warning: {np.count_nonzero(~valid)} of {valid.size} frames exceed max skew {max_skew}s")
+    return {'img_ts': rgb_ts, 'images': images, 'arm': arm, 'hand': hand_pos, 'hand_force': hand_force,
+            'arm_index': plans['arm'].lo, 'hand_index': plans['hand'].lo, 'valid': valid}
 
 
 
 def process_events(events):
     """
-    输入 events：列表，元素形如 (t, data)，其中 t 为数字（时间），data 为 'start'、'stop' 或 'stopanddelete'，
-                    并且 events 已按照 t 从小到大排列。
+    输入 events：列表，元素形如 (t, data)，其中 t 为数字（时间），data 为 'start'、'stop' 或 'stop_and_delete'。
     输出：列表，元素形如 (t1, t2)，t1 来自 'start' 消息，t2 来自与当前 start 最近的 stop 消息。
-    
-    逻辑：
-      - 扫描列表，当遇到一个 'start' 消息时，收集从该消息之后到下一个 'start' 之间的所有消息。
-      - 如果该区间内没有消息，或包含 'stopanddelete' 消息，则跳过该 start。
-      - 如果该区间内只有 'stop' 消息，则选择第一个 stop 消息（即离 start 最近的）并生成 (t_start, t_stop)。
+
+    逻辑见 logic.segments.keyboard_intervals：
+      - 每个 'start' 与下一个 'start' 之间的消息构成一组。
+      - 如果该组内没有 stop 消息，或包含 'stop_and_delete' 消息，则跳过该 start。
+      - 否则选择第一个 stop 消息（即离 start 最近的）并生成 (t_start, t_stop)。
     """
-    results = []
-    n = len(events)
-    i = 0
-
-    while i < n:
-        t, data = events[i]
-        if data == "start":
-            start_time = t
-            # 收集从当前 start 后到下一个 start 之间的消息
-            j = i + 1
-            group = []
-            while j < n and events[j][1] != 'start':
-                group.append(events[j])
-                j += 1
-
-            # 如果没有消息或有 'stopanddelete' 消息，则跳过
-            if not group or any(item[1] == "stop_and_delete" for item in group):
-                i = j
-                continue
-
-            # 仅当所有消息都是 stop 时，则选择离当前 start 最近的 stop 消息(即第一个 stop)
-            stops = [item for item in group if item[1] == 'stop']
-            if stops:
-                results.append((start_time, stops[0][0]))
-            # 跳至下一个 start
-            i = j
-        else:
-            i += 1
-
-    return results
+    if not events:
+        return []
+    times, data = zip(*events)
+    return [tuple(interval) for interval in keyboard_intervals(times, data).tolist()]
 
 def extract_indices_from_intervals(timepoints, intervals):
     """
     输入：
-      - timepoints: 排好序的时间点列表，例如 [1, 3, 5, 7, 9, 11, 13]
+      - timepoints: 排好序的时间点数组，例如 [1, 3, 5, 7, 9, 11, 13]
       - intervals: 排好序的不重叠区间列表，例如 [(2, 8), (10, 14)]
     输出：
       - 列表：对于每个区间，返回一个二元组 (start_index, end_index)，表示该区间内在 timepoints 的下标范围；
-              如果区间内没有时间点，则返回 None。
+              如果区间内没有时间点，则抛出 ValueError。
     """
-    results = []
-    timepoints = [img[0].to_sec() for (img, _, _) in timepoints]
-    n = len(timepoints)
-    j = 0  # timepoints 的位置指针
-
-    for s, t in intervals:
-        # 跳过所有在区间起点 s 之前的时间点
-        while j < n and timepoints[j] < s:
-            j += 1
-        # 如果当前位置在区间内，则记录下标
-        if j < n and timepoints[j] <= t:
-            start_index = j
-            # 将指针移动到超出 t 的位置
-            while j < n and timepoints[j] <= t:
-                j += 1
-            end_index = j - 1
-            results.append((start_index, end_index))
-        else:
-            # 当前区间内没有时间点
+    timepoints = np.asarray(timepoints, dtype=np.float64)
+    intervals = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+    starts = np.searchsorted(timepoints, intervals[:, 0], side='left')
+    ends = np.searchsorted(timepoints, intervals[:, 1], side='right') - 1
+    for (s, t), start_index, end_index in zip(intervals.tolist(), starts, ends):
+        if start_index > end_index:
             raise ValueError(f"区间 {s} - {t} 内没有时间点")
+    return list(zip(starts.tolist(), ends.tolist()))
 
-    return results
-
-def clip_by_time(data_list, threshold=4/30):
+def clip_by_time(time_list, threshold=4/30):
     """
-    将排好序的1维时间列表按照相邻元素时间差分割成若干段，
-    当两个相邻时间点的差值大于 threshold（默认1/30秒）时，
-    则认为存在断裂，当前点为新段起始时间。
-    
-    返回：一个列表，包含各段起始时间
+    将排好序的1维时间数组按照相邻元素时间差分割成若干段，
+    当两个相邻时间点的差值大于 threshold（默认4/30秒）时，
+    则认为存在断裂，当前点为新段起始时间（见 logic.segments.split_by_gap）。
+
+    返回：一个列表，包含各段的 (起始下标, 结束下标)
     """
-    time_list = [img[0].to_sec() for (img, _, _) in data_list]
-    if not time_list:
-        return []
-    
-    segments = []
-    start_index = 0
+    return [tuple(segment) for segment in split_by_gap(time_list, threshold).tolist()]
 
-    for i in range(1, len(time_list)):
-        # 如果当前时间点与前一个时间点差值超过阈值，则切分一段
-        if time_list[i] - time_list[i - 1] > threshold:
-            segments.append((start_index, i - 1))
-            start_index = i
+# 导出图像格式：扩展名 -> OpenCV 压缩参数（PNG 为压缩级别 0-9，JPEG/WebP 为质量 0-100）
+IMAGE_FORMATS = {
+    'png': cv2.IMWRITE_PNG_COMPRESSION,
+    'jpg': cv2.IMWRITE_JPEG_QUALITY,
+    'webp': cv2.IMWRITE_WEBP_QUALITY,
+}
 
-    # 添加最后一段
-    segments.append((start_index, len(time_list) - 1))
-    return segments
+def encode_image_file(jpeg_data, path, params):
+    """
+    进程池任务：解码 bag 中的压缩图像并按 path 的扩展名编码写入文件。
+    """
+    img = save_compressed_image(jpeg_data)
+    if img is None:
+        raise ValueError(f"Failed to decode image for {path}")
+    if not cv2.imwrite(path, img, params):
+        raise IOError(f"Failed to write {path}")
 
-def read_and_save():
-    
-    import os
-    bag_path_list = ["428_data.txt"]
-    save_list = ["mount/xhand/202504/raw_data/c3/0428"]
-    for number in range(len(bag_path_list)):
-        count_idx = 0
-        bag_list_path = bag_path_list[number]
-        save_parent_path = save_list[number]
-        with open(bag_list_path, "r") as f:
-            for bag_pth in f.readlines():
-                file_name = bag_pth.split(",")[0]
-                bag_path = file_name
-                datalist = get_image_arm_handstate(bag_path)
-                #option1
-                keyboard_path = f"{bag_path}/keyboard.bag"
-                asd = []
-                with rosbag.Bag(keyboard_path, 'r') as bag:
-                    for id, (topic, msg, t) in enumerate(bag.read_messages()):
-                        asd.append((t.to_sec(), msg.data))
-                clips = process_events(asd)
-                
-                indices = extract_indices_from_intervals(datalist, clips)
-
-                # option2
-                # indices = clip_by_time(datalist)
-
-                for clip in indices:
-                    # mkdir raw_data/grasp/{idx}
-                    os.makedirs(f'{save_parent_path}/{count_idx}', exist_ok=True)
-                    os.makedirs(f'{save_parent_path}/{count_idx}/img', exist_ok=True)
-                    img_list = []
-                    for i in range(clip[0], clip[1] + 1):
-                        img_i = i - clip[0]
-                        # write datalist[i][0][1] in raw_data/grasp/{idx}/img/{i}.png
-                        img_cnt = save_compressed_image(datalist[i][0][1])
-                        cv2.imwrite(f'{save_parent_path}/{count_idx}/img/{img_i}.png',img_cnt)
-                        img_list.append(img_cnt)
-
-                        # write datalist[i][1][1] in raw_data/grasp/{idx}/arm.txt(ecah line is a joint status)
-                        with open(f'{save_parent_path}/{count_idx}/arm.txt', 'a') as f:
-                            f.write(str(datalist[i][1][1])+ '\n')
-                        # write datalist[i][2][1] in raw_data/grasp/{idx}/hand.txt(ecah line is a hand status)
-                        with open(f'{save_parent_path}/{count_idx}/hand.txt', 'a') as f:
-                            f.write(str(datalist[i][2][1]) + '\n')
-                        with open(f'{save_parent_path}/{count_idx}/hand_force.txt', 'a') as f:
-                            f.write(str(datalist[i][2][2]) + '\n')
-                    # image_list = [convert_cv2_to_moviepy_format(img) for img in img_list]
-
-                    # video_clip = ImageSequenceClip(image_list, fps=30)
-
-                    # # 输出视频
-                    # video_clip.write_videofile(f'raw_data/grasp/{count_idx}/output_video.mp4', codec="libx264")
-                    count_idx += 1
+def export_clip(datalist, clip, clip_dir, executor, image_format='png', params=(), max_pending=64):
+    """
+    导出一个片段：图像交给进程池并行编码，arm.txt / hand.txt / hand_force.txt 在整个片段中只打开一次。
+    输入：
+      - datalist: get_image_arm_handstate 的返回值。
+      - clip: (start_index, end_index) 闭区间。
+      - clip_dir: 输出目录，图像写入 clip_dir/img/{i}.{image_format}。
+      - max_pending: 同时在进程池中排队的最大帧数，限制内存占用。
+    """
+    img_dir = os.path.join(clip_dir, 'img')
+    os.makedirs(img_dir, exist_ok=True)
+    pending = collections.deque()
+    with open(os.path.join(clip_dir, 'arm.txt'), 'w') as arm_file, \
+            open(os.path.join(clip_dir, 'hand.txt'), 'w') as hand_file, \
+            open(os.path.join(clip_dir, 'hand_force.txt'), 'w') as hand_force_file:
+        for i in range(clip[0], clip[1] + 1):
+            img_path = os.path.join(img_dir, f'{i - clip[0]}.{image_format}')
+            pending.append(executor.submit(encode_image_file, datalist['images'][i], img_path, params))
+            if len(pending) >= max_pending:
+                pending.popleft().result()
+
+            arm_i, hand_i = datalist['arm_index'][i], datalist['hand_index'][i]
+            arm_file.write(str(datalist['arm'][arm_i]) + '\n')
+            hand_file.write(str(datalist['hand'][hand_i]) + '\n')
+            hand_force_file.write(str(datalist['hand_force'][hand_i]) + '\n')
+    for future in pending:
+        future.result()
+
+def read_keyboard_clips(bag_path, timepoints):
+    """
+    根据 keyboard.bag 中的 start/stop 事件计算片段的下标区间。
+    """
+    events = []
+    with rosbag.Bag(f"{bag_path}/keyboard.bag", 'r') as bag:
+        for topic, msg, t in bag.read_messages():
+            events.append((t.to_sec(), msg.data))
+    return extract_indices_from_intervals(timepoints, process_events(events))
+
+def read_and_save(bag_list_path, save_parent_path, clip_by='keyboard', image_format='png', level=None,
+                  workers=None, gap_threshold=4/30, max_skew=None):
+    """
+    把 bag_list_path 中列出的每个录制切分成片段，导出为 raw_data 格式：
+    save_parent_path/{idx}/img/{i}.{image_format}，以及逐帧对齐的 arm.txt、hand.txt、hand_force.txt。
+    输入：
+      - bag_list_path: 文本文件，每行第一个逗号前为录制目录。
+      - clip_by: 'keyboard' 按 keyboard.bag 的 start/stop 事件切分，'gap' 按图像时间间隔切分（见 clip_by_time）。
+      - level: 压缩参数（见 IMAGE_FORMATS），为 None 时使用 OpenCV 默认值。
+      - workers: 图像编码进程数，为 None 时使用全部 CPU。
+    """
+    params = [IMAGE_FORMATS[image_format], level] if level is not None else []
+    count_idx = 0
+    with open(bag_list_path, "r") as f:
+        bag_paths = [line.split(",")[0].strip() for line in f if line.strip()]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for bag_path in bag_paths:
+            print(f"Exporting {bag_path}...")
+            datalist = get_image_arm_handstate(bag_path, max_skew)
+            if clip_by == 'keyboard':
+                indices = read_keyboard_clips(bag_path, datalist['img_ts'])
+            else:
+                indices = clip_by_time(datalist['img_ts'], gap_threshold)
+
+            for clip in indices:
+                clip_dir = os.path.join(save_parent_path, str(count_idx))
+                export_clip(datalist, clip, clip_dir, executor, image_format, params)
+                print(f"  - clip {count_idx}: frames {clip[0]}-{clip[1]}")
+                count_idx += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Export recordings as raw_data clips (images + aligned arm/hand text files).")
+    parser.add_argument('bag_list', type=str, help='Text file listing recording directories (first comma-separated field per line).')
+    parser.add_argument('output_dir', type=str, help='Destination directory; clips are written to numbered sub-directories.')
+    parser.add_argument('--clip-by', type=str, default='keyboard', choices=('keyboard', 'gap'), help='Split clips by keyboard.bag events or by image timestamp gaps.')
+    parser.add_argument('--gap-threshold', type=float, default=4/30, help='Gap in seconds that starts a new clip when --clip-by gap.')
+    parser.add_argument('--format', type=str, default='png', choices=tuple(IMAGE_FORMATS), help='Image file format.')
+    parser.add_argument('--level', type=int, default=None, help='PNG compression level (0-9) or JPEG/WebP quality (0-100); OpenCV default if omitted.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of image encoding processes (default: all CPUs).')
+    parser.add_argument('--max-skew', type=float, default=None, help='Warn about frames whose nearest arm/hand sample is further than this many seconds.')
+    args = parser.parse_args()
+
+    read_and_save(args.bag_list, args.output_dir, clip_by=args.clip_by, image_format=args.format, level=args.level,
+                  workers=args.workers, gap_threshold=args.gap_threshold, max_skew=args.max_skew)
 
 
 # if __name__ == '__main__':
@@ -309,4 +304,4 @@ def read_and_save():
 
 
 if __name__ == "__main__":
-    read_and_save()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+# 源代码以 src/ 为工作目录运行（from logic.xxx import ...），测试时同样把 src/ 加入模块搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+
+def make_frame(i):
+    """第 i 帧的测试图像：颜色随帧号变化，并写上帧号，重新编码后仍能区分相邻帧。"""
+    image = np.zeros((48, 64, 3), np.uint8)
+    image[:, :] = (i * 7 % 256, 60, 120)
+    cv2.putText(image, str(i), (2, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255))
+    return image
+
+
+def write_mp4(path, num_frames):
+    """用 OpenCV 写出 64x48 的 mp4v 测试视频（长 GOP，与 process_data 的默认输出相同）。"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (64, 48))
+    for i in range(num_frames):
+        writer.write(make_frame(i))
+    writer.release()
+
+
+def decode_all(video_path):
+    """顺序解码视频的所有帧。"""
+    capture = cv2.VideoCapture(video_path)
+    frames = []
+    while True:
+        ret, image = capture.read()
+        if not ret:
+            break
+        frames.append(image)
+    capture.release()
+    return frames
+
+
+def closest_frame(image, frames):
+    """按平均差值找出 image 对应 frames 中的哪一帧。"""
+    return int(np.argmin([np.abs(image.astype(int) - frame).mean() for frame in frames]))
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from logic.alignment import TimelineAligner
+
+
+def nearest_loop(target_ts, source_ts):
+    """重构前 readbag.find_closest_timestamps 的双指针实现，返回所选源样本的索引。"""
+    result, j = [], 0
+    for t in target_ts:
+        while j < len(source_ts) - 1 and source_ts[j + 1] < t:
+            j += 1
+        if j + 1 < len(source_ts) and abs(source_ts[j + 1] - t) < abs(source_ts[j] - t):
+            result.append(j + 1)
+        else:
+            result.append(j)
+    return np.array(result)
+
+
+def test_linear_duplicate_final_timestamp_matches_interp():
+    source_ts = np.array([0.0, 1.0, 2.0, 2.0])
+    data = np.array([0.0, 10.0, 20.0, 30.0])
+    target = np.array([1.5, 2.0, 3.0])
+    (aligned,), _ = TimelineAligner(target).align(source_ts, data)
+    np.testing.assert_array_equal(aligned[:, 0], np.interp(target, source_ts, data))
+    np.testing.assert_array_equal(aligned[:, 0], [15.0, 30.0, 30.0])
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_linear_matches_interp_with_duplicates_and_out_of_range(seed):
+    rng = np.random.default_rng(seed)
+    # 整数时间戳保证出现重复，目标时刻覆盖源时间轴两侧以外的范围
+    source_ts = np.sort(rng.integers(0, 20, size=rng.integers(1, 30))).astype(np.float64)
+    target = np.sort(np.concatenate([rng.uniform(-5, 25, 40), source_ts]))
+    data = rng.standard_normal((len(source_ts), 3))
+    (aligned,), valid = TimelineAligner(target).align(source_ts, data)
+    expected = np.stack([np.interp(target, source_ts, data[:, i]) for i in range(3)], axis=1)
+    np.testing.assert_allclose(aligned, expected, rtol=0, atol=1e-12)
+    assert valid.all()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_nearest_matches_old_loop(seed):
+    rng = np.random.default_rng(seed)
+    source_ts = np.sort(rng.integers(0, 20, size=rng.integers(1, 30))).astype(np.float64)
+    target = np.sort(np.concatenate([rng.integers(-5, 25, 40).astype(np.float64), rng.uniform(-5, 25, 40)]))
+    data = np.arange(len(source_ts), dtype=np.float64)
+    (aligned,), _ = TimelineAligner(target, mode='nearest').align(source_ts, data)
+    np.testing.assert_array_equal(aligned[:, 0], nearest_loop(target, source_ts))
+
+
+def test_previous_holds_last_sample_at_or_before_target():
+    source_ts = np.array([0.0, 1.0, 1.0, 2.0])
+    data = np.array([0.0, 10.0, 20.0, 30.0])
+    target = np.array([-1.0, 0.5, 1.0, 1.5, 5.0])
+    (aligned,), valid = TimelineAligner(target, mode='previous', max_gap=1.0).align(source_ts, data)
+    np.testing.assert_array_equal(aligned[:, 0], [0.0, 0.0, 20.0, 20.0, 30.0])
+    np.testing.assert_array_equal(valid, [False, True, True, True, False])
+
+
+def test_max_gap_marks_targets_far_from_samples():
+    source_ts = np.array([0.0, 0.1, 5.0])
+    target = np.array([0.05, 2.0, 5.0, 5.6])
+    _, valid = TimelineAligner(target, max_gap=0.5).align(source_ts, np.zeros(3))
+    np.testing.assert_array_equal(valid, [True, False, True, False])
+
+
+def test_missing_stream_is_zero_filled():
+    target = np.linspace(0, 1, 5)
+    (present, missing), _ = TimelineAligner(target).align(np.array([0.0, 1.0]), np.array([[0.0], [2.0]]),
+                                                         np.zeros((0, 4)))
+    np.testing.assert_allclose(present[:, 0], target * 2)
+    assert missing.shape == (5, 4) and not missing.any()
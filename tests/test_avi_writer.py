@@ -0,0 +1,87 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from logic.avi_writer import MjpegAviWriter
+from logic.video_index import JpegFrameReader, make_frame_index
+
+
+def make_jpegs(num_frames):
+    jpegs = []
+    for i in range(num_frames):
+        image = np.zeros((48, 64, 3), np.uint8)
+        image[:, :] = (i * 5 % 256, i * 37 % 256, 160)
+        cv2.putText(image, str(i), (2, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255))
+        jpegs.append(cv2.imencode('.jpg', image)[1].tobytes())
+    return jpegs
+
+
+def closest_frame(frame, jpegs):
+    """OpenCV 的视频解码器与 imdecode 的 JPEG 解码结果略有差异，按平均差值找出对应的帧。"""
+    images = [cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR) for jpeg in jpegs]
+    errors = [np.abs(frame.astype(int) - image).mean() for image in images]
+    assert min(errors) < 5
+    return int(np.argmin(errors))
+
+
+def write_avi(path, jpegs, **kwargs):
+    with MjpegAviWriter(path, 64, 48, 30, **kwargs) as writer:
+        for jpeg in jpegs:
+            writer.write(jpeg)
+    return writer.frame_index
+
+
+@pytest.mark.parametrize('riff_limit', [1 << 30, 8192])
+def test_opencv_decodes_every_frame(tmp_path, riff_limit):
+    # riff_limit 很小时写出多个 AVIX 段，检查 OpenDML 索引
+    jpegs = make_jpegs(60)
+    path = str(tmp_path / 'video.avi')
+    write_avi(path, jpegs, riff_limit=riff_limit)
+
+    capture = cv2.VideoCapture(path)
+    assert int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) == len(jpegs)
+    assert capture.get(cv2.CAP_PROP_FPS) == pytest.approx(30)
+    for i in range(len(jpegs)):
+        ret, frame = capture.read()
+        assert ret
+        assert closest_frame(frame, jpegs) == i
+    assert not capture.read()[0]
+    capture.release()
+
+
+def test_frame_index_points_at_jpeg_data(tmp_path):
+    jpegs = make_jpegs(25)
+    path = str(tmp_path / 'video.avi')
+    index = write_avi(path, jpegs, riff_limit=4096)
+
+    assert len(index) == len(jpegs) and index['keyframe'].all()
+    np.testing.assert_array_equal(index['size'], [len(jpeg) for jpeg in jpegs])
+    reader = JpegFrameReader(path, index)
+    try:
+        assert [reader.read_jpeg(i) for i in range(len(jpegs))] == jpegs
+        np.testing.assert_array_equal(reader.read(7), cv2.imdecode(np.frombuffer(jpegs[7], np.uint8), cv2.IMREAD_COLOR))
+    finally:
+        reader.close()
+
+
+def test_opencv_seeks_to_any_frame(tmp_path):
+    jpegs = make_jpegs(40)
+    path = str(tmp_path / 'video.avi')
+    write_avi(path, jpegs)
+    capture = cv2.VideoCapture(path)
+    for i in (33, 5, 17):
+        capture.set(cv2.CAP_PROP_POS_FRAMES, i)
+        ret, frame = capture.read()
+        assert ret
+        assert closest_frame(frame, jpegs) == i
+    capture.release()
+
+
+def test_jpeg_reader_rejects_inter_frames(tmp_path):
+    path = str(tmp_path / 'video.avi')
+    write_avi(path, make_jpegs(2))
+    with pytest.raises(ValueError):
+        JpegFrameReader(path, make_frame_index([0, 10], [10, 10], [True, False]))
+    assert os.path.getsize(path) > 0
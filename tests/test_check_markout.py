@@ -0,0 +1,66 @@
+import json
+
+import check_markout
+from check_markout import find_annotation_problems
+
+
+def annotation(start, end, instruction='pick'):
+    return {'instruction': instruction, 'start': start, 'end': end}
+
+
+def problem_types(problems):
+    return {problem['type']: problem['annotations'] for problem in problems}
+
+
+def test_clean_annotations():
+    problems, covered = find_annotation_problems([annotation(0, 9), annotation(10, 19)], 20)
+    assert problems == [] and covered == 20
+    assert find_annotation_problems([], 10) == ([], 0)
+
+
+def test_overlap_reports_later_interval():
+    problems, covered = find_annotation_problems([annotation(10, 20), annotation(0, 5), annotation(4, 12)], 30)
+    # 按 start 排序后 [4, 12] 与 [0, 5] 重叠，[10, 20] 与 [4, 12] 重叠
+    assert problem_types(problems) == {'overlap': [0, 2]}
+    assert covered == 21
+
+
+def test_out_of_range_and_empty():
+    annotations = [annotation(-2, 3), annotation(5, 12), annotation(8, 6), annotation(1, 1, instruction='  ')]
+    problems, covered = find_annotation_problems(annotations, 10)
+    types = problem_types(problems)
+    assert types['out_of_range'] == [0, 1]
+    assert types['empty'] == [2, 3]
+    # 覆盖帧数截断到视频范围内：[0, 3] ∪ [5, 9]
+    assert covered == 9
+    # 没有视频帧数时不检查越界
+    assert 'out_of_range' not in problem_types(find_annotation_problems(annotations, None)[0])
+
+
+def test_malformed_annotations_are_reported_not_raised():
+    annotations = ['oops', annotation(0, 4), {'instruction': 'no end', 'start': 1}, annotation('x', 3),
+                   annotation(None, 2), annotation('2', '6')]
+    problems, covered = find_annotation_problems(annotations, 10)
+    types = problem_types(problems)
+    assert types['malformed'] == [0, 2, 3, 4]
+    assert types['overlap'] == [5]
+    assert 'empty' not in types
+    assert covered == 7
+
+
+def test_malformed_files_are_unreadable(tmp_path):
+    markout = tmp_path / 'markout'
+    markout.mkdir()
+    (markout / 'list.json').write_text(json.dumps([{'start': 0, 'end': 1}]))
+    (markout / 'ann.json').write_text(json.dumps({'video_name': 'ann', 'annotations': {'start': 0}}))
+    (markout / 'bad.json').write_text('{')
+    (markout / 'item.json').write_text(json.dumps({'annotations': ['oops', annotation(0, 1)], 'problem': 'x'}))
+
+    for name in ('list', 'ann', 'bad'):
+        record = check_markout.check_markout_file(str(markout / f'{name}.json'), str(tmp_path / 'video'))
+        assert [problem['type'] for problem in record['problems']] == ['unreadable']
+        assert record['annotations'] == []
+    record = check_markout.check_markout_file(str(markout / 'item.json'), str(tmp_path / 'video'))
+    assert [problem['type'] for problem in record['problems']] == ['missing_video', 'malformed']
+    summary = check_markout.summarize([record])
+    assert summary['problem_annotations'] == {'malformed': 1}
@@ -0,0 +1,75 @@
+import json
+import os
+
+import numpy as np
+
+import cut_clips
+from conftest import closest_frame, decode_all, write_mp4
+from logic.video_index import read_mp4_frame_index, save_frame_index
+
+
+def make_video(video_dir, num_frames=30):
+    os.makedirs(video_dir)
+    video_path = os.path.join(video_dir, 'video.mp4')
+    write_mp4(video_path, num_frames)
+    index = read_mp4_frame_index(video_path)
+    save_frame_index(video_dir, index)
+    return video_path, index
+
+
+def test_same_samples_detects_offset_start(tmp_path):
+    video_path, index = make_video(str(tmp_path / 'ep'))
+    keyframes = np.flatnonzero(index['keyframe'])
+    assert len(keyframes) > 1
+    # 源视频本身就是从第 0 帧开始的“流复制”结果
+    assert cut_clips.same_samples(video_path, index, video_path, index[:10], 0)
+    assert not cut_clips.same_samples(video_path, index, video_path, index[:10], int(keyframes[1]))
+    assert not cut_clips.same_samples(video_path, index, video_path, index, 1)
+
+
+def test_plan_tasks_skips_malformed_annotations(tmp_path):
+    make_video(str(tmp_path / 'video' / 'ep'))
+    annotations = [{'instruction': 'a', 'start': 0, 'end': 9}, {'instruction': 'no end', 'start': 3},
+                   {'instruction': 'bad', 'start': 'x', 'end': 5}, {'instruction': 'none', 'start': None, 'end': 5},
+                   {'instruction': 'out', 'start': 20, 'end': 40}]
+    tasks, stats = cut_clips.plan_tasks([('ep', annotations)], str(tmp_path / 'video'), str(tmp_path / 'clips'))
+
+    assert stats['malformed'] == 3
+    assert stats['out of range'] == 1
+    (video_dir, fps, clips), = tasks
+    assert [record['annotation_index'] for _, record in clips] == [0]
+
+    results = cut_clips.cut_video_clips(video_dir, clips, fps)
+    clip_dir, method = results[0]
+    assert method in ('stream-copy', 'reencode')
+    with open(os.path.join(clip_dir, cut_clips.CLIP_FILE), 'r', encoding='utf-8') as f:
+        assert json.load(f)['end'] == 9
+    assert len(read_mp4_frame_index(os.path.join(clip_dir, 'video.mp4'))) == 10
+
+
+def test_reencode_starts_inside_gop(tmp_path):
+    video_path, index = make_video(str(tmp_path / 'ep'), 40)
+    start = int(np.flatnonzero(index['keyframe'])[1]) + 3
+    clip_dir = str(tmp_path / 'clip')
+    os.makedirs(clip_dir)
+    assert cut_clips.reencode(video_path, index, clip_dir, start, start + 9, 30)
+
+    source = decode_all(video_path)
+    clip = decode_all(os.path.join(clip_dir, 'video.mp4'))
+    assert [closest_frame(frame, source) for frame in clip] == list(range(start, start + 10))
+
+
+def test_malformed_files_and_annotations_are_skipped(tmp_path):
+    markout = tmp_path / 'markout'
+    markout.mkdir()
+    (markout / 'list.json').write_text(json.dumps([{'start': 0, 'end': 1}]))
+    (markout / 'dict.json').write_text(json.dumps({'video_name': 'ep', 'annotations': {'start': 0}}))
+    (markout / 'ep.json').write_text(json.dumps({'annotations': ['oops', {'instruction': 'a', 'start': 0, 'end': 4}],
+                                                 'problem': None}))
+    episodes, abolished = cut_clips.load_episode_annotations(str(markout))
+    assert episodes == [('ep', ['oops', {'instruction': 'a', 'start': 0, 'end': 4}])] and abolished == 0
+
+    make_video(str(tmp_path / 'video' / 'ep'))
+    tasks, stats = cut_clips.plan_tasks(episodes, str(tmp_path / 'video'), str(tmp_path / 'clips'))
+    assert stats['malformed'] == 1
+    assert [record['annotation_index'] for _, record in tasks[0][2]] == [1]
@@ -0,0 +1,88 @@
+import io
+import json
+import os
+import tarfile
+
+import cv2
+import numpy as np
+import pytest
+
+import export_dataset
+from conftest import decode_all, write_mp4
+from logic.dataset import read_frame
+from logic.video_index import read_mp4_frame_index, save_frame_index
+
+
+def make_episode(video_base_dir, markout_dir, name, num_video_frames, num_rows, with_index):
+    video_dir = os.path.join(video_base_dir, name)
+    os.makedirs(video_dir)
+    video_path = os.path.join(video_dir, 'video.mp4')
+    write_mp4(video_path, num_video_frames)
+    if with_index:
+        save_frame_index(video_dir, read_mp4_frame_index(video_path))
+    np.save(os.path.join(video_dir, 'timestamps.npy'), np.arange(num_rows) / 30)
+    np.save(os.path.join(video_dir, 'arm.npy'), np.arange(num_rows * 3, dtype=np.float64).reshape(num_rows, 3))
+    with open(os.path.join(markout_dir, f'{name}.json'), 'w', encoding='utf-8') as f:
+        json.dump({'video_name': name, 'annotations': [{'instruction': 'a', 'start': 2, 'end': 12}],
+                   'pre_instructions': [], 'problem': {}}, f)
+    return video_path
+
+
+def export(tmp_path, chunk_frames=8):
+    episodes, _ = export_dataset.find_episodes(str(tmp_path / 'video'), str(tmp_path / 'markout'))
+    output_dir = str(tmp_path / 'dataset')
+    num_frames = export_dataset.export_dataset(episodes, output_dir, 10 ** 7, chunk_frames=chunk_frames, workers=2)
+    with open(os.path.join(output_dir, 'episodes.json'), 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    return num_frames, np.load(os.path.join(output_dir, 'index.npy')), metadata
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    (tmp_path / 'video').mkdir()
+    (tmp_path / 'markout').mkdir()
+    return str(tmp_path / 'video'), str(tmp_path / 'markout')
+
+
+def test_video_shorter_than_timestamps_is_truncated(tmp_path, dirs):
+    make_episode(*dirs, 'a_short', 20, 30, with_index=False)
+    make_episode(*dirs, 'b_full', 16, 16, with_index=False)
+    num_frames, index, metadata = export(tmp_path)
+
+    short, full = metadata['episodes']
+    assert num_frames == 20 + 16
+    assert short['num_frames'] == 20
+    assert [(c['start'], c['end']) for c in short['chunks']] == [(0, 7), (8, 15), (16, 19)]
+    assert full['num_frames'] == 16
+    np.testing.assert_array_equal(index['frame'][index['episode'] == 0], np.arange(20))
+
+    chunk = short['chunks'][-1]
+    with tarfile.open(os.path.join(tmp_path, 'dataset', metadata['shards'][chunk['shard']])) as tar:
+        arrays = np.load(io.BytesIO(tar.extractfile('a_short/000016.npz').read()))
+        np.testing.assert_array_equal(arrays['arm'], np.arange(48, 60, dtype=np.float64).reshape(4, 3))
+        np.testing.assert_array_equal(arrays['annotation'], [-1] * 4)
+
+
+def test_mp4_chunks_match_sequential_decode(tmp_path, dirs):
+    video_path = make_episode(*dirs, 'ep', 40, 40, with_index=True)
+    num_frames, index, metadata = export(tmp_path, chunk_frames=5)
+    frames = decode_all(video_path)
+
+    assert num_frames == 40
+    # 帧块起点对齐到关键帧
+    keyframes = np.flatnonzero(read_mp4_frame_index(video_path)['keyframe'])
+    assert all(c['start'] in keyframes for c in metadata['episodes'][0]['chunks'])
+    for i, row in enumerate(index):
+        image = cv2.imdecode(np.frombuffer(read_frame(str(tmp_path / 'dataset'), index, i), np.uint8),
+                             cv2.IMREAD_COLOR)
+        assert np.abs(image.astype(int) - frames[row['frame']]).mean() < 2
+
+
+def test_read_chunk_starts_inside_gop(dirs):
+    video_path = make_episode(*dirs, 'ep', 40, 40, with_index=True)
+    frames = decode_all(video_path)
+    jpegs = export_dataset.read_chunk(video_path, 17, 30, 100)
+    assert len(jpegs) == 14
+    for i, jpeg in enumerate(jpegs):
+        image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        assert np.abs(image.astype(int) - frames[17 + i]).mean() < 2
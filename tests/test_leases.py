@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+
+from logic.leases import LeaseManager
+
+
+def expire(manager, name):
+    path = os.path.join(manager.lease_dir, name + '.lease')
+    old = time.time() - manager.ttl - 10
+    os.utime(path, (old, old))
+
+
+def test_claim_is_exclusive(tmp_path):
+    a = LeaseManager(str(tmp_path), ttl=60, owner='a')
+    b = LeaseManager(str(tmp_path), ttl=60, owner='b')
+    assert a.try_acquire('rec')
+    assert not b.try_acquire('rec')
+    assert b.try_acquire('other')
+
+    # 释放别人的租约不会删除它
+    b.release('rec')
+    assert not b.try_acquire('rec')
+    a.release('rec')
+    assert b.try_acquire('rec')
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    a = LeaseManager(str(tmp_path), ttl=60, owner='a')
+    b = LeaseManager(str(tmp_path), ttl=60, owner='b')
+    assert a.try_acquire('rec')
+    expire(a, 'rec')
+    assert b.try_acquire('rec')
+    assert not a.try_acquire('rec')
+    # 原持有者释放时不会删除新持有者的租约
+    a.release('rec')
+    assert os.path.exists(os.path.join(str(tmp_path), 'rec.lease'))
+    assert not [name for name in os.listdir(str(tmp_path)) if '.expired-' in name]
+
+
+def test_only_one_node_reclaims_concurrently(tmp_path):
+    LeaseManager(str(tmp_path), ttl=60, owner='crashed').try_acquire('rec')
+    expire(LeaseManager(str(tmp_path), ttl=60), 'rec')
+    managers = [LeaseManager(str(tmp_path), ttl=60, owner=f'node{i}') for i in range(8)]
+    barrier = threading.Barrier(len(managers))
+    results = []
+
+    def claim(manager):
+        barrier.wait()
+        results.append(manager.try_acquire('rec'))
+
+    threads = [threading.Thread(target=claim, args=(manager,)) for manager in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+
+
+def test_heartbeat_keeps_lease_and_detects_loss(tmp_path):
+    with LeaseManager(str(tmp_path), ttl=0.4, owner='a') as a:
+        assert a.try_acquire('kept')
+        assert a.try_acquire('lost')
+        time.sleep(0.6)
+        # 心跳刷新了修改时间，租约没有过期
+        assert not LeaseManager(str(tmp_path), ttl=0.4, owner='b').try_acquire('kept')
+
+        c = LeaseManager(str(tmp_path), ttl=0.4, owner='c')
+        # 心跳可能恰好在 expire 之后刷新租约，重试几次
+        for _ in range(5):
+            expire(a, 'lost')
+            if c.try_acquire('lost'):
+                break
+        with open(os.path.join(str(tmp_path), 'lost.lease'), 'r', encoding='utf-8') as f:
+            assert json.load(f)['owner'] == 'c'
+        time.sleep(0.3)
+        assert a.lost == {'lost'}
+    assert not os.path.exists(os.path.join(str(tmp_path), 'kept.lease'))
+    assert os.path.exists(os.path.join(str(tmp_path), 'lost.lease'))
+
+
+def test_unreadable_lease_is_not_lost(tmp_path):
+    with LeaseManager(str(tmp_path), ttl=0.4, owner='a') as a:
+        assert a.try_acquire('rec')
+        path = os.path.join(str(tmp_path), 'rec.lease')
+        # 读到不完整的 JSON（例如 NFS 的暂时性错误）时保留租约并继续刷新修改时间
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"owner": ')
+        time.sleep(0.6)
+        assert not a.lost
+        assert time.time() - os.stat(path).st_mtime < 0.4
+        assert not LeaseManager(str(tmp_path), ttl=0.4, owner='b').try_acquire('rec')
+
+        os.remove(path)
+        time.sleep(0.3)
+        assert a.lost == {'rec'}
+
+
+def test_done_marker_token(tmp_path):
+    a = LeaseManager(str(tmp_path), ttl=60, owner='a')
+    assert a.try_acquire('rec')
+    a.release('rec', done_token={'signature': [1, 2], 'options': ('x',)})
+    assert not os.path.exists(os.path.join(str(tmp_path), 'rec.lease'))
+    b = LeaseManager(str(tmp_path), ttl=60, owner='b')
+    assert b.is_done('rec', {'signature': [1, 2], 'options': ['x']})
+    assert not b.is_done('rec', {'signature': [1, 3], 'options': ['x']})
+    assert not b.is_done('other', None)
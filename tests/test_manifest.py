@@ -0,0 +1,47 @@
+import os
+
+from logic.manifest import build_manifest, outputs_up_to_date, previous_outputs, write_manifest
+
+
+def write_outputs(parent, manifest, outputs, skipped=()):
+    for name in outputs:
+        os.makedirs(os.path.join(parent, name))
+        write_manifest(os.path.join(parent, name), dict(manifest, outputs=list(outputs), skipped=list(skipped)))
+
+
+def make_manifest(source_dir, **options):
+    return build_manifest(str(source_dir), ['a.bag'], {'image': 'img'}, options)
+
+
+def test_skipped_first_segment_counts_as_complete(tmp_path):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'a.bag').write_bytes(b'x')
+    manifest = make_manifest(tmp_path / 'src', encoding='mp4v')
+    write_outputs(str(tmp_path), manifest, ['rec_1', 'rec_2'], skipped=['rec_0'])
+    output_dir = str(tmp_path / 'rec')
+
+    assert outputs_up_to_date(output_dir, manifest)
+    assert previous_outputs(output_dir) == ['rec_1', 'rec_2']
+    assert not outputs_up_to_date(output_dir, make_manifest(tmp_path / 'src', encoding='intra'))
+
+
+def test_missing_output_is_not_up_to_date(tmp_path):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'a.bag').write_bytes(b'x')
+    manifest = make_manifest(tmp_path / 'src')
+    write_outputs(str(tmp_path), manifest, ['rec_0', 'rec_1'])
+    os.rename(str(tmp_path / 'rec_1'), str(tmp_path / 'rec_1.old-1'))
+
+    assert not outputs_up_to_date(str(tmp_path / 'rec'), manifest)
+    assert previous_outputs(str(tmp_path / 'other')) == []
+
+
+def test_empty_result_is_up_to_date(tmp_path):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'a.bag').write_bytes(b'x')
+    manifest = make_manifest(tmp_path / 'src')
+    (tmp_path / 'rec').mkdir()
+    write_manifest(str(tmp_path / 'rec'), dict(manifest, outputs=[], skipped=['rec_0', 'rec_1']))
+
+    assert outputs_up_to_date(str(tmp_path / 'rec'), manifest)
+    assert previous_outputs(str(tmp_path / 'rec')) == []
@@ -0,0 +1,24 @@
+import time
+
+import numpy as np
+import pytest
+
+from logic.profiler import StageProfiler, current_rss_mb, merge_reports
+
+pytestmark = pytest.mark.skipif(current_rss_mb() is None, reason='/proc/self/statm is not available')
+
+
+def test_peak_rss_is_per_profiler():
+    profiler = StageProfiler()
+    data = np.ones(200 * 1000 * 1000 // 8)
+    time.sleep(0.2)
+    del data
+    first = profiler.report()
+
+    # 同一进程中的下一个目录不应继承上一个目录的峰值
+    second = StageProfiler().report()
+    assert first['peak_rss_mb'] - second['peak_rss_mb'] > 150
+    assert second['process_peak_rss_mb'] >= first['peak_rss_mb'] - 1
+
+    merged = merge_reports([first, second], 1.0)
+    assert merged['peak_rss_mb'] == first['peak_rss_mb']
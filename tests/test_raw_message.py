@@ -0,0 +1,97 @@
+import struct
+
+import numpy as np
+import pytest
+
+from logic.raw_message import RawFieldReader, parse_fields
+
+COMPRESSED_IMAGE_DEF = """# This message contains a compressed image
+Header header        # Header timestamp should be acquisition time of image
+string format        # Specifies the format of the data
+uint8[] data         # Compressed image buffer
+
+================================================================================
+MSG: std_msgs/Header
+uint32 seq
+time stamp
+string frame_id
+"""
+
+MIXED_DEF = """int32 MODE_A=1
+string NAME_CONST = abc
+bool flag
+time stamp
+float32[3] position
+string[] names
+string[2] pair
+int16[] counts
+duration timeout
+float64[] values
+float64 scale
+uint16[4] ids
+string label
+"""
+
+
+def string(value):
+    data = value.encode('utf-8')
+    return struct.pack('<I', len(data)) + data
+
+
+def array(fmt, values):
+    return struct.pack('<I', len(values)) + struct.pack(f'<{len(values)}{fmt}', *values)
+
+
+def header(seq=7, secs=1700000000, nsecs=5, frame_id='camera'):
+    return struct.pack('<III', seq, secs, nsecs) + string(frame_id)
+
+
+def mixed_message():
+    return (struct.pack('<B', 1) + struct.pack('<II', 12, 34) + struct.pack('<3f', 1.5, -2.0, 3.25)
+            + struct.pack('<I', 3) + string('a') + string('') + string('中文') + string('x') + string('yz')
+            + array('h', [1, -2, 3]) + struct.pack('<ii', -1, 500) + array('d', [0.5, 1.5])
+            + struct.pack('<d', 9.75) + struct.pack('<4H', 1, 2, 3, 65535) + string('done'))
+
+
+def test_parse_fields_skips_comments_constants_and_dependencies():
+    assert parse_fields(COMPRESSED_IMAGE_DEF) == [('header', 'Header', None), ('format', 'string', None),
+                                                  ('data', 'uint8', -1)]
+    fields = parse_fields(MIXED_DEF)
+    assert fields[0] == ('flag', 'bool', None)
+    assert ('position', 'float32', 3) in fields and ('names', 'string', -1) in fields
+
+
+def test_uint8_array_is_zero_copy_view():
+    payload = bytes(range(256)) * 3
+    buffer = header() + string('jpeg') + array('B', list(payload))
+    data = RawFieldReader(COMPRESSED_IMAGE_DEF, 'data')(buffer)
+    assert isinstance(data, memoryview)
+    assert data.obj is buffer
+    assert bytes(data) == payload
+    assert RawFieldReader(COMPRESSED_IMAGE_DEF, 'format')(buffer) == 'jpeg'
+
+
+def test_reads_fields_after_variable_length_fields():
+    buffer = mixed_message()
+
+    def read(field):
+        return RawFieldReader(MIXED_DEF, field)(buffer)
+
+    assert read('flag') == 1
+    assert tuple(read('stamp')) == (12, 34)
+    np.testing.assert_array_equal(read('position'), [1.5, -2.0, 3.25])
+    np.testing.assert_array_equal(read('counts'), [1, -2, 3])
+    assert tuple(read('timeout')) == (-1, 500)
+    np.testing.assert_array_equal(read('values'), [0.5, 1.5])
+    assert read('scale') == 9.75
+    np.testing.assert_array_equal(read('ids'), [1, 2, 3, 65535])
+    assert read('label') == 'done'
+
+
+def test_unsupported_layouts_raise():
+    with pytest.raises(ValueError):
+        RawFieldReader(MIXED_DEF, 'missing')
+    with pytest.raises(ValueError):
+        RawFieldReader(MIXED_DEF, 'names')
+    with pytest.raises(ValueError):
+        RawFieldReader("geometry_msgs/Pose pose\nfloat64[] joint_status\n", 'joint_status')
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+from conftest import decode_all, write_mp4
+from logic.video_index import (FRAME_INDEX_DTYPE, count_video_frames, load_frame_index, make_frame_index,
+                               read_mp4_frame_index, save_frame_index)
+
+VOP_START_CODE = b'\x00\x00\x01\xb6'
+GOV_START_CODE = b'\x00\x00\x01\xb3'
+
+
+def test_mp4_index_matches_samples(tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    write_mp4(path, 50)
+    index = read_mp4_frame_index(path)
+
+    assert index.dtype == FRAME_INDEX_DTYPE
+    assert len(index) == 50
+    assert index['keyframe'][0] and not index['keyframe'].all()
+    assert (np.diff(index['offset']) > 0).all()
+    assert index['offset'][-1] + index['size'][-1] <= os.path.getsize(path)
+    # 偏移正确时，关键帧样本以 GOV 头开头，其他样本以 VOP 起始码开头
+    with open(path, 'rb') as f:
+        for offset, keyframe in zip(index['offset'], index['keyframe']):
+            f.seek(int(offset))
+            assert f.read(4) == (GOV_START_CODE if keyframe else VOP_START_CODE)
+
+
+def test_mp4_index_counts_decoded_frames(tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    write_mp4(path, 40)
+    index = read_mp4_frame_index(path)
+    assert len(decode_all(path)) == len(index)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = make_frame_index([100, 250, 400], [150, 150, 90], [True, False, True])
+    save_frame_index(str(tmp_path), index)
+    loaded = load_frame_index(str(tmp_path))
+    np.testing.assert_array_equal(loaded, index)
+    assert load_frame_index(str(tmp_path / 'missing')) is None
+    assert make_frame_index([0], [1])['keyframe'].all()
+
+
+def test_count_video_frames_prefers_sidecars(tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    write_mp4(path, 12)
+    assert count_video_frames(str(tmp_path), path) == 12
+    np.save(str(tmp_path / 'timestamps.npy'), np.arange(10) / 30)
+    assert count_video_frames(str(tmp_path), path) == 10
+    save_frame_index(str(tmp_path), make_frame_index(np.arange(8), np.ones(8)))
+    assert count_video_frames(str(tmp_path)) == 8
+    assert count_video_frames(str(tmp_path / 'missing')) == 0
@@ -0,0 +1,80 @@
+import os
+
+from logic.watcher import RecordingWatcher, directory_signature
+
+
+def write(path, data=b'x'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_directory_is_ready_after_settle_time(tmp_path):
+    write(str(tmp_path / 'rec' / 'a.bag'))
+    os.makedirs(str(tmp_path / 'empty'))
+    watcher = RecordingWatcher(str(tmp_path), settle_time=30)
+    path = str(tmp_path / 'rec')
+
+    assert watcher.poll(now=0) == []
+    assert watcher.poll(now=29) == []
+    assert watcher.poll(now=30) == [(path, directory_signature(path))]
+    # 认领之前每次轮询都会返回，认领之后不再返回
+    assert watcher.poll(now=40) == [(path, directory_signature(path))]
+    watcher.claim(path, directory_signature(path))
+    assert watcher.poll(now=50) == []
+
+
+def test_copy_in_progress_restarts_settle_time(tmp_path):
+    path = str(tmp_path / 'rec')
+    write(os.path.join(path, 'a.bag'))
+    watcher = RecordingWatcher(str(tmp_path), settle_time=30)
+    assert watcher.poll(now=0) == []
+    write(os.path.join(path, 'b.bag'))
+    assert watcher.poll(now=20) == []
+    assert watcher.poll(now=40) == []
+    assert watcher.poll(now=50) == [(path, directory_signature(path))]
+
+
+def test_recopied_directory_is_returned_again(tmp_path):
+    path = str(tmp_path / 'rec')
+    write(os.path.join(path, 'a.bag'))
+    watcher = RecordingWatcher(str(tmp_path), settle_time=30)
+    watcher.poll(now=0)
+    [(_, signature)] = watcher.poll(now=30)
+    watcher.claim(path, signature)
+
+    write(os.path.join(path, 'a.bag'), b'xyz')
+    assert watcher.poll(now=40) == []
+    [(_, new_signature)] = watcher.poll(now=70)
+    assert new_signature != signature
+
+
+def test_active_files_block_the_directory(tmp_path):
+    path = str(tmp_path / 'rec')
+    write(os.path.join(path, 'a.bag'))
+    write(os.path.join(path, 'b.bag.active'))
+    watcher = RecordingWatcher(str(tmp_path), settle_time=30)
+    assert directory_signature(path) is None
+    assert watcher.poll(now=0) == []
+    assert watcher.poll(now=100) == []
+
+    os.rename(os.path.join(path, 'b.bag.active'), os.path.join(path, 'b.bag'))
+    assert watcher.poll(now=110) == []
+    assert watcher.poll(now=140) == [(path, directory_signature(path))]
+
+
+def test_unclaim_returns_directory_again(tmp_path):
+    path = str(tmp_path / 'rec')
+    write(os.path.join(path, 'a.bag'))
+    watcher = RecordingWatcher(str(tmp_path), settle_time=30)
+    watcher.poll(now=0)
+    [(_, signature)] = watcher.poll(now=30)
+    watcher.claim(path, signature)
+    assert watcher.poll(now=40) == []
+
+    watcher.unclaim(path, signature)
+    assert watcher.poll(now=50) == [(path, signature)]
+    # 撤销其他签名（例如重新拷贝之前的任务失败）不影响当前的认领
+    watcher.claim(path, signature)
+    watcher.unclaim(path, (0, 0, 0))
+    assert watcher.poll(now=60) == []